@@ -0,0 +1,483 @@
+"""Admin pages and the JSON endpoints behind the chunked uploader."""
+import os
+from datetime import datetime
+
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import login_required
+from flask_wtf.csrf import validate_csrf
+from werkzeug.utils import secure_filename
+from wtforms import StringField
+from wtforms.validators import ValidationError
+
+from database import pool_stats
+from extensions import chunked_uploads, db, direct_uploads, duplicate_index, metrics, page_cache
+from forms import (AboutForm, ContactForm, EventForm, FAQForm, FeatureForm, GALLERY_CATEGORIES, GalleryForm,
+                   HomeForm, TeamMemberForm)
+from media import (attach_image, collect_orphaned_media, queue_renditions, release_media, replace_image, store_media_file,
+                   store_media_object)
+from models import AboutContent, ContactInfo, Event, GalleryItem, HomeContent, TeamMember, utcnow
+from public import team_sections
+from uploads import OffsetMismatch, UploadError
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+@bp.route('')
+@login_required
+def dashboard():
+    return render_template('admin.html')
+
+@bp.route('/home', methods=['GET', 'POST'])
+@login_required
+def manage_home():
+    form = HomeForm()
+    home_content = HomeContent.query.first()
+    if form.validate_on_submit():
+        if not home_content:
+            home_content = HomeContent()
+            db.session.add(home_content)
+        home_content.hero_subtitle = form.hero_subtitle.data
+        home_content.set_features([{'title': f.title.data, 'description': f.description.data} for f in form.features])
+        home_content.cta_text = form.cta_text.data
+        # Feature rows live in their own table; touch the parent so validators see the change.
+        home_content.updated_at = utcnow()
+        db.session.commit()
+        flash('Home content updated successfully!', 'success')
+        return redirect(url_for('admin.manage_home'))
+    elif request.method == 'GET' and home_content:
+        form.hero_subtitle.data = home_content.hero_subtitle
+        form.features.entries = [FeatureForm(title=f.title, description=f.description) for f in home_content.features]
+        form.cta_text.data = home_content.cta_text
+    features = home_content.features if home_content else []
+    return render_template('manage_home.html', form=form, home_content=home_content, features=features)
+
+@bp.route('/about', methods=['GET', 'POST'])
+@login_required
+def manage_about():
+    form = AboutForm()
+    content = AboutContent.query.first()
+    if form.validate_on_submit():
+        if not content:
+            content = AboutContent()
+            db.session.add(content)
+        content.title = form.title.data
+        content.content = form.content.data
+        db.session.commit()
+        flash('About content updated successfully!', 'success')
+        return redirect(url_for('admin.manage_about'))
+    elif request.method == 'GET' and content:
+        form.title.data = content.title
+        form.content.data = content.content
+    return render_template('manage_about.html', form=form, content=content)
+
+@bp.route('/events', methods=['GET', 'POST'])
+@login_required
+def manage_events():
+    form = EventForm()
+    if form.validate_on_submit():
+        event = Event(
+            title=form.title.data,
+            description=form.description.data,
+            date=datetime.strptime(form.date.data, '%Y-%m-%d'),
+            location=form.location.data
+        )
+        if form.image.data:
+            replace_image(event, form.image.data)
+        db.session.add(event)
+        db.session.commit()
+        if event.image_status == 'pending':
+            queue_renditions(event)
+        flash('Event added successfully!', 'success')
+        return redirect(url_for('admin.manage_events'))
+    events = Event.query.all()
+    current_time = datetime.now()
+    return render_template('manage_events.html', form=form, events=events, current_time=current_time)
+
+@bp.route('/team', methods=['GET', 'POST'])
+@login_required
+def manage_team():
+    form = TeamMemberForm()
+    if form.validate_on_submit():
+        member = TeamMember(
+            name=form.name.data,
+            role=form.role.data,
+            specialty=form.specialty.data,
+            bio=form.bio.data,
+            image=form.image.data,
+            instagram=form.instagram.data,
+            facebook=form.facebook.data,
+            twitter=form.twitter.data,
+            email=form.email.data,
+            is_core=form.is_core.data
+        )
+        member.set_achievements([a.data for a in form.achievements if a.data])
+        db.session.add(member)
+        db.session.commit()
+        flash('Team member added successfully!', 'success')
+        return redirect(url_for('admin.manage_team'))
+    core_team, active_members = team_sections()
+    return render_template('manage_team.html', form=form, core_team=core_team, active_members=active_members)
+
+@bp.route('/team/edit/<int:member_id>', methods=['GET', 'POST'])
+@login_required
+def edit_team_member(member_id):
+    member = TeamMember.query.get_or_404(member_id)
+    form = TeamMemberForm()
+    if form.validate_on_submit():
+        member.name = form.name.data
+        member.role = form.role.data
+        member.specialty = form.specialty.data
+        member.bio = form.bio.data
+        member.set_achievements([a.data for a in form.achievements if a.data])
+        member.image = form.image.data
+        member.instagram = form.instagram.data
+        member.facebook = form.facebook.data
+        member.twitter = form.twitter.data
+        member.email = form.email.data
+        member.is_core = form.is_core.data
+        member.updated_at = utcnow()
+        db.session.commit()
+        flash('Team member updated successfully!', 'success')
+        return redirect(url_for('admin.manage_team'))
+    elif request.method == 'GET':
+        form.name.data = member.name
+        form.role.data = member.role
+        form.specialty.data = member.specialty
+        form.bio.data = member.bio
+        form.achievements.entries = [StringField('Achievement', default=a.text) for a in member.achievements]
+        form.image.data = member.image
+        form.instagram.data = member.social.instagram
+        form.facebook.data = member.social.facebook
+        form.twitter.data = member.social.twitter
+        form.email.data = member.social.email
+        form.is_core.data = member.is_core
+    return render_template('edit_team_member.html', form=form, member=member)
+
+@bp.route('/team/delete/<int:member_id>')
+@login_required
+def delete_team_member(member_id):
+    member = TeamMember.query.get_or_404(member_id)
+    db.session.delete(member)
+    db.session.commit()
+    flash('Team member deleted successfully!', 'success')
+    return redirect(url_for('admin.manage_team'))
+
+@bp.route('/contact', methods=['GET', 'POST'])
+@login_required
+def manage_contact():
+    form = ContactForm()
+    contact_info = ContactInfo.query.first()
+    if form.validate_on_submit():
+        if not contact_info:
+            contact_info = ContactInfo()
+            db.session.add(contact_info)
+        contact_info.email = form.email.data
+        contact_info.phone = form.phone.data
+        contact_info.phone_hours = form.phone_hours.data
+        contact_info.address_line1 = form.line1.data
+        contact_info.address_line2 = form.line2.data or ''
+        contact_info.city = form.city.data
+        contact_info.state = form.state.data
+        contact_info.zip_code = form.zip_code.data
+        contact_info.hours_weekdays = form.weekdays.data
+        contact_info.hours_weekend = form.weekend.data
+        contact_info.hours_closed = form.closed.data
+        contact_info.instagram_url = form.instagram.data or ''
+        contact_info.facebook_url = form.facebook.data or ''
+        contact_info.twitter_url = form.twitter.data or ''
+        contact_info.instagram_handle = form.instagram_handle.data or ''
+        contact_info.set_faq([{'question': f.question.data, 'answer': f.answer.data} for f in form.faq.entries if f.question.data and f.answer.data])
+        contact_info.updated_at = utcnow()
+        db.session.commit()
+        flash('Contact info updated successfully!', 'success')
+        return redirect(url_for('admin.manage_contact'))
+    if request.method == 'GET' and contact_info:
+        form.email.data = contact_info.email
+        form.phone.data = contact_info.phone
+        form.phone_hours.data = contact_info.phone_hours
+        address = contact_info.address
+        form.line1.data = address.line1
+        form.line2.data = address.line2
+        form.city.data = address.city
+        form.state.data = address.state
+        form.zip_code.data = address.zip
+        office_hours = contact_info.office_hours
+        form.weekdays.data = office_hours.weekdays
+        form.weekend.data = office_hours.weekend
+        form.closed.data = office_hours.closed
+        social_links = contact_info.social_links
+        form.instagram.data = social_links.instagram
+        form.facebook.data = social_links.facebook
+        form.twitter.data = social_links.twitter
+        form.instagram_handle.data = social_links.instagram_handle
+        form.faq.entries = [FAQForm(question=f.question, answer=f.answer) for f in contact_info.faq]
+    social = contact_info.social_links._asdict() if contact_info else {}
+    faq = contact_info.faq if contact_info else []
+    return render_template('manage_contact.html', form=form, contact_info=contact_info, social=social, faq=faq)
+
+@bp.route('/gallery', methods=['GET', 'POST'])
+@login_required
+def manage_gallery():
+    form = GalleryForm()
+    if form.validate_on_submit():
+        gallery_item = GalleryItem(
+            title=form.title.data,
+            description=form.description.data,
+            image_path='',
+            category=form.category.data
+        )
+        if form.image_path.data:
+            replace_image(gallery_item, form.image_path.data)
+        db.session.add(gallery_item)
+        db.session.commit()
+        if gallery_item.image_status == 'pending':
+            queue_renditions(gallery_item)
+        flash('Gallery item added successfully!', 'success')
+        return redirect(url_for('admin.manage_gallery'))
+    duplicates_only = request.args.get('duplicates') == '1'
+    query = GalleryItem.query
+    if duplicates_only:
+        query = query.filter(GalleryItem.duplicate_of_id.isnot(None))
+    gallery_items = query.all()
+    return render_template('manage_gallery.html', form=form, gallery_items=gallery_items,
+                           duplicates_only=duplicates_only)
+
+@bp.route('/events/edit/<int:event_id>', methods=['GET', 'POST'])
+@login_required
+def edit_event(event_id):
+    event = Event.query.get_or_404(event_id)
+    form = EventForm()
+    if form.validate_on_submit():
+        event.title = form.title.data
+        event.description = form.description.data
+        event.date = datetime.strptime(form.date.data, '%Y-%m-%d')
+        event.location = form.location.data
+        new_image = bool(form.image.data)
+        if new_image:
+            replace_image(event, form.image.data)
+        db.session.commit()
+        if new_image:
+            if event.image_status == 'pending':
+                queue_renditions(event)
+            collect_orphaned_media()
+        flash('Event updated successfully!', 'success')
+        return redirect(url_for('admin.manage_events'))
+    elif request.method == 'GET':
+        form.title.data = event.title
+        form.description.data = event.description
+        form.date.data = event.date.strftime('%Y-%m-%d')
+        form.location.data = event.location
+    return render_template('edit_event.html', form=form, event=event)
+
+@bp.route('/events/delete/<int:event_id>')
+@login_required
+def delete_event(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.image_path:
+        release_media(event.image_path)
+    db.session.delete(event)
+    db.session.commit()
+    collect_orphaned_media()
+    flash('Event deleted successfully!', 'success')
+    return redirect(url_for('public.events'))
+
+@bp.route('/gallery/edit/<int:gallery_id>', methods=['GET', 'POST'])
+@login_required
+def edit_gallery(gallery_id):
+    gallery_item = GalleryItem.query.get_or_404(gallery_id)
+    form = GalleryForm()
+    if form.validate_on_submit():
+        new_image = bool(form.image_path.data)
+        if new_image:
+            replace_image(gallery_item, form.image_path.data)
+        gallery_item.title = form.title.data
+        gallery_item.description = form.description.data
+        gallery_item.category = form.category.data
+        db.session.commit()
+        if new_image:
+            if gallery_item.image_status == 'pending':
+                queue_renditions(gallery_item)
+            collect_orphaned_media()
+        flash('Gallery item updated successfully!', 'success')
+        return redirect(url_for('public.gallery'))
+    elif request.method == 'GET':
+        form.title.data = gallery_item.title
+        form.description.data = gallery_item.description
+        form.category.data = gallery_item.category
+    return render_template('edit_gallery.html', form=form, gallery_item=gallery_item)
+
+@bp.route('/gallery/delete/<int:gallery_id>')
+@login_required
+def delete_gallery(gallery_id):
+    gallery_item = GalleryItem.query.get_or_404(gallery_id)
+    release_media(gallery_item.image_path)
+    copies = GalleryItem.query.filter_by(duplicate_of_id=gallery_item.id).all()
+    db.session.delete(gallery_item)
+    db.session.flush()
+    # The oldest remaining copy becomes the one the others are flagged against.
+    for copy in copies:
+        duplicate_index.flag(copy)
+    db.session.commit()
+    collect_orphaned_media()
+    flash('Gallery item deleted successfully!', 'success')
+    return redirect(url_for('public.gallery'))
+
+def check_api_csrf():
+    """JSON endpoints take the CSRF token from the X-CSRFToken header."""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return None
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    return None
+
+def upload_state(upload):
+    return {
+        'id': upload['id'],
+        'offset': upload['offset'],
+        'size': upload['size'],
+        'complete': upload['complete'],
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+    }
+
+@bp.errorhandler(UploadError)
+def upload_error(e):
+    body = {'error': str(e)}
+    if isinstance(e, OffsetMismatch):
+        body['offset'] = e.offset
+    return jsonify(body), e.status_code
+
+@bp.route('/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    error = check_api_csrf()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    if direct_uploads.enabled:
+        # The browser sends the parts straight to the bucket (see uploads.DirectUploads).
+        return jsonify(direct_uploads.create(secure_filename(data.get('filename') or ''), data.get('size'))), 201
+    upload = chunked_uploads.create(secure_filename(data.get('filename') or ''), data.get('size'), data.get('sha256'))
+    return jsonify(upload_state(upload)), 201
+
+@bp.route('/uploads/<upload_id>', methods=['GET', 'PATCH'])
+@login_required
+@metrics.time_upload
+def upload_chunk(upload_id):
+    if request.method == 'GET':
+        return jsonify(upload_state(chunked_uploads.get(upload_id)))
+    error = check_api_csrf()
+    if error:
+        return error
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    # request.stream is read in fixed-size pieces, never buffered whole.
+    chunked_uploads.append(upload_id, offset, request.stream, request.headers.get('Upload-Checksum'))
+    return jsonify(upload_state(chunked_uploads.get(upload_id)))
+
+@bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    error = check_api_csrf()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    if direct_uploads.enabled:
+        upload = direct_uploads.complete(upload_id, data.get('etags'))
+        return jsonify({'id': upload['id'], 'size': upload['size'], 'complete': True})
+    upload = chunked_uploads.finalize(upload_id, data.get('sha256'))
+    return jsonify(dict(upload_state(upload), sha256=upload['sha256']))
+
+@bp.route('/gallery/batch', methods=['POST'])
+@login_required
+def batch_gallery():
+    """Create one GalleryItem per finalized upload, all in a single transaction."""
+    error = check_api_csrf()
+    if error:
+        return error
+    data = request.get_json(silent=True)
+    entries = (data.get('items') if isinstance(data, dict) else None) or []
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        return jsonify({'error': 'items must be a list of objects'}), 400
+    categories = {value for value, _ in GALLERY_CATEGORIES}
+    direct = direct_uploads.enabled
+    uploads = []
+    seen = set()
+    # Everything is checked before the first upload is moved into the store,
+    # so a rejected batch leaves every upload in place to be sent again.
+    for entry in entries:
+        upload_id = entry.get('upload_id')
+        if not isinstance(upload_id, str):
+            return jsonify({'error': 'Every item needs an upload_id'}), 400
+        if upload_id in seen:
+            return jsonify({'error': f'Upload {upload_id} is listed twice'}), 400
+        seen.add(upload_id)
+        upload = (direct_uploads if direct else chunked_uploads).get(upload_id)
+        title = entry.get('title') or ''
+        title = title.strip() if isinstance(title, str) else ''
+        if not upload['complete']:
+            return jsonify({'error': f"Upload {upload['id']} is not finalized"}), 400
+        if not isinstance(entry.get('description') or '', str):
+            return jsonify({'error': f"Upload {upload['id']} has a description that is not text"}), 400
+        if not title or len(title) > 100:
+            return jsonify({'error': f"Upload {upload['id']} needs a title of at most 100 characters"}), 400
+        if entry.get('category', 'all') not in categories:
+            return jsonify({'error': f"Unknown category {entry.get('category')!r}"}), 400
+        uploads.append((upload, entry, title))
+    if not uploads:
+        return jsonify({'error': 'No uploads given'}), 400
+
+    items = []
+    for upload, entry, title in uploads:
+        item = GalleryItem(
+            title=title,
+            description=entry.get('description') or '',
+            image_path='',
+            category=entry.get('category', 'all'),
+        )
+        ext = os.path.splitext(upload['filename'])[1]
+        if direct:
+            image_path = store_media_object(upload['key'], ext)
+        else:
+            image_path = store_media_file(chunked_uploads.part_path(upload['id']), upload['sha256'], ext)
+        attach_image(item, image_path)
+        db.session.add(item)
+        items.append(item)
+    db.session.commit()
+    for (upload, _, _), item in zip(uploads, items):
+        if not direct:
+            chunked_uploads.discard(upload['id'])
+        if item.image_status == 'pending':
+            queue_renditions(item)
+    return jsonify({'items': [{'id': item.id, 'title': item.title, 'status': item.image_status} for item in items]}), 201
+
+@bp.route('/cache/stats')
+@login_required
+def cache_stats():
+    return jsonify(page_cache.stats())
+
+@bp.route('/db/pool')
+@login_required
+def db_pool_stats():
+    # Per worker process; repeat the request to sample the others.
+    return jsonify(pool_stats(db))
+
+IMAGE_MODELS = {'gallery': GalleryItem, 'event': Event}
+
+@bp.route('/images/<kind>/<int:item_id>/status')
+@login_required
+def image_status(kind, item_id):
+    model = IMAGE_MODELS.get(kind)
+    if model is None:
+        return jsonify({'error': 'unknown kind'}), 404
+    item = model.query.get_or_404(item_id)
+    return jsonify({
+        'id': item.id,
+        'status': item.image_status or 'ready',
+        'error': item.image_error,
+        'image_path': item.image_path,
+        'thumbnail': item.rendition_url('thumb', 'webp'),
+        'duplicate_of': getattr(item, 'duplicate_of_id', None),
+    })
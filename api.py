@@ -0,0 +1,30 @@
+"""JSON endpoints behind the gallery's infinite scroll and the search box."""
+from flask import Blueprint, jsonify, request
+
+from conditional import conditional
+from database import read_replica
+from extensions import page_cache, query_guard
+from models import GalleryItem
+from public import GALLERY_PAGE_SIZE, gallery_options, gallery_page, page_validator, run_search
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+@bp.route('/gallery')
+@read_replica
+@conditional(lambda: page_validator(GalleryItem))
+@page_cache.cached('GalleryItem')
+@query_guard.budget(max_queries=3)
+def gallery():
+    limit = min(request.args.get('limit', GALLERY_PAGE_SIZE, type=int), 100)
+    items, next_cursor = gallery_page(cursor=request.args.get('cursor'), limit=max(limit, 1),
+                                      **gallery_options(request.args))
+    return jsonify({'items': [item.to_dict() for item in items], 'next_cursor': next_cursor})
+
+@bp.route('/search')
+@read_replica
+@page_cache.cached('GalleryItem', 'Event', 'TeamMember')
+def search():
+    query, results, page, has_more = run_search()
+    return jsonify({'query': query, 'page': page, 'results': results,
+                    'next_page': page + 1 if has_more else None})
+
@@ -0,0 +1,321 @@
+"""Bulk import and export of gallery items and events.
+
+An archive is a directory or zip of images with an optional metadata sidecar,
+``metadata.csv`` or ``metadata.json`` at its top level (or given with
+``--metadata``). The sidecar has one record per image, keyed by ``file``, the
+image's path inside the archive:
+
+    file,title,description,category            (gallery)
+    file,title,description,date,location       (events; date is YYYY-MM-DD)
+
+JSON takes a list of such objects or an object mapping file names to them.
+Images without a record get a title from their file name.
+
+``import_archive()`` stores and hashes the images, then generates their
+renditions, in a process pool across all cores, and inserts the rows in
+transactions of ``batch_size`` as the renditions finish, so a 2,000 image
+shoot is never one enormous transaction. Identical images are processed once
+and images already in the media store reuse their renditions.
+
+``export_archive()`` writes the same layout as a zip, one file at a time and
+with the sidecar spooled to a temporary file, so memory use does not grow
+with the size of the gallery. Its output can be imported again.
+"""
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from extensions import db, duplicate_index, media_store
+from forms import GALLERY_CATEGORIES
+from media import local_image, reference_media, render_image, rendition_job
+from models import Event, GalleryItem, MediaBlob
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.tif', '.tiff', '.bmp'}
+METADATA_NAMES = ('metadata.csv', 'metadata.json')
+FIELDS = {
+    'gallery': ('title', 'description', 'category'),
+    'event': ('title', 'description', 'date', 'location'),
+}
+MODELS = {'gallery': GalleryItem, 'event': Event}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# Sources
+
+def list_images(source):
+    """Return the image names in a directory or zip, as posix paths relative to it."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    elif os.path.isdir(source):
+        names = []
+        for directory, subdirectories, files in os.walk(source):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.startswith('.'))
+            relative = os.path.relpath(directory, source)
+            names.extend(name if relative == '.' else f'{relative}/{name}'.replace(os.sep, '/')
+                         for name in sorted(files))
+    else:
+        raise ArchiveError(f'{source} is neither a directory nor a zip file')
+    return [name for name in names
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not os.path.basename(name).startswith('.')]
+
+
+_archives = {}
+
+
+def _open(source, name):
+    if os.path.isdir(source):
+        return open(os.path.join(source, *name.split('/')), 'rb')
+    # One ZipFile per process: a handle inherited across fork shares its file offset.
+    key = (os.getpid(), source)
+    if key not in _archives:
+        _archives[key] = zipfile.ZipFile(source)
+    return _archives[key].open(name)
+
+
+def read_metadata(source, metadata_path=None):
+    """Return ``{file: record}`` from the sidecar, or {} when there is none."""
+    if metadata_path is not None:
+        name, raw = metadata_path, open(metadata_path, 'rb')
+    else:
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                present = set(archive.namelist())
+        else:
+            present = set(os.listdir(source))
+        name = next((candidate for candidate in METADATA_NAMES if candidate in present), None)
+        if name is None:
+            return {}
+        raw = _open(source, name)
+
+    with raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        try:
+            if name.lower().endswith('.json'):
+                data = json.load(text)
+                records = [dict(record, file=key) for key, record in data.items()] if isinstance(data, dict) else data
+            else:
+                records = list(csv.DictReader(text))
+        except (ValueError, csv.Error) as exc:
+            raise ArchiveError(f'Cannot read {name}: {exc}')
+    metadata = {}
+    for record in records:
+        key = record.get('file') or record.get('filename')
+        if not key:
+            raise ArchiveError(f'{name}: every record needs a "file"')
+        metadata[key.replace('\\', '/').removeprefix('./')] = record
+    return metadata
+
+
+def _title_from(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return re.sub(r'[-_]+', ' ', stem).strip().capitalize() or 'Untitled'
+
+
+def row_fields(kind, name, record, default_category='all'):
+    """Model column values for one image, validated like the admin forms."""
+    title = (record.get('title') or '').strip() or _title_from(name)
+    fields = {'title': title[:100], 'description': (record.get('description') or '').strip()}
+    if kind == 'gallery':
+        category = (record.get('category') or default_category).strip().lower()
+        if category not in {value for value, _ in GALLERY_CATEGORIES}:
+            raise ArchiveError(f'unknown category {category!r}')
+        fields['category'] = category
+    else:
+        raw_date = (record.get('date') or '').strip()
+        if not raw_date:
+            raise ArchiveError('events need a date')
+        try:
+            fields['date'] = datetime.fromisoformat(raw_date)
+        except ValueError:
+            raise ArchiveError(f'bad date {raw_date!r}, expected YYYY-MM-DD')
+        fields['location'] = (record.get('location') or '').strip()[:100]
+    return fields
+
+
+# Process pool jobs; they only get plain arguments and must not touch the app.
+
+def _store(source, name, store):
+    ext = os.path.splitext(secure_filename(os.path.basename(name)))[1]
+    with _open(source, name) as stream:
+        return store.put(stream, ext)
+
+
+# Import
+
+def import_archive(source, kind='gallery', metadata_path=None, workers=None, batch_size=200,
+                   default_category='all', log=print):
+    """Import every image in ``source`` as a ``kind`` row; returns ``(imported, failed)``.
+
+    Must run in an app context.
+    """
+    if kind not in MODELS:
+        raise ArchiveError(f'Unknown kind {kind!r}')
+    model = MODELS[kind]
+    metadata = read_metadata(source, metadata_path)
+    names = list_images(source)
+    if not names:
+        raise ArchiveError(f'No images found in {source}')
+
+    entries, failed = [], 0
+    for name in names:
+        try:
+            entries.append((name, row_fields(kind, name, metadata.get(name, {}), default_category)))
+        except ArchiveError as exc:
+            log(f'{name}: skipped, {exc}')
+            failed += 1
+
+    imported = 0
+    pending = []
+
+    def commit_batch(force=False):
+        nonlocal imported
+        if pending and (force or len(pending) >= batch_size):
+            db.session.add_all(pending)
+            db.session.commit()
+            # Flagged once committed, so burst shots within one batch find each other.
+            for row in pending:
+                duplicate_index.flag(row)
+            db.session.commit()
+            imported += len(pending)
+            log(f'{imported}/{len(entries)} imported')
+            pending.clear()
+
+    with ProcessPoolExecutor(workers) as pool:
+        # 1. Copy and hash every image into the media store.
+        stored = {}
+        futures = {pool.submit(_store, source, name, media_store): (name, fields) for name, fields in entries}
+        for future in as_completed(futures):
+            name, fields = futures[future]
+            try:
+                digest, relative_path, size = future.result()
+            except Exception as exc:
+                log(f'{name}: skipped, {exc}')
+                failed += 1
+                continue
+            stored.setdefault(digest, {'path': relative_path, 'size': size, 'rows': []})['rows'].append((name, fields))
+
+        # 2. Reuse renditions of images that are already on the site, render the rest once per digest.
+        blobs = {}
+        digests = list(stored)
+        for start in range(0, len(digests), 500):
+            for blob in MediaBlob.query.filter(MediaBlob.sha256.in_(digests[start:start + 500])):
+                blobs[blob.sha256] = blob.path
+        renders = {}
+        for digest, item in stored.items():
+            path = blobs.get(digest, item['path'])
+            item['url'] = media_store.url(path)
+            existing = _ready_row(item['url'])
+            if existing is not None:
+                item['renditions'] = existing.renditions
+                add_rows(model, digest, item, pending)
+                commit_batch()
+            else:
+                renders[pool.submit(render_image, *rendition_job(item['url']))] = digest
+
+        # 3. Insert rows as their renditions finish.
+        for future in as_completed(renders):
+            digest = renders[future]
+            item = stored[digest]
+            try:
+                result = future.result()
+            except Exception as exc:
+                for name, _ in item['rows']:
+                    log(f'{name}: skipped, {exc}')
+                failed += len(item['rows'])
+                if digest not in blobs:
+                    media_store.delete(item['path'])
+                continue
+            item['renditions'] = result
+            add_rows(model, digest, item, pending)
+            commit_batch()
+    commit_batch(force=True)
+    return imported, failed
+
+
+def _ready_row(image_path):
+    for model in MODELS.values():
+        row = model.query.filter_by(image_path=image_path, image_status='ready').first()
+        if row is not None:
+            return row
+    return None
+
+
+def add_rows(model, digest, item, pending):
+    for _, fields in item['rows']:
+        row = model(**fields)
+        row.image_path = reference_media(digest, item['path'], item['size'])
+        row.set_renditions(item['renditions'])
+        row.image_status = 'ready'
+        pending.append(row)
+
+
+# Export
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', (text or '').lower()).strip('-')[:40] or 'image'
+
+
+def export_archive(output, kind='gallery', batch_size=500, log=print):
+    """Write every ``kind`` row and its original image to the zip file object ``output``.
+
+    ``output`` need not be seekable, so it can be stdout. Returns the number of rows written.
+    """
+    if kind not in MODELS:
+        raise ArchiveError(f'Unknown kind {kind!r}')
+    model = MODELS[kind]
+    columns = ('file',) + FIELDS[kind]
+    written = 0
+    with tempfile.TemporaryFile() as spool, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        sidecar = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+        writer = csv.DictWriter(sidecar, columns)
+        writer.writeheader()
+        last_id = 0
+        while True:
+            rows = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                name = f'images/{row.id}-{_slug(row.title)}{os.path.splitext(row.image_path or "")[1].lower()}'
+                missing = not row.image_path
+                if not missing:
+                    try:
+                        with local_image(row.image_path) as filepath:
+                            # Photos are already compressed; deflating them again only costs time.
+                            archive.write(filepath, name, compress_type=zipfile.ZIP_STORED)
+                    except FileNotFoundError:
+                        missing = True
+                if missing:
+                    log(f'{model.__name__} {row.id}: image {row.image_path!r} is missing, skipped')
+                    continue
+                record = {'file': name, 'title': row.title, 'description': row.description or ''}
+                if kind == 'gallery':
+                    record['category'] = row.category
+                else:
+                    record['date'] = row.date.isoformat(sep=' ', timespec='minutes')
+                    record['location'] = row.location or ''
+                writer.writerow(record)
+                written += 1
+            last_id = rows[-1].id
+            db.session.expunge_all()
+        sidecar.flush()
+        spool.seek(0)
+        info = zipfile.ZipInfo('metadata.csv', time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, 'w') as target:
+            shutil.copyfileobj(spool, target)
+        sidecar.detach()
+    return written
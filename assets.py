@@ -0,0 +1,299 @@
+"""Fingerprinted, minified and precompressed static bundles.
+
+``flask assets-build`` compiles Tailwind, concatenates and minifies the
+``BUNDLES`` below and writes each one to ``static/dist`` under a name carrying
+a hash of its content, next to ``.gz`` and ``.br`` copies compressed once at
+build time. ``static/dist/manifest.json`` maps logical names to the hashed
+files, and templates link them with ``asset_url('css/site.css')``.
+
+Hashed files never change content, so ``/assets/`` serves them with a
+one-year immutable lifetime and picks the precompressed copy the client
+accepts. Without a build (a fresh checkout, development) the same URLs serve
+the bundles concatenated on the fly, uncached.
+
+Icons are not fetched from a CDN: ``static/js/icons.js`` is a vendored subset
+of Lucide holding only the icons the templates and scripts use, regenerated
+by the build whenever the ``python-lucide`` package is installed.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from flask import abort, current_app, request, send_from_directory, url_for
+
+logger = logging.getLogger(__name__)
+
+# Logical name -> source files under static/, concatenated in order.
+BUNDLES = {
+    'css/site.css': ['css/tailwind.css', 'css/style.css'],
+    'css/style.css': ['css/style.css'],
+    'js/site.js': ['js/icons.js', 'js/script.js'],
+    'js/uploader.js': ['js/uploader.js'],
+}
+
+ICONS_PATH = 'js/icons.js'
+
+# Names Lucide has renamed since the templates were written.
+ICON_ALIASES = {'home': 'house'}
+
+# Brand icons Lucide has dropped, kept from its last release that shipped them (ISC licence).
+EXTRA_ICONS = {
+    'facebook': '<path d="M18 2h-3a5 5 0 0 0-5 5v3H7v4h3v8h4v-8h3l1-4h-4V7a1 1 0 0 1 1-1h3z"/>',
+    'instagram': '<rect width="20" height="20" x="2" y="2" rx="5" ry="5"/>'
+                 '<path d="M16 11.37A4 4 0 1 1 12.63 8 4 4 0 0 1 16 11.37z"/>'
+                 '<line x1="17.5" x2="17.51" y1="6.5" y2="6.5"/>',
+    'linkedin': '<path d="M16 8a6 6 0 0 1 6 6v7h-4v-7a2 2 0 0 0-2-2 2 2 0 0 0-2 2v7h-4v-7a6 6 0 0 1 6-6z"/>'
+                '<rect width="4" height="12" x="2" y="9"/><circle cx="4" cy="4" r="2"/>',
+    'twitter': '<path d="M22 4s-.7 2.1-2 3.4c1.6 10-9.4 17.3-18 11.6 2.2.1 4.4-.6 6-2C3 15.5.5 9.6 3 5c2.2 2.6 5.6 '
+               '4.1 9 4-.9-4.2 4-6.6 7-3.8 1.1 0 3-1.2 3-1.2z"/>',
+}
+
+ICONS_TEMPLATE = """\
+// Generated by `flask assets-build` from the data-lucide names used in
+// templates/ and static/js/. Do not edit by hand.
+(function () {
+    var ICONS = %(icons)s;
+    var SVG_ATTRS = 'xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" ' +
+        'stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"';
+
+    // Replace every <i data-lucide="name"> under root with its inline SVG,
+    // keeping the element's attributes, the way lucide.createIcons() does.
+    function createIcons(root) {
+        (root || document).querySelectorAll('[data-lucide]').forEach(function (el) {
+            var name = el.getAttribute('data-lucide');
+            if (!ICONS.hasOwnProperty(name)) return;
+            var holder = document.createElement('div');
+            holder.innerHTML = '<svg ' + SVG_ATTRS + '>' + ICONS[name] + '</svg>';
+            var svg = holder.firstChild;
+            Array.prototype.forEach.call(el.attributes, function (attr) {
+                if (attr.name !== 'data-lucide') svg.setAttribute(attr.name, attr.value);
+            });
+            svg.setAttribute('class', ('lucide lucide-' + name + ' ' + (el.getAttribute('class') || '')).trim());
+            el.parentNode.replaceChild(svg, el);
+        });
+    }
+
+    window.lucide = { icons: ICONS, createIcons: createIcons };
+    document.addEventListener('DOMContentLoaded', function () { createIcons(); });
+})();
+"""
+
+_ICON_ATTR = re.compile(r"""data-lucide\s*=\s*(?:"([^"]*)"|'([^']*)')|setAttribute\(\s*['"]data-lucide['"]\s*,\s*['"]([\w-]+)['"]""")
+_QUOTED_NAME = re.compile(r"""['"]([a-z0-9]+(?:-[a-z0-9]+)*)['"]""")
+
+
+class AssetBuildError(Exception):
+    pass
+
+
+def used_icons(*directories):
+    """Return the Lucide icon names referenced under ``directories``.
+
+    Names chosen inside a Jinja expression (``data-lucide="{{ 'a' if x else 'b' }}"``)
+    are found by taking every quoted literal in the expression.
+    """
+    names = set()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if d != 'dist']
+            for filename in files:
+                if not filename.endswith(('.html', '.js')) or filename == os.path.basename(ICONS_PATH):
+                    continue
+                with open(os.path.join(root, filename), encoding='utf-8') as f:
+                    text = f.read()
+                for match in _ICON_ATTR.finditer(text):
+                    value = next(group for group in match.groups() if group is not None)
+                    if '{{' in value:
+                        names.update(_QUOTED_NAME.findall(value))
+                    elif value:
+                        names.add(value.strip())
+    return names
+
+
+def icon_markup(names):
+    """Return ``{name: inner SVG markup}`` for ``names`` from the python-lucide package."""
+    from lucide import get_icon_list, lucide_icon
+
+    available = set(get_icon_list())
+    icons = {}
+    for name in sorted(names):
+        if name in EXTRA_ICONS:
+            icons[name] = EXTRA_ICONS[name]
+            continue
+        source = ICON_ALIASES.get(name, name)
+        if source not in available:
+            logger.warning('Unknown Lucide icon %r', name)
+            continue
+        svg = lucide_icon(source)
+        inner = re.search(r'<svg[^>]*>(.*)</svg>', svg, re.S).group(1)
+        icons[name] = re.sub(r'\s*\n\s*', '', inner).replace(' />', '/>')
+    return icons
+
+
+def write_icons(app):
+    """Regenerate the vendored icon subset; returns the icon names, or None without python-lucide."""
+    try:
+        import lucide  # noqa: F401
+    except ImportError:
+        return None
+    icons = icon_markup(used_icons(os.path.join(app.root_path, 'templates'), app.static_folder))
+    path = os.path.join(app.static_folder, ICONS_PATH)
+    body = json.dumps(icons, indent=8, sort_keys=True).replace('\n}', '\n    }')
+    with open(path, 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write(ICONS_TEMPLATE % {'icons': body})
+    return sorted(icons)
+
+
+def compile_tailwind(app):
+    """Rebuild static/css/tailwind.css with the Tailwind CLI, purged against the templates.
+
+    Returns False when no CLI is installed (``npm install`` was not run); the
+    committed tailwind.css is bundled as it is.
+    """
+    local = os.path.join(app.root_path, 'node_modules', '.bin', 'tailwindcss')
+    cli = local if os.path.exists(local) else shutil.which('tailwindcss')
+    if cli is None:
+        return False
+    result = subprocess.run(
+        [cli, '-i', 'src/styles.css', '-o', 'static/css/tailwind.css', '--minify'],
+        cwd=app.root_path, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise AssetBuildError(f'tailwindcss failed:\n{result.stderr}')
+    return True
+
+
+def concatenate(static_folder, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8-sig') as f:
+            parts.append(f.read().strip())
+    # The semicolon keeps concatenated scripts from running into each other.
+    separator = '\n;\n' if sources[0].endswith('.js') else '\n'
+    return separator.join(parts) + '\n'
+
+
+def minify(name, text):
+    try:
+        if name.endswith('.css'):
+            from rcssmin import cssmin
+            return cssmin(text)
+        if name.endswith('.js'):
+            from rjsmin import jsmin
+            return jsmin(text)
+    except ImportError:
+        logger.warning('Minifier for %s not installed, bundling it unminified', name)
+    return text
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    # mkstemp creates the file owner-only; a front-end server must be able to read it.
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def _compressed(data):
+    """Yield ``(suffix, bytes)`` for each encoding worth storing next to ``data``."""
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        yield '.gz', gz
+    try:
+        import brotli
+    except ImportError:
+        return
+    br = brotli.compress(data, quality=11)
+    if len(br) < len(data):
+        yield '.br', br
+
+
+def build(app):
+    """Write every bundle to static/dist and return the new manifest.
+
+    Files from earlier builds are left in place: cached pages may still link
+    them, and they cost nothing once superseded.
+    """
+    dist = os.path.join(app.static_folder, 'dist')
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        data = minify(name, concatenate(app.static_folder, sources)).encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+        path = os.path.join(dist, *hashed.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, data)
+        for suffix, compressed in _compressed(data):
+            _write(path + suffix, compressed)
+        manifest[name] = hashed
+    _write(os.path.join(dist, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.max_age = 365 * 24 * 3600
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.dist = os.path.join(app.static_folder, 'dist')
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self.load_manifest()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+        app.extensions['assets'] = self
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist, 'manifest.json'), encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self._hashed = set(self.manifest.values())
+
+    def url(self, name):
+        """URL of the bundle ``name`` (``'css/site.css'``): its hashed build if there is one."""
+        if name in self.manifest:
+            return url_for('assets', filename=self.manifest[name])
+        if name in BUNDLES:
+            return url_for('assets', filename=name)
+        return url_for('static', filename=name)
+
+    def serve(self, filename):
+        if filename in self._hashed:
+            return self._serve_built(filename)
+        if filename in BUNDLES:
+            # Development fallback: nothing has been built, so bundle on request.
+            response = current_app.response_class(
+                concatenate(current_app.static_folder, BUNDLES[filename]),
+                mimetype=mimetypes.guess_type(filename)[0])
+            response.cache_control.no_cache = True
+            return response
+        abort(404)
+
+    def _serve_built(self, filename):
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.exists(os.path.join(self.dist, filename + suffix)):
+                encoding = candidate
+                break
+        if encoding is None:
+            response = send_from_directory(self.dist, filename, mimetype=mimetype, max_age=self.max_age)
+        else:
+            response = send_from_directory(self.dist, filename + suffix, mimetype=mimetype, max_age=self.max_age)
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
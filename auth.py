@@ -0,0 +1,69 @@
+"""Admin login, logout and password reset."""
+import os
+
+from flask import Blueprint, flash, redirect, render_template, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from extensions import db, login_manager, metrics
+from forms import LoginForm, ResetForm
+from identity_cache import IdentityCache
+from metrics import cache_collector
+from models import User
+
+bp = Blueprint('auth', __name__)
+
+user_cache = IdentityCache(User)
+
+@bp.record_once
+def configure_user_cache(state):
+    user_cache.ttl = state.app.config['USER_CACHE_TTL']
+    # Password resets and other edits drop the cached copy when they commit.
+    user_cache.watch()
+    metrics.add_collector('user_cache', cache_collector('user', user_cache))
+
+@login_manager.user_loader
+def load_user(user_id):
+    return user_cache.get(db.session, int(user_id))
+
+@bp.route('/forgot-password', methods=['GET', 'POST'])
+def forgot_password():
+    form = ResetForm()
+    if form.validate_on_submit():
+        if form.username.data == 'admin':
+            user = User.query.filter_by(username='admin').first()
+            if user:
+                # Only allow reset if DEFAULT_ADMIN_PASSWORD is set in environment
+                default_pwd = os.environ.get('DEFAULT_ADMIN_PASSWORD')
+                if not default_pwd:
+                    flash('Admin password reset is disabled. Set DEFAULT_ADMIN_PASSWORD in environment to enable.', 'danger')
+                else:
+                    user.password = generate_password_hash(default_pwd)
+                    db.session.commit()
+                    flash('Password reset successfully! (value taken from DEFAULT_ADMIN_PASSWORD)', 'success')
+                return redirect(url_for('auth.login'))
+            else:
+                flash('Admin user not found.', 'danger')
+        else:
+            flash('Only admin password can be reset.', 'danger')
+    return render_template('forgot_password.html', form=form)
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('admin.dashboard'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        if user and check_password_hash(user.password, form.password.data):
+            login_user(user)
+            return redirect(url_for('admin.dashboard'))
+        else:
+            flash('Login unsuccessful. Please check username and password', 'danger')
+    return render_template('login.html', form=form)
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('public.index'))
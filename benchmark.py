@@ -0,0 +1,411 @@
+"""Benchmark the public and admin routes against a seeded database.
+
+Builds a throwaway SQLite database with the migrations, seeds it with
+``--gallery`` / ``--events`` / ``--team`` rows, then drives each scenario
+in-process with ``--concurrency`` test clients, ``--requests`` requests each,
+and records for every scenario:
+
+    p50/p95/p99 and mean latency, throughput, errors,
+    SQL statements and database time per request, resident memory
+
+The results are written to ``--output`` as JSON. Run it again with
+``--compare`` to diff against a saved baseline; it exits with status 1 when a
+scenario got slower than ``--tolerance`` allows or runs more queries:
+
+    python benchmark.py --gallery 10000 --events 1000 --team 500 --output benchmark.json
+    python benchmark.py --compare benchmark.json
+
+The page cache is off unless ``--page-cache`` is given, so the views really
+run. Only compare numbers taken on the same machine.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from loadtest import percentile
+
+SCENARIOS = [
+    # name, logged in as admin, method, path, flow (a FLOWS function that makes the request itself)
+    ('home', False, 'GET', '/', None),
+    ('about', False, 'GET', '/about', None),
+    ('events', False, 'GET', '/events', None),
+    ('team', False, 'GET', '/team', None),
+    ('gallery', False, 'GET', '/gallery', None),
+    ('gallery_category', False, 'GET', '/gallery?category=portrait', None),
+    ('api_gallery_page', False, 'GET', '/api/gallery?limit=48', None),
+    ('api_gallery_taken', False, 'GET', '/api/gallery?limit=48&sort=taken&shape=wide', None),
+    ('api_gallery_camera', False, 'GET', '/api/gallery?limit=48&camera=X-T4', None),
+    ('api_gallery_color', False, 'GET', '/api/gallery?limit=48&color=blue', None),
+    ('search', False, 'GET', '/search?q=photo', None),
+    ('api_search', False, 'GET', '/api/search?q=port', None),
+    ('contact', False, 'GET', '/contact', None),
+    ('admin_dashboard', True, 'GET', '/admin', None),
+    ('admin_gallery', True, 'GET', '/admin/gallery', None),
+    ('admin_events', True, 'GET', '/admin/events', None),
+    ('admin_team', True, 'GET', '/admin/team', None),
+    ('admin_edit_event', True, 'POST', None, 'edit_event'),
+    ('admin_edit_team_member', True, 'POST', None, 'edit_team_member'),
+    ('admin_upload', True, 'POST', None, 'upload'),
+]
+
+CSRF_INPUT = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+CATEGORIES = ['portrait', 'landscape', 'street', 'nature', 'events']
+CAMERAS = ['X-T4', 'X100V', 'EOS R6', 'Z 6II', 'ILCE-7M4']
+WORDS = ('photo light portrait street night colour film frame lens studio shadow golden hour '
+         'landscape macro city river festival workshop exhibition print darkroom').split()
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def make_app(database_path, media_root, page_cache):
+    from app import create_app
+    from config import DevelopmentConfig
+
+    class BenchmarkConfig(DevelopmentConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+        SECRET_KEY = 'benchmark'
+        SESSION_COOKIE_SECURE = False
+        REMEMBER_COOKIE_SECURE = False
+        MEDIA_ROOT = media_root
+        JOB_QUEUE_MODE = 'thread'
+        JOB_QUEUE_WORKERS = 1
+        PAGE_CACHE_BACKEND = page_cache
+        METRICS_DIR = None
+        METRICS_SERVER_TIMING = 'off'
+        QUERY_GUARD_STRICT = False
+
+    return create_app(BenchmarkConfig)
+
+
+def seed(app, gallery, events, team, rng):
+    """Create the schema with the migrations and bulk insert the rows."""
+    from flask_migrate import Migrate, upgrade
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from extensions import db, search_index
+    from models import AboutContent, Event, GalleryItem, HomeContent, TeamAchievement, TeamMember, User, utcnow
+    from palette import COLOR_NAMES
+    from search import include_object
+
+    Migrate(app, db, include_object=include_object)
+    with app.app_context():
+        upgrade(directory=os.path.join(app.root_path, 'migrations'))
+        now = utcnow()
+        db.session.add(User(username='admin', email='admin@example.com', password=generate_password_hash('benchmark'),
+                            is_admin=True))
+        home = HomeContent(hero_subtitle=words(rng, 20), cta_text=words(rng, 15))
+        home.set_features([{'title': words(rng, 2), 'description': words(rng, 12)} for _ in range(4)])
+        db.session.add(home)
+        db.session.add(AboutContent(title='About us', content=words(rng, 400)))
+        db.session.execute(insert(GalleryItem), [{
+            'title': words(rng, 3)[:100],
+            'description': words(rng, 25),
+            'image_path': f'seed/{i:06d}.jpg',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'image_width': 1067 if i % 3 == 0 else 1600,
+            'image_height': 1600 if i % 3 == 0 else 1067,
+            'aspect_ratio': 0.6669 if i % 3 == 0 else 1.4995,
+            'camera_model': CAMERAS[i % len(CAMERAS)] if i % 10 else None,
+            'color_name': COLOR_NAMES[i % len(COLOR_NAMES)],
+            'taken_at': now - timedelta(hours=(i * 7919) % (24 * 365 * 5)) if i % 10 else None,
+            'image_status': 'ready',
+            'uploaded_at': now - timedelta(minutes=i),
+            'updated_at': now - timedelta(minutes=i),
+        } for i in range(gallery)])
+        db.session.execute(insert(Event), [{
+            'title': words(rng, 4)[:100],
+            'description': words(rng, 60),
+            'date': now + timedelta(days=i - events // 2),
+            'location': words(rng, 2),
+            'image_status': 'ready',
+            'updated_at': now,
+        } for i in range(events)])
+        db.session.execute(insert(TeamMember), [{
+            'name': f'Member {i}',
+            'role': words(rng, 1),
+            'specialty': words(rng, 2),
+            'bio': words(rng, 50),
+            'image': f'https://example.com/team/{i}.jpg',
+            'email': f'member{i}@example.com',
+            'is_core': i < 12,
+            'updated_at': now,
+        } for i in range(team)])
+        member_ids = db.session.scalars(db.select(TeamMember.id)).all()
+        db.session.execute(insert(TeamAchievement), [
+            {'member_id': member_id, 'position': position, 'text': words(rng, 6)}
+            for member_id in member_ids for position in range(2)])
+        db.session.commit()
+        # Bulk inserts skip the ORM flush that keeps the search index current.
+        search_index.reindex(db.session)
+        return {
+            'event_ids': db.session.scalars(db.select(Event.id).limit(64)).all(),
+            'member_ids': member_ids[:64],
+        }
+
+
+def jpeg(rng, width=640, height=480):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    image = Image.effect_noise((width, height), rng.randint(10, 100)).convert('RGB')
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def csrf_token(client, path):
+    match = CSRF_INPUT.search(client.get(path).get_data(as_text=True))
+    if match is None:
+        raise SystemExit(f'No CSRF token on {path}')
+    return match.group(1)
+
+
+def log_in(client):
+    response = client.post('/login', data={'username': 'admin', 'password': 'benchmark',
+                                           'csrf_token': csrf_token(client, '/login')})
+    if response.status_code != 302:
+        raise SystemExit(f'Benchmark login failed with status {response.status_code}')
+    # One token serves the whole session, forms and JSON endpoints alike.
+    client.csrf = csrf_token(client, '/admin/about')
+
+
+def edit_event(client, ids, worker, index):
+    # Each client edits its own row, as separate admins would.
+    event_id = ids['event_ids'][worker % len(ids['event_ids'])]
+    return client.post(f'/admin/events/edit/{event_id}', data={
+        'title': f'Edited event {index}', 'description': 'Benchmark edit', 'date': '2030-01-01', 'location': 'Studio',
+        'csrf_token': client.csrf})
+
+
+def edit_team_member(client, ids, worker, index):
+    member_id = ids['member_ids'][worker % len(ids['member_ids'])]
+    return client.post(f'/admin/team/edit/{member_id}', data={
+        'name': f'Member edited {index}', 'role': 'Lead', 'specialty': 'Portraits', 'bio': 'Benchmark edit',
+        'achievements-0': 'Award', 'image': 'https://example.com/team/0.jpg', 'csrf_token': client.csrf})
+
+
+def upload(client, ids, worker, index):
+    """The uploader's whole flow: create, one PATCH per chunk, finalize, batch create."""
+    data = ids['images'][index % len(ids['images'])]
+    headers = {'X-CSRFToken': client.csrf}
+    response = client.post('/admin/uploads', headers=headers, json={
+        'filename': f'bench-{index}.jpg', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()})
+    if response.status_code != 201:
+        return response
+    state = response.get_json()
+    for offset in range(0, len(data), state['chunk_size']):
+        response = client.patch(f"/admin/uploads/{state['id']}", data=data[offset:offset + state['chunk_size']],
+                                headers={**headers, 'Upload-Offset': str(offset)})
+        if response.status_code != 200:
+            return response
+    response = client.post(f"/admin/uploads/{state['id']}/finalize", headers=headers, json={})
+    if response.status_code != 200:
+        return response
+    return client.post('/admin/gallery/batch', headers=headers,
+                       json={'items': [{'upload_id': state['id'], 'title': f'Upload {index}'}]})
+
+
+FLOWS = {'edit_event': edit_event, 'edit_team_member': edit_team_member, 'upload': upload}
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_scenario(app, scenario, ids, requests, concurrency, warmup):
+    from extensions import db
+    from query_guard import count_queries
+
+    name, admin, method, path, flow = scenario
+    latencies, queries, db_seconds, errors = [], [], [], []
+    lock = threading.Lock()
+    with app.app_context():
+        engine = db.engine
+
+    def client_loop(worker, first, count, record, barrier=None):
+        client = app.test_client()
+        if admin:
+            log_in(client)
+        if barrier is not None:
+            barrier.wait()
+        for i in range(count):
+            index = first + i
+            started = time.perf_counter()
+            with count_queries(engine) as counter:
+                if flow is not None:
+                    response = FLOWS[flow](client, ids, worker, index)
+                else:
+                    response = client.open(path, method=method)
+                response.get_data()
+            elapsed = time.perf_counter() - started
+            if record:
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(counter.count)
+                    db_seconds.append(counter.seconds)
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+
+    if warmup:
+        client_loop(concurrency, requests, warmup, record=False)
+    per_client = max(requests // concurrency, 1)
+    # Clients log in before the clock starts.
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=client_loop, args=(worker, worker * per_client, per_client, True, barrier))
+               for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'queries_avg': statistics.fmean(queries) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+        'db_ms_avg': statistics.fmean(db_seconds) * 1000 if db_seconds else 0.0,
+        'rss_mb': rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, current, tolerance, min_ms):
+    """Print a diff of ``current`` against ``baseline``; return the scenarios that regressed."""
+    regressions = []
+    print(f"\n{'scenario':<24}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'queries':>12}")
+    for name, now in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            print(f'{name:<24}{"(new)":>10}{now["p95_ms"]:>10.1f}')
+            continue
+        change = (now['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        slower = change > tolerance and now['p95_ms'] - base['p95_ms'] > min_ms
+        more_queries = now['queries_max'] > base['queries_max']
+        flag = '  SLOWER' if slower else ''
+        flag += '  MORE QUERIES' if more_queries else ''
+        print(f"{name:<24}{base['p95_ms']:>10.1f}{now['p95_ms']:>10.1f}{change:>+9.0%}"
+              f"{base['queries_max']:>5} -> {now['queries_max']:<4}{flag}")
+        if slower or more_queries:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--gallery', type=int, default=10000, help='GalleryItem rows to seed')
+    parser.add_argument('--events', type=int, default=1000, help='Event rows to seed')
+    parser.add_argument('--team', type=int, default=500, help='TeamMember rows to seed')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='clients running at once')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per scenario')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--page-cache', default='null', help='PAGE_CACHE_BACKEND to run with (default: off)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the generated content')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON to diff the results against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='ignore p95 slowdowns smaller than this')
+    parser.add_argument('--keep', action='store_true', help='keep the seeded database and media directory')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [scenario for scenario in SCENARIOS if scenario[0] in wanted]
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='fotografica-benchmark-')
+    try:
+        app = make_app(os.path.join(workdir, 'benchmark.db'), os.path.join(workdir, 'media'), args.page_cache)
+        started = time.perf_counter()
+        ids = seed(app, args.gallery, args.events, args.team, rng)
+        print(f'seeded {args.gallery} gallery items, {args.events} events, {args.team} team members '
+              f'in {time.perf_counter() - started:.1f}s')
+        if any(scenario[4] == 'upload' for scenario in scenarios):
+            # A distinct file per upload: identical files would be deduplicated by the media store.
+            ids['images'] = [jpeg(rng) for _ in range(args.requests + args.warmup)]
+
+        results = {}
+        print(f"\n{'scenario':<24}{'p50':>8}{'p95':>8}{'p99':>8}{'req/s':>9}{'queries':>9}{'db ms':>8}{'rss MB':>8}")
+        for scenario in scenarios:
+            result = results[scenario[0]] = run_scenario(app, scenario, ids, args.requests, args.concurrency,
+                                                         args.warmup)
+            print(f"{scenario[0]:<24}{result['p50_ms']:>8.1f}{result['p95_ms']:>8.1f}{result['p99_ms']:>8.1f}"
+                  f"{result['throughput_rps']:>9.1f}{result['queries_avg']:>9.1f}{result['db_ms_avg']:>8.2f}"
+                  f"{result['rss_mb']:>8.0f}" + (f"  {result['errors']} errors" if result['errors'] else ''))
+        app.extensions['job_queue'].shutdown(wait=True)
+    finally:
+        if args.keep:
+            print(f'\nkept {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': f'{platform.machine()} {os.cpu_count()} CPUs',
+        'volumes': {'gallery': args.gallery, 'events': args.events, 'team': args.team},
+        'settings': {'requests': args.requests, 'concurrency': args.concurrency, 'page_cache': args.page_cache},
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    failed = any(result['errors'] for result in results.values())
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('volumes') != report['volumes']:
+            print(f"\nwarning: baseline was seeded with {baseline.get('volumes')}")
+        regressions = compare(baseline, report, args.tolerance, args.min_ms)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
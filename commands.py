@@ -0,0 +1,209 @@
+"""``flask`` maintenance commands, registered by ``create_app()``."""
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from archive import ArchiveError, export_archive, import_archive
+from assets import AssetBuildError, build as build_assets, compile_tailwind, write_icons
+from duplicates import clusters, near_pairs, to_signed, to_unsigned
+from extensions import assets, db, duplicate_index, job_queue, search_index, static_site
+from media import (collect_orphaned_media, describe_image, hash_image, image_location, local_image,
+                   queue_renditions)
+from models import Event, GalleryItem
+
+@click.command('process-images')
+@with_appcontext
+def process_images():
+    """Generate renditions for uploads whose background job never finished."""
+    job_queue.mode = 'sync'
+    for model in (GalleryItem, Event):
+        for row in model.query.filter(model.image_status.in_(('pending', 'processing'))).all():
+            queue_renditions(row)
+            db.session.refresh(row)
+            print(f'{model.__name__} {row.id}: {row.image_status}')
+
+@click.command('image-metadata')
+@with_appcontext
+def image_metadata():
+    """Fill the EXIF columns of gallery images, reading originals processed before they existed."""
+    # Pillow is only needed here, not by every other command.
+    from PIL import Image
+    from imaging import read_metadata
+
+    read = 0
+    for item in GalleryItem.query.filter(GalleryItem.image_status == 'ready').all():
+        metadata = item.renditions.get('metadata')
+        if metadata is None:
+            try:
+                with local_image(item.image_path) as path, Image.open(path) as original:
+                    metadata = read_metadata(original)
+            except OSError as exc:
+                print(f'GalleryItem {item.id}: {exc}')
+                continue
+            read += 1
+        item.set_renditions(dict(item.renditions, metadata=metadata))
+    db.session.commit()
+    print(f'Read the EXIF of {read} gallery images')
+
+@click.command('gallery-duplicates')
+@click.option('--distance', type=int, help='Most bits two hashes may differ in (default: DUPLICATE_MAX_DISTANCE)')
+@click.option('--workers', type=int, help='Processes hashing images without a hash (default: one per CPU)')
+@with_appcontext
+def gallery_duplicates(distance, workers):
+    """Group near-duplicate gallery images and flag all but the oldest of each group."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    distance = duplicate_index.max_distance if distance is None else distance
+    unhashed = GalleryItem.query.filter(GalleryItem.dhash.is_(None), GalleryItem.image_status == 'ready').all()
+    if unhashed:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(hash_image, *image_location(item.image_path)): item for item in unhashed}
+            for done, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                try:
+                    item.dhash = to_signed(future.result())
+                except OSError as exc:
+                    print(f'GalleryItem {item.id}: {exc}')
+                if done % 500 == 0:
+                    db.session.commit()
+        db.session.commit()
+        print(f'Hashed {len(unhashed)} images')
+
+    rows = db.session.query(GalleryItem.id, GalleryItem.dhash).filter(GalleryItem.dhash.isnot(None)).all()
+    groups = sorted(sorted(group) for group in clusters(near_pairs([row.id for row in rows],
+                                                                   [to_unsigned(row.dhash) for row in rows],
+                                                                   distance)))
+    originals = {}
+    for group in groups:
+        for item_id in group[1:]:
+            originals[item_id] = group[0]
+    seen = set()
+    for item in GalleryItem.query.filter(GalleryItem.duplicate_of_id.isnot(None)).all():
+        item.duplicate_of_id = originals.get(item.id)
+        seen.add(item.id)
+    unflagged = [item_id for item_id in originals if item_id not in seen]
+    for start in range(0, len(unflagged), 500):
+        for item in GalleryItem.query.filter(GalleryItem.id.in_(unflagged[start:start + 500])):
+            item.duplicate_of_id = originals[item.id]
+    db.session.commit()
+
+    for group in groups:
+        print(f'#{group[0]}: ' + ', '.join(f'#{item_id}' for item_id in group[1:]))
+    print(f'{len(groups)} groups, {len(originals)} images flagged as duplicates')
+
+@click.command('image-placeholders')
+@click.option('--workers', type=int, help='Processes reading images (default: one per CPU)')
+@with_appcontext
+def image_placeholders(workers):
+    """Compute the placeholder and colours of images processed before they existed."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    described = 0
+    for model in (GalleryItem, Event):
+        rows = model.query.filter(model.placeholder.is_(None), model.image_status == 'ready').all()
+        if not rows:
+            continue
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(describe_image, *image_location(row.image_path)): row for row in rows}
+            for done, future in enumerate(as_completed(futures), 1):
+                row = futures[future]
+                try:
+                    result = future.result()
+                except OSError as exc:
+                    print(f'{model.__name__} {row.id}: {exc}')
+                    continue
+                # Only these keys, so columns filled by other backfills are left alone.
+                row.renditions = dict(row.renditions, **result)
+                row.set_palette(row.renditions)
+                described += 1
+                if done % 500 == 0:
+                    db.session.commit()
+        db.session.commit()
+    print(f'Described {described} images')
+
+@click.command('media-gc')
+@with_appcontext
+def media_gc():
+    """Delete media files no gallery item or event refers to any more."""
+    print(f'Removed {collect_orphaned_media()} orphaned media files')
+
+@click.command('publish')
+@click.option('--output', type=click.Path(file_okay=False), help='Directory to write to (default: STATIC_SITE_DIR)')
+@click.option('--force', is_flag=True, help='Rewrite every page, not only the changed ones')
+@with_appcontext
+def publish(output, force):
+    """Pre-render the public pages and copy the static assets for nginx or a CDN."""
+    if output:
+        static_site.directory = output
+    stats = static_site.publish(force=force)
+    print(f"{stats['rendered']} pages rendered, {stats['unchanged']} unchanged, {stats['removed']} removed, "
+          f"{stats['assets']} assets copied to {static_site.directory}")
+    if stats['failed']:
+        print(f"{stats['failed']} pages could not be rendered, see the log")
+        sys.exit(1)
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex():
+    """Rebuild the full-text search index from the content tables."""
+    for kind, count in search_index.reindex(db.session).items():
+        print(f'{kind}: {count} documents')
+
+@click.command('assets-build')
+@with_appcontext
+def assets_build():
+    """Compile, bundle, fingerprint and precompress the static assets."""
+    icons = write_icons(current_app)
+    if icons is None:
+        print('python-lucide not installed, keeping the existing icon subset')
+    else:
+        print(f'Icons: {", ".join(icons)}')
+    try:
+        if not compile_tailwind(current_app):
+            print('Tailwind CLI not found (run npm install), bundling the committed tailwind.css')
+    except AssetBuildError as exc:
+        raise click.ClickException(str(exc))
+    for name, hashed in build_assets(current_app).items():
+        print(f'{name} -> dist/{hashed}')
+    assets.load_manifest()
+
+@click.command('archive-import')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--kind', type=click.Choice(['gallery', 'event']), default='gallery', show_default=True)
+@click.option('--metadata', type=click.Path(exists=True, dir_okay=False),
+              help='CSV or JSON sidecar (default: metadata.csv/json inside SOURCE)')
+@click.option('--category', default='all', show_default=True, help='Gallery category for images without one')
+@click.option('--workers', type=int, help='Processes hashing and rendering images (default: one per CPU)')
+@click.option('--batch-size', type=int, default=200, show_default=True, help='Rows per transaction')
+@with_appcontext
+def archive_import(source, kind, metadata, category, workers, batch_size):
+    """Import a directory or zip of images as gallery items or events."""
+    try:
+        imported, failed = import_archive(source, kind, metadata, workers, batch_size, category)
+    except ArchiveError as exc:
+        raise click.ClickException(str(exc))
+    print(f'Imported {imported} {kind} rows, {failed} skipped')
+    if failed:
+        sys.exit(1)
+
+@click.command('archive-export')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--kind', type=click.Choice(['gallery', 'event']), default='gallery', show_default=True)
+@with_appcontext
+def archive_export(output, kind):
+    """Export gallery items or events with their images as a zip ("-" for stdout)."""
+    # Progress goes to stderr, stdout may be the archive itself.
+    if output == '-':
+        count = export_archive(click.get_binary_stream('stdout'), kind, log=_stderr)
+    else:
+        with open(output, 'wb') as f:
+            count = export_archive(f, kind, log=_stderr)
+    _stderr(f'Exported {count} {kind} rows')
+
+def _stderr(message):
+    click.echo(message, err=True)
+
+COMMANDS = [process_images, image_metadata, gallery_duplicates, image_placeholders, media_gc, publish,
+            search_reindex, assets_build, archive_import, archive_export]
@@ -0,0 +1,156 @@
+"""Brotli/gzip compression of responses as a WSGI middleware.
+
+Wrapping ``app.wsgi_app`` compresses whatever a view returns, whether it was
+rendered into one string or streamed. The encoding is negotiated from
+``Accept-Encoding`` (Brotli is preferred when the client rates both equally
+and the ``brotli`` package is installed). Only text types in the allowlist
+are compressed, and bodies with a known length below ``min_size`` are sent as
+they are, since the framing would cost more than it saves.
+
+Buffered bodies are compressed in one go. Streamed bodies are compressed
+chunk by chunk and flushed after every chunk, so a streamed page still reaches
+the browser as it is rendered.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_cache_control_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+    'application/javascript', 'application/json', 'application/xml',
+    'application/rss+xml', 'image/svg+xml',
+})
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31 writes a gzip header and trailer around the deflate stream.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=500, mimetypes=DEFAULT_MIMETYPES, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def negotiate(self, accept_encoding):
+        """Return the encoding to use for an ``Accept-Encoding`` value, or None."""
+        accept = parse_accept_header(accept_encoding)
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            if accept[encoding] > best_quality:
+                best, best_quality = encoding, accept[encoding]
+        return best
+
+    def encoder(self, encoding):
+        if encoding == 'br':
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+    def compressible(self, status, headers):
+        if status[:3] not in ('200', '201', '203', '404', '410'):
+            return False
+        if 'Content-Encoding' in headers or 'Content-Range' in headers:
+            return False
+        # The front proxy writes the body of these (see delivery.py).
+        if 'X-Accel-Redirect' in headers or 'X-Sendfile' in headers:
+            return False
+        if parse_cache_control_header(headers.get('Cache-Control')).no_transform:
+            return False
+        return headers.get('Content-Type', '').split(';')[0].strip().lower() in self.mimetypes
+
+    def __call__(self, environ, start_response):
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        body = self.app(environ, capture)
+        status, headers, exc_info = captured
+        headers = Headers(headers)
+        if not self.compressible(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return body
+        headers['Vary'] = _add_vary(headers.get('Vary', ''))
+
+        length = headers.get('Content-Length', type=int)
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if (encoding is None or environ['REQUEST_METHOD'] == 'HEAD'
+                or (length is not None and length < self.min_size)):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return body
+
+        headers['Content-Encoding'] = encoding
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # The compressed bytes differ from the representation the view
+            # tagged, so the tag can only vouch for semantic equivalence.
+            headers['ETag'] = 'W/' + etag
+        encoder = self.encoder(encoding)
+        if length is not None:
+            try:
+                data = encoder.compress(b''.join(body)) + encoder.finish()
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            headers['Content-Length'] = str(len(data))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return [data]
+        headers.remove('Content-Length')
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return ClosingIterator(_stream(body, encoder), getattr(body, 'close', None))
+
+
+def _add_vary(vary):
+    values = [value.strip() for value in vary.split(',') if value.strip()]
+    if 'accept-encoding' not in (value.lower() for value in values):
+        values.append('Accept-Encoding')
+    return ', '.join(values)
+
+
+def _stream(body, encoder):
+    for chunk in body:
+        if chunk:
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+    yield encoder.finish()
@@ -0,0 +1,91 @@
+"""HTTP conditional requests for pages rendered from the database.
+
+A view's validator is derived from cheap aggregates (row count and latest
+``updated_at``) of the models it renders, so a revalidation costs one small
+query per model and answers ``304 Not Modified`` without rendering anything.
+The ETag is also left in ``g.page_etag`` for the view; ``page_cache`` keys its
+entries by it, so a cached body is only served with the ETag it was built for.
+"""
+import hashlib
+import os
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from sqlalchemy import func
+
+
+def tree_version(*directories):
+    """Fingerprint of the files under ``directories`` (path, size and mtime).
+
+    Folding it into every ETag makes a deploy with changed templates
+    invalidate validators that browsers still hold.
+    """
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f'{root}/{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+
+def model_validator(session, *models, extra=(), with_last_modified=True):
+    """Return ``(etag, last_modified)`` for pages built from ``models``.
+
+    The row count catches deletions, which do not move ``max(updated_at)``.
+    """
+    parts = [str(value) for value in extra]
+    last_modified = None
+    for model in models:
+        count, latest = session.query(func.count(), func.max(model.updated_at)).select_from(model).one()
+        parts.append(f'{model.__tablename__}:{count}:{latest.isoformat() if latest else ""}')
+        if latest is not None and (last_modified is None or latest > last_modified):
+            last_modified = latest
+    etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+    return etag, last_modified if with_last_modified else None
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # Weak comparison: the compression middleware weakens the tags it re-encodes.
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(validator):
+    """Answer conditional GETs from ``validator()`` before running the view."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            etag, last_modified = validator()
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                g.page_etag = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Let browsers and proxies store the page but always revalidate it;
+            # logged-in visitors see flashed messages, so keep theirs private.
+            has_session = current_app.config['SESSION_COOKIE_NAME'] in request.cookies
+            response.cache_control.no_cache = True
+            if has_session:
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            response.vary.add('Cookie')
+            return response
+        # Copied onto the outer decorators by functools.wraps; static_site reads it.
+        wrapper.validator = validator
+        return wrapper
+    return decorator
@@ -1,9 +1,11 @@
-from app import app, db, User
+from app import create_app
+from extensions import db
+from models import User
 from werkzeug.security import generate_password_hash
 import os
 import getpass
 
-with app.app_context():
+with create_app().app_context():
     # Create admin user, password provided by env var DEFAULT_ADMIN_PASSWORD or prompted interactively
     admin_user = User.query.filter_by(username='admin').first()
     if not admin_user:
@@ -0,0 +1,207 @@
+"""Engine configuration, read-replica routing and connection pool metrics.
+
+``configure_engines()`` turns the ``DB_*`` settings into Flask-SQLAlchemy
+engine options before ``db.init_app()``:
+
+* Postgres and MySQL get a sized ``QueuePool`` with pre-ping, recycling and a
+  server-side statement timeout, so one runaway query cannot hold a worker
+  thread (and its connection) for minutes. SQLite keeps the driver defaults.
+* ``DATABASE_REPLICA_URL``, when set, becomes the ``replica`` bind. Views
+  decorated with ``@read_replica`` send their reads there; anything after a
+  write in the same transaction still goes to the primary, and so does
+  everything inside ``primary_reads()``.
+
+Every pooled engine uses ``MeteredQueuePool``, which counts checkouts, the time
+spent acquiring a connection and pool timeouts. ``pool_stats()`` reports them
+per engine for the current worker process. A gthread worker needs at most one
+connection per thread, so ``DB_POOL_SIZE + DB_MAX_OVERFLOW`` should cover
+``GUNICORN_THREADS`` and ``WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)``
+has to stay under the server's connection limit.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+REPLICA = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_primary_reads = ContextVar('primary_reads', default=False)
+
+
+class MeteredQueuePool(QueuePool):
+    """``QueuePool`` that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.acquire_seconds = 0.0
+        self.max_acquire_seconds = 0.0
+        self.peak_checked_out = 0
+        self._metrics_lock = threading.Lock()
+
+    def connect(self):
+        # Includes opening a new connection and the pre-ping, which is the
+        # time a request actually spends before it can run its first query.
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.acquire_seconds += elapsed
+            self.max_acquire_seconds = max(self.max_acquire_seconds, elapsed)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+    def stats(self):
+        return {
+            'pool_size': self.size(),
+            'max_overflow': self._max_overflow,
+            'checked_out': self.checkedout(),
+            'checked_in': self.checkedin(),
+            'overflow': self.overflow(),
+            'peak_checked_out': self.peak_checked_out,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'acquire_ms_avg': self.acquire_seconds * 1000 / self.checkouts if self.checkouts else 0.0,
+            'acquire_ms_max': self.max_acquire_seconds * 1000,
+        }
+
+
+def normalize_url(url):
+    """Accept the ``postgres://`` and bare ``mysql://`` URLs hosting providers hand out."""
+    if url is None:
+        return None
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('mysql://'):
+        # mysqlclient is not installed; pymysql is.
+        return 'mysql+pymysql://' + url[len('mysql://'):]
+    return url
+
+
+def engine_options(url, config, statement_timeout_ms=None):
+    """Engine keyword arguments for ``url`` from the ``DB_*`` settings in ``config``."""
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        # A file database gets the same pool class so it shows up in the
+        # metrics; Flask-SQLAlchemy swaps in a StaticPool for :memory:.
+        return {'poolclass': MeteredQueuePool}
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        # Reuse the most recently returned connection, so the surplus ones sit
+        # idle long enough to be recycled instead of all being kept warm.
+        'pool_use_lifo': True,
+    }
+    if statement_timeout_ms:
+        if backend == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout_ms)}'}
+        elif backend == 'mysql':
+            # MySQL only enforces max_execution_time on SELECT statements.
+            options['connect_args'] = {'init_command': f'SET SESSION max_execution_time={int(statement_timeout_ms)}'}
+    return options
+
+
+def configure_engines(app, cli=False):
+    """Fill in ``SQLALCHEMY_ENGINE_OPTIONS`` and the replica bind from the ``DB_*`` settings.
+
+    Options already present in ``SQLALCHEMY_ENGINE_OPTIONS`` win. The ``flask``
+    command (migrations, re-indexing, imports) runs without the statement
+    timeout, which is sized for web requests.
+    """
+    config = app.config
+    timeout = None if cli else config.get('DB_STATEMENT_TIMEOUT_MS')
+    url = config['SQLALCHEMY_DATABASE_URI'] = normalize_url(config.get('SQLALCHEMY_DATABASE_URI'))
+    if url is not None:
+        options = engine_options(url, config, timeout)
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_url = normalize_url(config.get('DATABASE_REPLICA_URL'))
+    if replica_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA, {'url': replica_url, **engine_options(replica_url, config, timeout)})
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica inside ``@read_replica`` views.
+
+    Once the session has flushed a change, everything up to the end of the
+    transaction goes to the primary so the view can read its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _replica_reads.get() and not _primary_reads.get() and not self._flushing
+                and not self.info.get('wrote')):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_to_primary(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _unpin(session):
+    session.info.pop('wrote', None)
+
+
+def read_replica(view):
+    """Run the reads of ``view`` on the replica, when one is configured.
+
+    Only for views that can tolerate replication lag: a page rendered from a
+    lagging replica is cached until the next edit or ``PAGE_CACHE_TTL``.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside ``@read_replica`` views too, for pages rendered right after a commit."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def pool_stats(db):
+    """Pool figures for every engine of ``db`` in this worker process."""
+    engines = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        stats = pool.stats() if isinstance(pool, MeteredQueuePool) else {'status': pool.status()}
+        engines[key or 'primary'] = {'pool': type(pool).__name__, **stats}
+    return {'pid': os.getpid(), 'engines': engines}
@@ -0,0 +1,129 @@
+"""Sending media files without tying up the web workers.
+
+``MEDIA_DELIVERY`` picks who moves the bytes of the media store (``/media``),
+resized images (``/img``) and files under ``static/``:
+
+``app``
+    The worker sends the file itself. Under gunicorn the file is handed to
+    ``sendfile(2)``, including the part asked for by a ``Range`` request, so
+    the bytes never pass through Python.
+``nginx``
+    The worker checks the request and answers with an ``X-Accel-Redirect``
+    to an internal location; nginx sends the file and answers ``Range``
+    itself. Each directory needs one, named after the keys passed to
+    ``init_app()`` under ``MEDIA_ACCEL_PREFIX``::
+
+        location /_accel/media/       { internal; alias /srv/fotografica/media/; }
+        location /_accel/image-cache/ { internal; alias /srv/fotografica/instance/image-cache/; }
+        location /_accel/static/      { internal; alias /srv/fotografica/static/; }
+
+``sendfile``
+    The same with an ``X-Sendfile`` header carrying the file's path, for
+    Apache (mod_xsendfile) and lighttpd.
+
+In every mode conditional requests are still answered by the app, so a
+revalidation costs neither side a file transfer.
+"""
+import mimetypes
+import os
+import zlib
+from urllib.parse import quote
+
+from flask import abort, current_app, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+MODES = ('app', 'nginx', 'sendfile')
+HEADERS = {'nginx': 'X-Accel-Redirect', 'sendfile': 'X-Sendfile'}
+
+
+class MediaDelivery:
+    def __init__(self):
+        self.mode = 'app'
+        self.locations = ()
+
+    def init_app(self, app, locations=None):
+        """``locations`` maps internal location names to the directories they serve."""
+        mode = app.config.get('MEDIA_DELIVERY') or 'app'
+        if mode not in MODES:
+            raise ValueError(f'Unknown MEDIA_DELIVERY {mode!r}, expected one of {", ".join(MODES)}')
+        self.mode = mode
+        prefix = app.config.get('MEDIA_ACCEL_PREFIX', '/_accel').rstrip('/')
+        # Longest directory first, so a location nested in another one wins.
+        self.locations = sorted(((os.path.realpath(directory) + os.sep, f'{prefix}/{name}/')
+                                 for name, directory in (locations or {}).items() if directory),
+                                key=lambda location: len(location[0]), reverse=True)
+        if app.static_folder:
+            app.view_functions['static'] = self.send_static
+        app.extensions['media_delivery'] = self
+
+    def internal_url(self, path):
+        """Where the proxy finds ``path``, or None when it has to come from the app."""
+        if self.mode == 'sendfile':
+            return os.path.realpath(path)
+        if self.mode == 'nginx':
+            path = os.path.realpath(path)
+            for directory, location in self.locations:
+                if path.startswith(directory):
+                    return location + quote(path[len(directory):].replace(os.sep, '/'))
+        return None
+
+    def send(self, path, mimetype=None, max_age=None, etag=True, file=None):
+        """Respond with the file at ``path``, through the proxy when one is configured.
+
+        ``file`` may be a handle already open on ``path``; it is sent even if
+        the file has been deleted since (an evicted cache entry, say).
+        """
+        path = os.path.abspath(path)
+        internal = self.internal_url(path)
+        if internal is not None:
+            if file is not None:
+                file.close()
+            file = None
+            stat = os.stat(path)
+        else:
+            if file is None:
+                file = open(path, 'rb')
+            stat = os.fstat(file.fileno())
+        if etag is True:
+            # The validator werkzeug derives for paths, kept for open files too.
+            etag = f'{stat.st_mtime}-{stat.st_size}-{zlib.adler32(path.encode()) & 0xFFFFFFFF}'
+        response = send_file(
+            file if file is not None else path,
+            request.environ,
+            mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            download_name=os.path.basename(path),
+            conditional=False,
+            etag=etag,
+            last_modified=stat.st_mtime,
+            max_age=max_age,
+            use_x_sendfile=internal is not None,
+            response_class=current_app.response_class,
+        )
+
+        if internal is not None:
+            # The proxy writes the body, and with it Content-Length and any 206.
+            del response.headers['X-Sendfile']
+            response.headers[HEADERS[self.mode]] = internal
+            response.headers.pop('Content-Length', None)
+            return response.make_conditional(request.environ)
+
+        response.content_length = stat.st_size
+        response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if (response.status_code == 206 and file_wrapper is not None
+                and request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')):
+            # werkzeug serves ranges by reading them in Python. Gunicorn
+            # sendfile()s a wrapped file from its current offset for
+            # Content-Length bytes, which is exactly the range.
+            file.seek(response.content_range.start)
+            response.response = file_wrapper(file)
+        return response
+
+    def send_static(self, filename):
+        """Replacement for Flask's ``static`` view that goes through ``send()``."""
+        app = current_app
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        return self.send(path, max_age=app.get_send_file_max_age(filename))
@@ -0,0 +1,38 @@
+"""Extension instances shared by the blueprints.
+
+They are created unbound and attached to an app by ``create_app()``, so any
+module can import them without importing, or building, the app itself.
+"""
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+from assets import Assets
+from database import RoutingSession
+from delivery import MediaDelivery
+from duplicates import DuplicateIndex
+from jobs import JobQueue
+from media_store import MediaStore
+from metrics import Metrics
+from page_cache import PageCache
+from query_guard import QueryGuard
+from search import SearchIndex
+from static_site import StaticSite
+from transforms import ImageTransforms
+from uploads import ChunkedUploads, DirectUploads
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+job_queue = JobQueue()
+media_store = MediaStore()
+media_delivery = MediaDelivery()
+chunked_uploads = ChunkedUploads()
+direct_uploads = DirectUploads()
+page_cache = PageCache()
+assets = Assets()
+query_guard = QueryGuard()
+search_index = SearchIndex()
+metrics = Metrics()
+duplicate_index = DuplicateIndex()
+image_transforms = ImageTransforms()
+static_site = StaticSite()
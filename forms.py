@@ -0,0 +1,84 @@
+"""Admin and login forms."""
+from flask_wtf import FlaskForm
+from wtforms import StringField, TextAreaField, PasswordField, SubmitField, SelectField, BooleanField, FileField, FieldList, FormField
+from wtforms.validators import DataRequired, Length
+
+# Subforms
+class FeatureForm(FlaskForm):
+    title = StringField('Title', validators=[DataRequired()])
+    description = TextAreaField('Description', validators=[DataRequired()])
+
+class FAQForm(FlaskForm):
+    question = StringField('Question', validators=[DataRequired()])
+    answer = TextAreaField('Answer', validators=[DataRequired()])
+
+# Forms
+class LoginForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Login')
+
+class ResetForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired()])
+    submit = SubmitField('Reset Password')
+
+class AboutForm(FlaskForm):
+    title = StringField('Title', validators=[DataRequired(), Length(max=100)])
+    content = TextAreaField('Content', validators=[DataRequired()])
+    submit = SubmitField('Update')
+
+class EventForm(FlaskForm):
+    title = StringField('Title', validators=[DataRequired(), Length(max=100)])
+    description = TextAreaField('Description', validators=[DataRequired()])
+    date = StringField('Date', validators=[DataRequired()])
+    location = StringField('Location')
+    image = FileField('Image')
+    submit = SubmitField('Add Event')
+
+GALLERY_CATEGORIES = [('all', 'All'), ('portrait', 'Portrait'), ('landscape', 'Landscape'), ('street', 'Street'), ('nature', 'Nature'), ('events', 'Events')]
+
+class GalleryForm(FlaskForm):
+    title = StringField('Title', validators=[DataRequired(), Length(max=100)])
+    description = TextAreaField('Description')
+    image_path = FileField('Image', validators=[DataRequired()])
+    category = SelectField('Category', choices=GALLERY_CATEGORIES)
+    submit = SubmitField('Add Gallery Item')
+
+class HomeForm(FlaskForm):
+    hero_subtitle = TextAreaField('Hero Subtitle', validators=[DataRequired()])
+    features = FieldList(FormField(FeatureForm), min_entries=1)
+    cta_text = TextAreaField('CTA Text', validators=[DataRequired()])
+    submit = SubmitField('Update Home')
+
+class TeamMemberForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(max=100)])
+    role = StringField('Role', validators=[DataRequired(), Length(max=50)])
+    specialty = StringField('Specialty', validators=[DataRequired(), Length(max=100)])
+    bio = TextAreaField('Bio', validators=[DataRequired()])
+    achievements = FieldList(StringField('Achievement'), min_entries=1)
+    image = StringField('Image URL', validators=[DataRequired()])
+    instagram = StringField('Instagram')
+    facebook = StringField('Facebook')
+    twitter = StringField('Twitter')
+    email = StringField('Email')
+    is_core = BooleanField('Core Team Member')
+    submit = SubmitField('Save Team Member')
+
+class ContactForm(FlaskForm):
+    email = StringField('Email', validators=[DataRequired(), Length(max=120)])
+    phone = StringField('Phone', validators=[DataRequired(), Length(max=50)])
+    phone_hours = StringField('Phone Hours', validators=[DataRequired(), Length(max=100)])
+    line1 = StringField('Address Line 1', validators=[DataRequired()])
+    line2 = StringField('Address Line 2')
+    city = StringField('City', validators=[DataRequired()])
+    state = StringField('State', validators=[DataRequired()])
+    zip_code = StringField('ZIP Code', validators=[DataRequired()])
+    weekdays = StringField('Weekdays Hours', validators=[DataRequired()])
+    weekend = StringField('Weekend Hours', validators=[DataRequired()])
+    closed = StringField('Closed Days', validators=[DataRequired()])
+    instagram = StringField('Instagram')
+    facebook = StringField('Facebook')
+    twitter = StringField('Twitter')
+    instagram_handle = StringField('Instagram Handle')
+    faq = FieldList(FormField(FAQForm), min_entries=1)
+    submit = SubmitField('Update Contact')
@@ -0,0 +1,76 @@
+"""Gunicorn settings for serving the site.
+
+Gunicorn reads this file from the working directory, so ``gunicorn wsgi:app``
+picks it up. The default profile runs ``gthread`` workers. A sync worker
+handles one connection at a time, so a couple of slow uploads or slow
+clients could tie up the whole site. With gthread, each worker process
+serves ``GUNICORN_THREADS`` requests at once, and idle keep-alive
+connections wait in the worker's event loop without holding a thread.
+
+Every value can be overridden from the environment:
+
+    WEB_CONCURRENCY        worker processes (default: 2 per CPU + 1, at most 12)
+    GUNICORN_THREADS       threads per worker (default: 8)
+    GUNICORN_WORKER_CLASS  "gthread", "sync", or "gevent" (gevent must be installed)
+    GUNICORN_TIMEOUT       seconds before a stuck worker is killed and replaced
+    GUNICORN_KEEPALIVE     seconds an idle keep-alive connection stays open
+
+To restart gracefully, send SIGHUP to the master. It starts new workers
+with fresh code and gives the old workers ``graceful_timeout`` seconds to
+finish their requests.
+"""
+import glob
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 12)))
+# config.py splits the CPUs between the workers' background process pools.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Only used by async worker classes such as gevent.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so a slow leak cannot grow without bound; the
+# jitter keeps them from all restarting at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Heartbeat files on tmpfs: a container's overlay filesystem can stall them
+# long enough for the master to kill healthy workers.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+# Each worker writes its metrics here so /metrics can report all of them
+# (see metrics.py). Workers inherit the variable from the master.
+os.environ.setdefault('METRICS_DIR', os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp',
+                                                  f'fotografica-metrics-{bind.rsplit(":", 1)[-1]}'))
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would be added to this one's counters.
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.unlink(path)
+
+
+def worker_exit(server, worker):
+    # Flush what was recorded since the last periodic snapshot.
+    from extensions import metrics
+    if getattr(metrics, 'directory', None):
+        with worker.wsgi.app_context():
+            metrics.flush()
+
+
+def child_exit(server, worker):
+    # Keep the counters of a recycled worker without keeping its file.
+    from metrics import retire_worker
+    retire_worker(os.environ['METRICS_DIR'], worker.pid)
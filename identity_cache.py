@@ -0,0 +1,87 @@
+"""Short-lived cache of rows looked up by primary key on every request.
+
+Flask-Login loads the current user once per request; across requests the same
+handful of users are loaded over and over. ``IdentityCache`` keeps a snapshot
+of their column values for ``ttl`` seconds and rebuilds a detached instance
+from it, which is merged into the request's session without a query.
+
+Snapshots are plain values rather than ORM instances, so nothing is shared
+between sessions or threads. Rows changed through the ORM are dropped from the
+cache when their transaction commits; the TTL bounds how long other processes
+can serve a stale copy.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+
+class IdentityCache:
+    def __init__(self, model, ttl=60, max_entries=1024):
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in inspect(model).column_attrs]
+        self._watched = False
+
+    def get(self, session, ident):
+        """Return the row with primary key ``ident`` attached to ``session``, or None."""
+        with self._lock:
+            entry = self._entries.get(ident)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[ident]
+                entry = None
+        if entry is not None:
+            self.hits += 1
+            obj = self.model(**entry[0])
+            make_transient_to_detached(obj)
+            return session.merge(obj, load=False)
+        self.misses += 1
+        obj = session.get(self.model, ident)
+        if obj is not None and self.ttl:
+            self.set(ident, obj)
+        return obj
+
+    def set(self, ident, obj):
+        values = {key: getattr(obj, key) for key in self._columns}
+        with self._lock:
+            self._entries[ident] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(ident)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, ident):
+        with self._lock:
+            self._entries.pop(ident, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def watch(self):
+        """Drop cached rows when a commit updates or deletes them."""
+        if self._watched:
+            return
+        self._watched = True
+
+        @event.listens_for(Session, 'after_flush')
+        def collect_changes(session, flush_context):
+            changed = session.info.setdefault('identity_cache_changed', set())
+            for obj in list(session.dirty) + list(session.deleted):
+                if isinstance(obj, self.model):
+                    changed.add(inspect(obj).identity[0])
+
+        @event.listens_for(Session, 'after_commit')
+        def invalidate_changed(session):
+            for ident in session.info.pop('identity_cache_changed', ()):
+                self.invalidate(ident)
+
+        @event.listens_for(Session, 'after_rollback')
+        def discard_changes(session):
+            session.info.pop('identity_cache_changed', None)
@@ -0,0 +1,253 @@
+"""Image derivative pipeline for uploaded photos.
+
+Originals are decoded once, orientation-corrected and re-encoded into a fixed
+set of sized renditions in modern formats, so pages never ship the camera
+original to visitors. The camera settings worth showing or filtering on are
+read from the EXIF block on the way; location data never leaves the original.
+"""
+import base64
+import io
+import os
+from datetime import datetime
+
+import numpy as np
+from PIL import ExifTags, Image, ImageOps, features
+
+import palette
+
+# Rendition name -> maximum width in pixels. Originals are never upscaled.
+RENDITIONS = (
+    ('thumb', 480),
+    ('medium', 1280),
+    ('full', 2048),
+)
+
+# Output format -> (Pillow encoder, file extension, save options), in order of
+# preference for <picture> sources. JPEG stays last as the <img> fallback.
+FORMATS = (
+    ('avif', 'AVIF', 'avif', {'quality': 55, 'speed': 6}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+# EXIF tag -> metadata key. GPS tags are deliberately not read.
+EXIF_FIELDS = (
+    (ExifTags.Base.Make, 'camera_make'),
+    (ExifTags.Base.Model, 'camera_model'),
+    (ExifTags.Base.LensModel, 'lens'),
+    (ExifTags.Base.DateTimeOriginal, 'taken_at'),
+    (ExifTags.Base.FocalLength, 'focal_length'),
+    (ExifTags.Base.FNumber, 'f_number'),
+    (ExifTags.Base.ExposureTime, 'exposure_time'),
+    (ExifTags.Base.ISOSpeedRatings, 'iso'),
+)
+
+# Longest side of the thumbnail colours are read from, and of the placeholder
+# inlined into pages while the real image loads.
+SWATCH_SIZE = 64
+PLACEHOLDER_SIZE = 16
+
+# Keys of ``Image.info`` that Pillow may write back into a saved file.
+PRIVATE_INFO = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+
+def available_formats():
+    """Return the output formats the installed Pillow build can encode."""
+    formats = []
+    for name, encoder, ext, options in FORMATS:
+        if name in ('avif', 'webp') and not features.check(name):
+            continue
+        formats.append((name, encoder, ext, options))
+    return formats
+
+
+def _prepare(image, fmt):
+    if fmt == 'jpeg':
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (0, 0, 0))
+            if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.split()[-1])
+                return background
+            return image.convert('RGB')
+        return image
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _exif_value(key, value):
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'ignore')
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    if isinstance(value, str):
+        value = value.strip('\x00 ')
+        if key == 'taken_at':
+            try:
+                return datetime.strptime(value[:19], '%Y:%m:%d %H:%M:%S').isoformat()
+            except ValueError:
+                return None
+        return value[:100] or None
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    if number != number or number <= 0:
+        return None
+    return int(number) if key == 'iso' else round(number, 6)
+
+
+def read_metadata(image):
+    """Return the camera settings and capture date from the EXIF of ``image``.
+
+    Keys missing from the file are left out. ``taken_at`` is an ISO 8601
+    string in the camera's local time, as EXIF carries no zone.
+    """
+    exif = image.getexif()
+    tags = dict(exif)
+    tags.update(exif.get_ifd(ExifTags.IFD.Exif))
+    metadata = {}
+    for tag, key in EXIF_FIELDS:
+        value = _exif_value(key, tags.get(tag))
+        if value is not None:
+            metadata[key] = value
+    orientation = tags.get(ExifTags.Base.Orientation)
+    if isinstance(orientation, int) and 1 <= orientation <= 8:
+        metadata['orientation'] = orientation
+    return metadata
+
+
+def dhash(image, size=8):
+    """Return the ``size * size``-bit difference hash of ``image`` as an unsigned int.
+
+    Each bit says whether a pixel of a ``(size + 1) x size`` grayscale
+    thumbnail is brighter than its left neighbour.
+    """
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGB')
+    # BOX averages every source pixel, so noise and resampling artefacts cancel out.
+    small = image.resize((size + 1, size), Image.BOX, reducing_gap=2.0).convert('L')
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hash_file(path):
+    """``dhash()`` of the oriented image at ``path``, decoding JPEGs at reduced size."""
+    with Image.open(path) as original:
+        original.draft('RGB', (256, 256))
+        return dhash(ImageOps.exif_transpose(original))
+
+
+def placeholder(image):
+    """A ``data:`` URI of ``image`` at most ``PLACEHOLDER_SIZE`` pixels wide, a few hundred bytes long.
+
+    Browsers stretch it over the box of the real image, which blurs it.
+    """
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+    buffer = io.BytesIO()
+    if features.check('webp'):
+        small.save(buffer, 'WEBP', quality=40, method=6)
+        mime = 'image/webp'
+    else:
+        small.save(buffer, 'JPEG', quality=40)
+        mime = 'image/jpeg'
+    return f'data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode()}'
+
+
+def describe(image):
+    """Return the ``placeholder`` and colour ``palette`` of an oriented image."""
+    swatch = image.copy()
+    swatch.thumbnail((SWATCH_SIZE, SWATCH_SIZE), Image.BOX, reducing_gap=2.0)
+    swatch = _prepare(swatch, 'jpeg')
+    return {'placeholder': placeholder(swatch), 'palette': palette.extract(swatch)}
+
+
+def describe_file(path):
+    """``describe()`` the image at ``path``, decoding JPEGs at reduced size."""
+    with Image.open(path) as original:
+        original.draft('RGB', (256, 256))
+        return describe(ImageOps.exif_transpose(original))
+
+
+def transform(source_path, output_path, width, fmt, quality=None):
+    """Write ``source_path`` resized to at most ``width`` pixels wide as ``fmt`` to ``output_path``.
+
+    ``quality`` overrides the format's default from ``FORMATS``. The file is
+    written under a temporary name and moved into place, so readers never see
+    a partial image. Returns the size of the written file.
+    """
+    encoder, options = next((encoder, dict(options)) for name, encoder, _, options in FORMATS if name == fmt)
+    if quality:
+        options['quality'] = quality
+    with Image.open(source_path) as original:
+        # JPEGs decode straight at a fraction of their size when that is enough.
+        original.draft('RGB', (width, width))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    for key in PRIVATE_INFO:
+        image.info.pop(key, None)
+    image = _prepare(image, fmt)
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    temporary = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        image.save(temporary, encoder, **options)
+        os.replace(temporary, output_path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return os.path.getsize(output_path)
+
+
+def generate_derivatives(source_path, output_dir, url_prefix, stem):
+    """Write every rendition of ``source_path`` into ``output_dir``.
+
+    Returns a dict with the oriented original ``width``/``height``, the EXIF
+    ``metadata`` from ``read_metadata()``, the ``dhash()`` as 16 hex digits,
+    the ``placeholder`` and ``palette`` from ``describe()`` and, per format, a list of
+    ``{'name', 'url', 'width', 'height'}`` entries ordered by width. EXIF, XMP
+    and comments (including any GPS position) are not copied into the renditions.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        metadata = read_metadata(original)
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    for key in PRIVATE_INFO:
+        image.info.pop(key, None)
+    width, height = image.size
+
+    sources = {}
+    for fmt, encoder, ext, options in available_formats():
+        prepared = _prepare(image, fmt)
+        entries = []
+        seen_widths = set()
+        for name, max_width in RENDITIONS:
+            target_width = min(max_width, width)
+            if target_width in seen_widths:
+                continue
+            seen_widths.add(target_width)
+            target_height = max(1, round(height * target_width / width))
+            if (target_width, target_height) == prepared.size:
+                resized = prepared
+            else:
+                resized = prepared.resize((target_width, target_height), Image.LANCZOS)
+            filename = f'{stem}-{name}.{ext}'
+            resized.save(os.path.join(output_dir, filename), encoder, **options)
+            entries.append({
+                'name': name,
+                'url': f'{url_prefix}/{filename}',
+                'width': target_width,
+                'height': target_height,
+            })
+        sources[fmt] = entries
+    return dict(describe(image), width=width, height=height, metadata=metadata, dhash=f'{dhash(image):016x}',
+                sources=sources)
+
@@ -0,0 +1,97 @@
+"""In-process background job queue.
+
+Request handlers enqueue work and return immediately. CPU-heavy functions run
+in a process pool so they never hold the GIL of a request worker; a small
+thread pool waits on them and runs the start/done callbacks inside an app
+context so they can record job state in the database.
+
+Worker processes are started by a ``forkserver``: forking a gthread worker
+directly would copy locks held by its other threads (logging, the database
+pool) into a child that can then wait on them forever.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def process_context():
+    """Start method for the process pools of the web workers."""
+    return multiprocessing.get_context('forkserver')
+
+
+class JobQueue:
+    """Runs ``fn(*args)`` off the request path.
+
+    ``JOB_QUEUE_MODE`` selects how: ``process`` (default) runs ``fn`` in a
+    worker process, ``thread`` runs it in a background thread and ``sync``
+    runs it inline, which is handy for CLI commands and debugging.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = 'process'
+        self.max_workers = 1
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = None
+        self._processes = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get('JOB_QUEUE_MODE', 'process')
+        self.max_workers = app.config.get('JOB_QUEUE_WORKERS') or os.cpu_count() or 1
+        app.extensions['job_queue'] = self
+
+    def _executors(self):
+        # Pools are created lazily and per process, so executors started before
+        # gunicorn forks its workers are never shared between them.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix='job')
+                self._processes = (ProcessPoolExecutor(self.max_workers, mp_context=process_context())
+                                   if self.mode == 'process' else None)
+                self._pid = os.getpid()
+            return self._threads, self._processes
+
+    def submit(self, fn, *args, on_start=None, on_done=None):
+        """Queue ``fn(*args)``.
+
+        ``on_start()`` runs when a worker picks the job up and
+        ``on_done(result, error)`` when it finishes; both run in an app context.
+        """
+        if self.mode == 'sync':
+            self._run(fn, args, on_start, on_done, None)
+            return None
+        threads, processes = self._executors()
+        return threads.submit(self._run, fn, args, on_start, on_done, processes)
+
+    def _run(self, fn, args, on_start, on_done, processes):
+        with self.app.app_context():
+            try:
+                if on_start is not None:
+                    on_start()
+                if processes is not None:
+                    result = processes.submit(fn, *args).result()
+                else:
+                    result = fn(*args)
+            except Exception as exc:
+                logger.exception('Background job %s failed', getattr(fn, '__name__', fn))
+                if on_done is not None:
+                    on_done(None, exc)
+            else:
+                if on_done is not None:
+                    on_done(result, None)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._threads is not None:
+                self._threads.shutdown(wait=wait)
+            if self._processes is not None:
+                self._processes.shutdown(wait=wait)
+            self._pid = self._threads = self._processes = None
@@ -0,0 +1,135 @@
+"""Load test for the public pages.
+
+Starts ``--concurrency`` clients that fetch the public routes over keep-alive
+connections as fast as the server answers, for ``--duration`` seconds, and
+reports throughput, latency percentiles and failures. ``--slow`` adds clients
+that open a connection and then trickle their request headers a few bytes at
+a time, the way slow uploads and bad mobile links do; a server that gives each
+of them a whole worker stops answering everyone else.
+
+Compare the two serving profiles on the same machine:
+
+    gunicorn wsgi:app --workers 2 --threads 1 --worker-class sync   # old Dockerfile
+    gunicorn wsgi:app                                                # gunicorn.conf.py
+    python loadtest.py http://127.0.0.1:8080 --concurrency 64 --slow 8
+"""
+import argparse
+import http.client
+import itertools
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROUTES = ['/', '/about', '/events', '/team', '/gallery', '/contact']
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def record(self, status, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def fail(self):
+        with self._lock:
+            self.errors += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def client(host, port, routes, deadline, timeout, results):
+    connection = None
+    for path in routes:
+        if time.monotonic() >= deadline:
+            break
+        if connection is None:
+            connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        started = time.monotonic()
+        try:
+            connection.request('GET', path, headers={'Accept-Encoding': 'br, gzip'})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            results.fail()
+            connection.close()
+            connection = None
+            continue
+        results.record(response.status, time.monotonic() - started)
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+
+
+def slow_client(host, port, deadline, interval):
+    """Hold a connection open by sending one header line every ``interval`` seconds."""
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=interval * 4) as sock:
+                sock.sendall(b'GET / HTTP/1.1\r\nHost: ' + host.encode() + b'\r\n')
+                for n in itertools.count():
+                    if time.monotonic() >= deadline:
+                        return
+                    time.sleep(interval)
+                    sock.sendall(f'X-Slow-{n}: {"x" * 8}\r\n'.encode())
+        except OSError:
+            # The server gave up on us (its request timeout); come straight back.
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('base_url', nargs='?', default='http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', type=int, default=32, help='clients fetching pages in a loop')
+    parser.add_argument('--slow', type=int, default=0, help='clients trickling their request headers')
+    parser.add_argument('--slow-interval', type=float, default=1.0, help='seconds between slow header lines')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('--timeout', type=float, default=10.0, help='per-request timeout in seconds')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma-separated paths to fetch')
+    args = parser.parse_args()
+
+    url = urlsplit(args.base_url)
+    host, port = url.hostname, url.port or 80
+    routes = args.routes.split(',')
+    deadline = time.monotonic() + args.duration
+    results = Results()
+
+    threads = [threading.Thread(target=slow_client, args=(host, port, deadline, args.slow_interval), daemon=True)
+               for _ in range(args.slow)]
+    for thread in threads:
+        thread.start()
+    # Give the slow clients a head start so they are holding connections when the load begins.
+    time.sleep(min(1.0, args.duration / 10) if args.slow else 0)
+    started = time.monotonic()
+    workers = [threading.Thread(target=client, args=(host, port, itertools.cycle(routes), deadline, args.timeout, results))
+               for _ in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(results.latencies)
+    total = len(latencies)
+    print(f'{args.concurrency} clients, {args.slow} slow clients, {elapsed:.1f}s')
+    print(f'requests: {total}  errors: {results.errors}  throughput: {total / elapsed:.1f} req/s')
+    print('statuses: ' + ', '.join(f'{status}={count}' for status, count in sorted(results.statuses.items())))
+    print('latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}'.format(
+        *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99)), (latencies[-1] if latencies else 0) * 1000))
+
+
+if __name__ == '__main__':
+    main()
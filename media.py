@@ -0,0 +1,177 @@
+"""Stored uploads and their renditions.
+
+Files live in the content-addressed media store and are reference-counted
+through ``MediaBlob`` rows; renditions are generated by the job queue.
+"""
+import os
+import posixpath
+
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from extensions import db, duplicate_index, job_queue, media_store
+from models import Event, GalleryItem, MediaBlob
+from storage import LocalStorage
+
+def store_media(stream, ext=''):
+    """Store an upload by content hash and take a reference to it.
+
+    Returns the public URL of the stored file; identical bytes are stored once.
+    """
+    return reference_media(*media_store.put(stream, ext))
+
+def store_media_file(path, digest, ext=''):
+    """Like store_media, for a file already on disk whose hash is known."""
+    return reference_media(*media_store.adopt(path, digest, ext))
+
+def store_media_object(key, ext=''):
+    """Like store_media, for an object uploaded straight to the storage backend."""
+    return reference_media(*media_store.adopt_object(key, ext))
+
+def reference_media(digest, relative_path, size):
+    """Take a reference to a file already in the media store and return its URL."""
+    blob = MediaBlob.query.filter_by(sha256=digest).first()
+    if blob is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(MediaBlob(sha256=digest, path=relative_path, size=size, ref_count=1))
+            return media_store.url(relative_path)
+        except IntegrityError:
+            # A concurrent upload of the same bytes inserted the row first.
+            blob = MediaBlob.query.filter_by(sha256=digest).one()
+    if blob.path != relative_path:
+        # Same bytes uploaded with a different extension: keep the first copy.
+        media_store.storage.delete(relative_path)
+    # Counted in SQL so that concurrent references don't overwrite each other.
+    blob.ref_count = MediaBlob.ref_count + 1
+    db.session.flush()
+    return media_store.url(blob.path)
+
+def release_media(image_path):
+    """Drop a reference taken by store_media; files are removed by collect_orphaned_media."""
+    relative_path = media_store.relative_from_url(image_path)
+    if relative_path is None:
+        return
+    blob = MediaBlob.query.filter_by(path=relative_path).first()
+    if blob is not None:
+        blob.ref_count = MediaBlob.ref_count - 1
+        db.session.flush()
+
+def collect_orphaned_media():
+    """Delete stored files that are no longer referenced. Call after committing."""
+    orphans = db.session.query(MediaBlob.id, MediaBlob.path).filter(MediaBlob.ref_count <= 0).all()
+    claimed = []
+    for blob_id, path in orphans:
+        # Checked again in the DELETE: a reference taken since the SELECT keeps the row and its file.
+        result = db.session.execute(delete(MediaBlob).where(MediaBlob.id == blob_id, MediaBlob.ref_count <= 0))
+        if result.rowcount == 1:
+            claimed.append(path)
+    db.session.commit()
+    removed = 0
+    for path in claimed:
+        # The same bytes may have been uploaded again since the commit.
+        if MediaBlob.query.filter_by(path=path).first() is None:
+            media_store.delete(path)
+            removed += 1
+    return removed
+
+def image_location(image_path):
+    """Return the storage backend and key holding the original of ``image_path``."""
+    relative_path = media_store.relative_from_url(image_path)
+    if relative_path is not None:
+        return media_store.storage, relative_path
+    # Uploads stored under static/images before the media store existed
+    return LocalStorage(current_app.root_path), image_path.lstrip('/')
+
+def local_image(image_path):
+    """Context manager giving a local path with the original of ``image_path``."""
+    storage, key = image_location(image_path)
+    return storage.local_file(key)
+
+def rendition_job(image_path):
+    """Return the arguments of render_image() for ``image_path``."""
+    storage, key = image_location(image_path)
+    if storage is media_store.storage:
+        url_prefix = os.path.splitext(media_store.url(key))[0]
+        return storage, key, media_store.derivatives_key(key), url_prefix, 'image'
+    directory, filename = posixpath.split(key)
+    url_prefix = image_path.rsplit('/', 1)[0] + '/derivatives'
+    return storage, key, f'{directory}/derivatives', url_prefix, os.path.splitext(filename)[0]
+
+# Process pool jobs; they get the storage backend and keys, never the app.
+
+def render_image(storage, key, output_prefix, url_prefix, stem):
+    """Generate the renditions of ``key`` and store them under ``output_prefix``."""
+    # Pillow and numpy are only needed once an image is actually processed.
+    from imaging import generate_derivatives
+    with storage.local_file(key) as source, storage.local_dir(output_prefix) as output_dir:
+        return generate_derivatives(source, output_dir, url_prefix, stem)
+
+def hash_image(storage, key):
+    from imaging import hash_file
+    with storage.local_file(key) as source:
+        return hash_file(source)
+
+def describe_image(storage, key):
+    from imaging import describe_file
+    with storage.local_file(key) as source:
+        return describe_file(source)
+
+def queue_renditions(target):
+    """Generate the renditions of ``target.image_path`` in the background.
+
+    Must be called after the row has been committed; progress is recorded in
+    ``image_status`` so the admin pages can poll it.
+    """
+    model, row_id, image_path = type(target), target.id, target.image_path
+
+    def current_row():
+        row = db.session.get(model, row_id)
+        # A newer upload may have replaced the image while this job was queued.
+        return row if row is not None and row.image_path == image_path else None
+
+    def on_start():
+        row = current_row()
+        if row is not None:
+            row.image_status = 'processing'
+            db.session.commit()
+
+    def on_done(renditions, error):
+        row = current_row()
+        if row is None:
+            return
+        if error is not None:
+            row.image_status = 'failed'
+            row.image_error = str(error)[:200]
+        else:
+            row.set_renditions(renditions)
+            duplicate_index.flag(row)
+            row.image_status = 'ready'
+            row.image_error = None
+        db.session.commit()
+
+    job_queue.submit(render_image, *rendition_job(image_path), on_start=on_start, on_done=on_done)
+
+def replace_image(target, file_storage):
+    ext = os.path.splitext(secure_filename(file_storage.filename))[1]
+    attach_image(target, store_media(file_storage.stream, ext))
+
+def attach_image(target, image_path):
+    """Point ``target`` at a stored image, reusing existing renditions of identical bytes."""
+    if target.image_path:
+        release_media(target.image_path)
+    target.image_path = image_path
+    for model in (GalleryItem, Event):
+        existing = model.query.filter_by(image_path=image_path, image_status='ready').first()
+        if existing is not None and existing is not target:
+            target.set_renditions(existing.renditions)
+            duplicate_index.flag(target)
+            target.image_status = 'ready'
+            target.image_error = None
+            return
+    target.set_renditions(None)
+    duplicate_index.flag(target)
+    target.image_status = 'pending'
+    target.image_error = None
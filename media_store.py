@@ -0,0 +1,134 @@
+"""Content-addressed storage for uploaded media.
+
+Files are named after the SHA-256 of their bytes and sharded into two levels
+of directories (``ab/cd/abcd....jpg``), so identical uploads share one file and
+a stored path never changes content, which makes it safe to cache forever.
+
+The bytes live in a storage backend (see ``storage``), on local disk or in a
+bucket. ``root`` is always a local directory: the files themselves with the
+local backend, and the scratch space uploads are hashed in with either.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from storage import LocalStorage, create_storage
+
+CHUNK_SIZE = 1024 * 1024
+# Staging areas under ``root``: uploads being hashed and chunked or direct
+# uploads that are not attached yet. Never served.
+PRIVATE_DIRS = ('tmp', 'uploads')
+
+
+class MediaStore:
+    def __init__(self, root=None, url_prefix='/media', storage=None):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.storage = storage if storage is not None or root is None else LocalStorage(root)
+
+    def init_app(self, app):
+        self.root = app.config.get('MEDIA_ROOT') or os.path.join(app.root_path, 'media')
+        self.storage = create_storage(app.config, self.root)
+        app.extensions['media_store'] = self
+
+    def relative_path(self, digest, ext=''):
+        ext = ext.lower().lstrip('.')
+        filename = f'{digest}.{ext}' if ext else digest
+        return f'{digest[:2]}/{digest[2:4]}/{filename}'
+
+    def url(self, relative_path):
+        return f'{self.url_prefix}/{relative_path}'
+
+    def relative_from_url(self, url):
+        """Return the store path for a public URL, or None for foreign URLs."""
+        prefix = self.url_prefix + '/'
+        if url and url.startswith(prefix):
+            return url[len(prefix):]
+        return None
+
+    def is_public(self, relative_path):
+        """Whether ``relative_path`` may be served, i.e. is not in a staging area."""
+        return posixpath.normpath(relative_path).split('/', 1)[0] not in PRIVATE_DIRS
+
+    def derivatives_key(self, relative_path):
+        """Key prefix of the renditions generated from a stored file."""
+        return os.path.splitext(relative_path)[0]
+
+    def open(self, relative_path):
+        return self.storage.open(relative_path)
+
+    def local_file(self, relative_path):
+        """Context manager giving a path on local disk with the stored file's bytes."""
+        return self.storage.local_file(relative_path)
+
+    def _save(self, path, relative_path):
+        # Identical content is already stored under the same name.
+        if self.storage.exists(relative_path):
+            os.remove(path)
+        else:
+            self.storage.put_file(path, relative_path, move=True)
+
+    def put(self, stream, ext=''):
+        """Stream ``stream`` into the store and return ``(digest, relative_path, size)``.
+
+        The bytes are hashed while being copied to a temporary file and only
+        stored if that content is not stored yet.
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            relative_path = self.relative_path(digest, ext)
+            self._save(tmp_path, relative_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, relative_path, size
+
+    def adopt(self, path, digest, ext=''):
+        """Store an already hashed local file, which is consumed.
+
+        Returns ``(digest, relative_path, size)`` like ``put``.
+        """
+        size = os.path.getsize(path)
+        relative_path = self.relative_path(digest, ext)
+        self._save(path, relative_path)
+        return digest, relative_path, size
+
+    def adopt_object(self, key, ext=''):
+        """Move an object uploaded straight to the storage under ``key`` into the store.
+
+        The object is hashed as it streams back from the store; only the
+        copy to its final name happens inside the store. Returns
+        ``(digest, relative_path, size)`` like ``put``.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        with self.storage.open(key) as stream:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+        digest = sha256.hexdigest()
+        relative_path = self.relative_path(digest, ext)
+        if not self.storage.exists(relative_path):
+            self.storage.copy(key, relative_path)
+        self.storage.delete(key)
+        return digest, relative_path, size
+
+    def delete(self, relative_path):
+        """Remove a stored file together with its renditions."""
+        self.storage.delete(relative_path)
+        self.storage.delete_prefix(self.derivatives_key(relative_path) + '/')
@@ -0,0 +1,372 @@
+"""Request, database, template and upload metrics in Prometheus text format.
+
+``Metrics`` times every request and records, per endpoint:
+
+    http_request_duration_seconds   wall time, including a streamed body
+    db_queries_per_request          statements run (every bind)
+    db_time_per_request_seconds     time spent in those statements
+    template_render_seconds         per template, from Flask's render signals
+
+plus ``upload_bytes_total`` / ``upload_seconds_total`` for the chunked
+uploader (their ratio is the upload rate) and whatever the registered
+collectors report: page cache and user cache hits, connection pool figures.
+``GET /metrics`` serves them to a scraper holding ``METRICS_TOKEN`` as a
+bearer token, or to a logged-in user.
+
+Gunicorn runs several worker processes and a scrape reaches only one of them.
+When ``METRICS_DIR`` is set, each worker writes a snapshot there at most once
+per ``METRICS_FLUSH_INTERVAL`` seconds and ``/metrics`` adds them all up.
+Counters of workers that have exited are kept; their gauges are dropped.
+Gunicorn's ``child_exit`` hook calls ``retire_worker()``, which folds the
+snapshot of an exited worker into ``retired.json``, so recycled workers do not
+leave a file each behind.
+
+With ``METRICS_SERVER_TIMING`` set to ``admin`` (the default) or ``all``,
+responses carry a ``Server-Timing`` header with the time spent in the app,
+the database and templates. For a streamed page it is sent with the first byte,
+so it covers the work done before rendering starts.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, abort, current_app, g, request
+from flask.signals import before_render_template, template_rendered
+from flask_login import current_user
+
+from query_guard import start_counting, stop_counting
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+DEFINITIONS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', 'SQL statements per request.', QUERY_BUCKETS),
+    'db_time_per_request_seconds': ('histogram', 'Time per request spent in SQL statements.', LATENCY_BUCKETS),
+    'template_render_seconds': ('histogram', 'Template render time.', LATENCY_BUCKETS),
+    'upload_bytes_total': ('counter', 'Bytes received by the chunked uploader.', None),
+    'upload_seconds_total': ('counter', 'Time spent receiving upload chunks.', None),
+}
+
+RETIRED = 'retired.json'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _merge(snapshots):
+    """Add up snapshots into ``(counters, gauges, histograms)`` keyed by ``(name, labels)``."""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, gauges, histograms
+
+
+def _write_snapshot(directory, name, snapshot):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def retire_worker(directory, pid):
+    """Fold the snapshot of exited worker ``pid`` into ``retired.json`` and delete it.
+
+    Meant for the gunicorn master, which reaps workers one at a time.
+    Counters and histograms are kept; gauges are dropped.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    if not os.path.exists(path):
+        return
+    snapshots = []
+    for snapshot_path in (os.path.join(directory, RETIRED), path):
+        try:
+            with open(snapshot_path, encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+    counters, _, histograms = _merge(snapshots)
+    _write_snapshot(directory, RETIRED, {
+        'pid': None,
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, buckets, total, count]
+                       for (name, labels), (buckets, total, count) in histograms.items()],
+        'gauges': [],
+    })
+    os.unlink(path)
+
+
+class Metrics:
+    def __init__(self, app=None, db=None):
+        self.definitions = dict(DEFINITIONS)
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self._flushed = 0.0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        app.extensions['metrics'] = self
+        app.before_request(self._start)
+        app.after_request(self._server_timing)
+        app.teardown_request(self._finish)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.serve)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    # Recording
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self.definitions[name] = (kind, help_text, buckets)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self.definitions[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, key, collector):
+        """Register ``collector()``, which returns ``(name, labels, value)`` samples at scrape time.
+
+        Its metric names must be declared with ``describe()``. Registering
+        another collector under the same ``key`` replaces the first.
+        """
+        self._collectors[key] = collector
+
+    def time_upload(self, view):
+        """Count the bytes a view receives and the time it spends receiving them."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.inc('upload_bytes_total', request.content_length or 0)
+                self.inc('upload_seconds_total', time.perf_counter() - started)
+        return wrapper
+
+    # Request hooks
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_template_seconds = 0.0
+        g.metrics_queries, g.metrics_queries_token = start_counting(*self.db.engines.values())
+
+    def _template_started(self, sender, template, context, **extra):
+        g.setdefault('metrics_template_starts', []).append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        starts = g.get('metrics_template_starts')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        # Nested renders (a macro rendering a template) are counted once, at the outside.
+        if not starts:
+            g.metrics_template_seconds = g.get('metrics_template_seconds', 0.0) + elapsed
+        self.observe('template_render_seconds', elapsed, template=template.name or 'string')
+
+    def _server_timing(self, response):
+        g.metrics_status = response.status_code
+        mode = current_app.config.get('METRICS_SERVER_TIMING', 'admin')
+        if mode == 'off' or 'metrics_started' not in g:
+            return response
+        if mode != 'all' and not current_user.is_authenticated:
+            return response
+        queries = g.metrics_queries
+        timings = [
+            f'app;dur={(time.perf_counter() - g.metrics_started) * 1000:.1f}',
+            f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries"',
+            f'tpl;dur={g.metrics_template_seconds * 1000:.1f}',
+        ]
+        if 'X-Cache' in response.headers:
+            timings.append(f'cache;desc="{response.headers["X-Cache"]}"')
+        response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    def _finish(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        stop_counting(g.pop('metrics_queries_token'))
+        queries = g.pop('metrics_queries')
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if exc is not None else g.get('metrics_status', 500)
+        self.observe('http_request_duration_seconds', time.perf_counter() - started,
+                     endpoint=endpoint, method=request.method, status=str(status))
+        self.observe('db_queries_per_request', queries.count, endpoint=endpoint)
+        self.observe('db_time_per_request_seconds', queries.seconds, endpoint=endpoint)
+        if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+            self._flushed = time.monotonic()
+            self.flush()
+
+    # Snapshots and exposition
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, labels, list(buckets), total, count]
+                          for (name, labels), (buckets, total, count) in self._histograms.items()]
+        gauges = []
+        for collector in self._collectors.values():
+            for name, labels, value in collector():
+                target = counters if self.definitions[name][0] == 'counter' else gauges
+                target.append([name, _label_key(labels), value])
+        return {'pid': os.getpid(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        """Write this worker's snapshot to ``METRICS_DIR`` for the others to serve."""
+        _write_snapshot(self.directory, f'{os.getpid()}.json', self.snapshot())
+
+    def _snapshots(self):
+        own = self.snapshot()
+        if not self.directory:
+            return [own]
+        snapshots = [own]
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot['pid'] == own['pid']:
+                continue
+            if snapshot['pid'] is not None and not _alive(snapshot['pid']):
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        counters, gauges, histograms = _merge(self._snapshots())
+
+        by_name = {}
+        for values in (counters, gauges):
+            for (name, labels), value in values.items():
+                by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text, buckets = self.definitions[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name[name]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self):
+        token = current_app.config.get('METRICS_TOKEN')
+        if not (token and request.headers.get('Authorization') == f'Bearer {token}') \
+                and not current_user.is_authenticated:
+            abort(404)
+        response = Response(self.render(), mimetype='text/plain')
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cache_collector(name, cache):
+    """Samples of the ``hits`` and ``misses`` counters of ``cache`` (page or user cache)."""
+    def collect():
+        yield 'cache_hits_total', {'cache': name}, cache.hits
+        yield 'cache_misses_total', {'cache': name}, cache.misses
+    return collect
+
+
+def pool_collector(db):
+    """Samples of the connection pool of every engine of ``db``."""
+    from database import MeteredQueuePool
+
+    def collect():
+        for key, engine in db.engines.items():
+            pool, labels = engine.pool, {'engine': key or 'primary'}
+            if not isinstance(pool, MeteredQueuePool):
+                continue
+            yield 'db_pool_checked_out', labels, pool.checkedout()
+            yield 'db_pool_overflow', labels, pool.overflow()
+            yield 'db_pool_checkouts_total', labels, pool.checkouts
+            yield 'db_pool_timeouts_total', labels, pool.timeouts
+            yield 'db_pool_acquire_seconds_total', labels, pool.acquire_seconds
+    return collect
+
+
+def register_default_collectors(metrics, db, page_cache):
+    metrics.describe('cache_hits_total', 'counter', 'Cache lookups answered from the cache.')
+    metrics.describe('cache_misses_total', 'counter', 'Cache lookups that missed.')
+    metrics.describe('db_pool_checked_out', 'gauge', 'Connections currently checked out of the pool.')
+    metrics.describe('db_pool_overflow', 'gauge', 'Connections open beyond the pool size (negative when below it).')
+    metrics.describe('db_pool_checkouts_total', 'counter', 'Connections handed out by the pool.')
+    metrics.describe('db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting for a connection.')
+    metrics.describe('db_pool_acquire_seconds_total', 'counter', 'Time spent waiting for a pool connection.')
+    metrics.add_collector('page_cache', cache_collector('page', page_cache))
+    metrics.add_collector('db_pool', pool_collector(db))
@@ -0,0 +1,39 @@
+"""gallery keyset pagination indexes
+
+Revision ID: 0b2d4f6a8c1e
+Revises: f1a3c5e7b9d0
+Create Date: 2026-10-18 12:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b2d4f6a8c1e'
+down_revision = 'f1a3c5e7b9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('UPDATE gallery_item SET uploaded_at = CURRENT_TIMESTAMP WHERE uploaded_at IS NULL')
+    if op.get_bind().dialect.name == 'sqlite':
+        # CURRENT_TIMESTAMP defaults were stored without the fractional part that
+        # SQLAlchemy writes, which breaks the string comparisons SQLite uses for
+        # (uploaded_at, id) cursors.
+        op.execute(
+            "UPDATE gallery_item SET uploaded_at = uploaded_at || '.000000' "
+            "WHERE uploaded_at IS NOT NULL AND uploaded_at NOT LIKE '%.%'"
+        )
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.alter_column('uploaded_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_gallery_item_uploaded_at_id', ['uploaded_at', 'id'], unique=False)
+        batch_op.create_index('ix_gallery_item_category_uploaded_at_id', ['category', 'uploaded_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_gallery_item_category_uploaded_at_id')
+        batch_op.drop_index('ix_gallery_item_uploaded_at_id')
+        batch_op.alter_column('uploaded_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,98 @@
+"""initial schema
+
+Revision ID: 3f1c2a9d8e01
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8e01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=20), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=256), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('about_content',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=True),
+    sa.Column('image_path', sa.String(length=200), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('gallery_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('image_path', sa.String(length=200), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=True),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('home_content',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hero_subtitle', sa.Text(), nullable=False),
+    sa.Column('features', sa.Text(), nullable=False),
+    sa.Column('cta_text', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('team_member',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('role', sa.String(length=50), nullable=False),
+    sa.Column('specialty', sa.String(length=100), nullable=False),
+    sa.Column('bio', sa.Text(), nullable=False),
+    sa.Column('achievements', sa.Text(), nullable=False),
+    sa.Column('image', sa.String(length=200), nullable=False),
+    sa.Column('social', sa.Text(), nullable=False),
+    sa.Column('is_core', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('contact_info',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('phone', sa.String(length=50), nullable=False),
+    sa.Column('phone_hours', sa.String(length=100), nullable=False),
+    sa.Column('address', sa.Text(), nullable=False),
+    sa.Column('office_hours', sa.Text(), nullable=False),
+    sa.Column('social_links', sa.Text(), nullable=False),
+    sa.Column('faq', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('contact_info')
+    op.drop_table('team_member')
+    op.drop_table('home_content')
+    op.drop_table('gallery_item')
+    op.drop_table('event')
+    op.drop_table('about_content')
+    op.drop_table('user')
@@ -0,0 +1,70 @@
+"""full-text search index
+
+Revision ID: 5d7e9f1b3a24
+Revises: 0b2d4f6a8c1e
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e9f1b3a24'
+down_revision = '0b2d4f6a8c1e'
+branch_labels = None
+depends_on = None
+
+# (kind, code, table, title column, body columns) as registered in app.py;
+# the code is folded into the FTS5 rowid.
+KINDS = [
+    ('gallery', 1, 'gallery_item', 'title', ['description', 'category']),
+    ('event', 2, 'event', 'title', ['description', 'location']),
+    ('team', 3, 'team_member', 'name', ['role', 'specialty', 'bio']),
+]
+
+
+def _body(columns):
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        for kind, code, table, title, body in KINDS:
+            op.execute(
+                f"INSERT INTO search_index (rowid, kind, ref_id, title, body) "
+                f"SELECT id * 8 + {code}, '{kind}', id, {title}, {_body(body)} FROM {table}"
+            )
+    elif dialect == 'postgresql':
+        op.create_table(
+            'search_document',
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('ref_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.Text(), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('document', sa.dialects.postgresql.TSVECTOR(), nullable=False),
+            sa.PrimaryKeyConstraint('kind', 'ref_id'),
+        )
+        op.create_index('ix_search_document_document', 'search_document', ['document'], postgresql_using='gin')
+        for kind, code, table, title, body in KINDS:
+            op.execute(
+                f"INSERT INTO search_document (kind, ref_id, title, body, document) "
+                f"SELECT '{kind}', id, {title}, {_body(body)}, "
+                f"setweight(to_tsvector('simple', {title}), 'A') || "
+                f"setweight(to_tsvector('simple', {_body(body)}), 'B') FROM {table}"
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE search_index')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_search_document_document', table_name='search_document')
+        op.drop_table('search_document')
@@ -0,0 +1,32 @@
+"""image renditions
+
+Revision ID: 8a4b6c1d2e35
+Revises: 3f1c2a9d8e01
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4b6c1d2e35'
+down_revision = '3f1c2a9d8e01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('event', 'gallery_item'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_width', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('image_height', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('renditions', sa.Text(), nullable=True))
+
+
+def downgrade():
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('renditions')
+            batch_op.drop_column('image_height')
+            batch_op.drop_column('image_width')
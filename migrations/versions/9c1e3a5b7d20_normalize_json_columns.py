@@ -0,0 +1,204 @@
+"""move JSON strings into child tables and columns
+
+Revision ID: 9c1e3a5b7d20
+Revises: 5d7e9f1b3a24
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1e3a5b7d20'
+down_revision = '5d7e9f1b3a24'
+branch_labels = None
+depends_on = None
+
+# Old JSON key -> new column, per table.
+TEAM_SOCIAL = {'instagram': 'instagram', 'facebook': 'facebook', 'twitter': 'twitter', 'email': 'email'}
+CONTACT_COLUMNS = {
+    'address': {'line1': 'address_line1', 'line2': 'address_line2', 'city': 'city', 'state': 'state', 'zip': 'zip_code'},
+    'office_hours': {'weekdays': 'hours_weekdays', 'weekend': 'hours_weekend', 'closed': 'hours_closed'},
+    'social_links': {'instagram': 'instagram_url', 'facebook': 'facebook_url', 'twitter': 'twitter_url',
+                     'instagram_handle': 'instagram_handle'},
+}
+
+home_content = sa.table('home_content', sa.column('id', sa.Integer), sa.column('features', sa.Text))
+home_feature = sa.table('home_feature', sa.column('home_content_id', sa.Integer), sa.column('position', sa.Integer),
+                        sa.column('title', sa.String), sa.column('description', sa.Text))
+team_achievement = sa.table('team_achievement', sa.column('member_id', sa.Integer), sa.column('position', sa.Integer),
+                            sa.column('text', sa.String))
+faq_entry = sa.table('faq_entry', sa.column('contact_info_id', sa.Integer), sa.column('position', sa.Integer),
+                     sa.column('question', sa.Text), sa.column('answer', sa.Text))
+
+
+def _loads(value, default):
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+
+def upgrade():
+    op.create_table(
+        'home_feature',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('home_content_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['home_content_id'], ['home_content.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_home_feature_home_content_id', 'home_feature', ['home_content_id'])
+    op.create_table(
+        'team_achievement',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(length=200), nullable=False),
+        sa.ForeignKeyConstraint(['member_id'], ['team_member.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_team_achievement_member_id', 'team_achievement', ['member_id'])
+    op.create_table(
+        'faq_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('contact_info_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['contact_info_id'], ['contact_info.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_faq_entry_contact_info_id', 'faq_entry', ['contact_info_id'])
+
+    with op.batch_alter_table('team_member', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('instagram', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('facebook', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('twitter', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('email', sa.String(length=120), nullable=True))
+    with op.batch_alter_table('contact_info', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('address_line1', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('address_line2', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('city', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('state', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('zip_code', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('hours_weekdays', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('hours_weekend', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('hours_closed', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('instagram_url', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('facebook_url', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('twitter_url', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('instagram_handle', sa.String(length=100), nullable=True))
+
+    bind = op.get_bind()
+    for row in bind.execute(sa.text('SELECT id, features FROM home_content')).all():
+        features = [f for f in _loads(row.features, []) if isinstance(f, dict)]
+        if features:
+            op.bulk_insert(home_feature, [
+                {'home_content_id': row.id, 'position': i, 'title': f.get('title') or '', 'description': f.get('description') or ''}
+                for i, f in enumerate(features)
+            ])
+    for row in bind.execute(sa.text('SELECT id, achievements, social FROM team_member')).all():
+        achievements = [str(a) for a in _loads(row.achievements, []) if a]
+        if achievements:
+            op.bulk_insert(team_achievement, [
+                {'member_id': row.id, 'position': i, 'text': text} for i, text in enumerate(achievements)
+            ])
+        social = _loads(row.social, {})
+        bind.execute(
+            sa.text('UPDATE team_member SET instagram = :instagram, facebook = :facebook, '
+                    'twitter = :twitter, email = :email WHERE id = :id'),
+            dict({column: social.get(key) or '' for key, column in TEAM_SOCIAL.items()}, id=row.id))
+    for row in bind.execute(sa.text('SELECT id, address, office_hours, social_links, faq FROM contact_info')).all():
+        values = {'id': row.id}
+        for field, columns in CONTACT_COLUMNS.items():
+            data = _loads(getattr(row, field), {})
+            values.update({column: data.get(key) or '' for key, column in columns.items()})
+        assignments = ', '.join(f'{column} = :{column}' for column in values if column != 'id')
+        bind.execute(sa.text(f'UPDATE contact_info SET {assignments} WHERE id = :id'), values)
+        faq = [f for f in _loads(row.faq, []) if isinstance(f, dict)]
+        if faq:
+            op.bulk_insert(faq_entry, [
+                {'contact_info_id': row.id, 'position': i, 'question': f.get('question') or '', 'answer': f.get('answer') or ''}
+                for i, f in enumerate(faq)
+            ])
+
+    with op.batch_alter_table('home_content', schema=None) as batch_op:
+        batch_op.drop_column('features')
+    with op.batch_alter_table('team_member', schema=None) as batch_op:
+        batch_op.drop_column('achievements')
+        batch_op.drop_column('social')
+    with op.batch_alter_table('contact_info', schema=None) as batch_op:
+        batch_op.drop_column('address')
+        batch_op.drop_column('office_hours')
+        batch_op.drop_column('social_links')
+        batch_op.drop_column('faq')
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('renditions', existing_type=sa.Text(), type_=sa.JSON(),
+                                  postgresql_using='renditions::json')
+
+
+def downgrade():
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('renditions', existing_type=sa.JSON(), type_=sa.Text())
+    with op.batch_alter_table('home_content', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('features', sa.Text(), nullable=True))
+    with op.batch_alter_table('team_member', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('achievements', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('social', sa.Text(), nullable=True))
+    with op.batch_alter_table('contact_info', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('address', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('office_hours', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('social_links', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('faq', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    for (content_id,) in bind.execute(sa.text('SELECT id FROM home_content')).all():
+        features = [{'title': r.title, 'description': r.description} for r in bind.execute(
+            sa.text('SELECT title, description FROM home_feature WHERE home_content_id = :id ORDER BY position'),
+            {'id': content_id})]
+        bind.execute(sa.text('UPDATE home_content SET features = :features WHERE id = :id'),
+                     {'features': json.dumps(features), 'id': content_id})
+    for row in bind.execute(sa.text('SELECT id, instagram, facebook, twitter, email FROM team_member')).all():
+        achievements = [r.text for r in bind.execute(
+            sa.text('SELECT text FROM team_achievement WHERE member_id = :id ORDER BY position'), {'id': row.id})]
+        social = {key: getattr(row, column) or '' for key, column in TEAM_SOCIAL.items()}
+        bind.execute(sa.text('UPDATE team_member SET achievements = :achievements, social = :social WHERE id = :id'),
+                     {'achievements': json.dumps(achievements), 'social': json.dumps(social), 'id': row.id})
+    columns = [column for mapping in CONTACT_COLUMNS.values() for column in mapping.values()]
+    for row in bind.execute(sa.text(f"SELECT id, {', '.join(columns)} FROM contact_info")).all():
+        values = {'id': row.id}
+        for field, mapping in CONTACT_COLUMNS.items():
+            values[field] = json.dumps({key: getattr(row, column) or '' for key, column in mapping.items()})
+        values['faq'] = json.dumps([{'question': r.question, 'answer': r.answer} for r in bind.execute(
+            sa.text('SELECT question, answer FROM faq_entry WHERE contact_info_id = :id ORDER BY position'),
+            {'id': row.id})])
+        bind.execute(sa.text('UPDATE contact_info SET address = :address, office_hours = :office_hours, '
+                             'social_links = :social_links, faq = :faq WHERE id = :id'), values)
+
+    with op.batch_alter_table('home_content', schema=None) as batch_op:
+        batch_op.alter_column('features', existing_type=sa.Text(), nullable=False)
+    with op.batch_alter_table('team_member', schema=None) as batch_op:
+        batch_op.alter_column('achievements', existing_type=sa.Text(), nullable=False)
+        batch_op.alter_column('social', existing_type=sa.Text(), nullable=False)
+        for column in TEAM_SOCIAL.values():
+            batch_op.drop_column(column)
+    with op.batch_alter_table('contact_info', schema=None) as batch_op:
+        for field in CONTACT_COLUMNS:
+            batch_op.alter_column(field, existing_type=sa.Text(), nullable=False)
+        batch_op.alter_column('faq', existing_type=sa.Text(), nullable=False)
+        for column in columns:
+            batch_op.drop_column(column)
+    op.drop_index('ix_faq_entry_contact_info_id', table_name='faq_entry')
+    op.drop_table('faq_entry')
+    op.drop_index('ix_team_achievement_member_id', table_name='team_achievement')
+    op.drop_table('team_achievement')
+    op.drop_index('ix_home_feature_home_content_id', table_name='home_feature')
+    op.drop_table('home_feature')
@@ -0,0 +1,57 @@
+"""gallery EXIF metadata columns
+
+Revision ID: a7c9e1b3d5f6
+Revises: 9c1e3a5b7d20
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1b3d5f6'
+down_revision = '9c1e3a5b7d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('taken_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('camera_make', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('camera_model', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('lens', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('focal_length', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('f_number', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('exposure_time', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('iso', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('orientation', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('aspect_ratio', sa.Float(), nullable=True))
+        batch_op.create_index('ix_gallery_item_taken_at_id', ['taken_at', 'id'], unique=False)
+        batch_op.create_index('ix_gallery_item_camera_model_uploaded_at_id', ['camera_model', 'uploaded_at', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_gallery_item_aspect_ratio'), ['aspect_ratio'], unique=False)
+
+    # Dimensions are already known for processed images; the EXIF fields are
+    # filled in by `flask image-metadata`.
+    op.execute(
+        'UPDATE gallery_item SET aspect_ratio = image_width * 1.0 / image_height '
+        'WHERE image_width > 0 AND image_height > 0'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_gallery_item_aspect_ratio'))
+        batch_op.drop_index('ix_gallery_item_camera_model_uploaded_at_id')
+        batch_op.drop_index('ix_gallery_item_taken_at_id')
+        batch_op.drop_column('aspect_ratio')
+        batch_op.drop_column('orientation')
+        batch_op.drop_column('iso')
+        batch_op.drop_column('exposure_time')
+        batch_op.drop_column('f_number')
+        batch_op.drop_column('focal_length')
+        batch_op.drop_column('lens')
+        batch_op.drop_column('camera_model')
+        batch_op.drop_column('camera_make')
+        batch_op.drop_column('taken_at')
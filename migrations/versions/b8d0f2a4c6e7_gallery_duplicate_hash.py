@@ -0,0 +1,34 @@
+"""gallery perceptual hash and duplicate flag
+
+Revision ID: b8d0f2a4c6e7
+Revises: a7c9e1b3d5f6
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c6e7'
+down_revision = 'a7c9e1b3d5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing images are hashed by `flask gallery-duplicates`.
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dhash', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_gallery_item_duplicate_of_id'), ['duplicate_of_id'], unique=False)
+        batch_op.create_foreign_key('fk_gallery_item_duplicate_of_id', 'gallery_item', ['duplicate_of_id'], ['id'],
+                                    ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_gallery_item_duplicate_of_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_gallery_item_duplicate_of_id'))
+        batch_op.drop_column('duplicate_of_id')
+        batch_op.drop_column('dhash')
@@ -0,0 +1,30 @@
+"""image job status
+
+Revision ID: c5e7f9a1b3d2
+Revises: 8a4b6c1d2e35
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7f9a1b3d2'
+down_revision = '8a4b6c1d2e35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('event', 'gallery_item'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_status', sa.String(length=20), nullable=True))
+            batch_op.add_column(sa.Column('image_error', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('image_error')
+            batch_op.drop_column('image_status')
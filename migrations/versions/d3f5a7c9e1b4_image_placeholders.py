@@ -0,0 +1,38 @@
+"""image placeholders and dominant colours
+
+Revision ID: d3f5a7c9e1b4
+Revises: b8d0f2a4c6e7
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f5a7c9e1b4'
+down_revision = 'b8d0f2a4c6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing images are described by `flask image-placeholders`.
+    for table in ('event', 'gallery_item'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('placeholder', sa.Text(), nullable=True))
+            batch_op.add_column(sa.Column('dominant_color', sa.String(length=7), nullable=True))
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('color_name', sa.String(length=20), nullable=True))
+        batch_op.create_index('ix_gallery_item_color_name_uploaded_at_id', ['color_name', 'uploaded_at', 'id'],
+                              unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_gallery_item_color_name_uploaded_at_id')
+        batch_op.drop_column('color_name')
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('dominant_color')
+            batch_op.drop_column('placeholder')
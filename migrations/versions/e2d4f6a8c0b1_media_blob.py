@@ -0,0 +1,34 @@
+"""content-addressed media blobs
+
+Revision ID: e2d4f6a8c0b1
+Revises: c5e7f9a1b3d2
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d4f6a8c0b1'
+down_revision = 'c5e7f9a1b3d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media_blob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(length=200), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path'),
+    sa.UniqueConstraint('sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('media_blob')
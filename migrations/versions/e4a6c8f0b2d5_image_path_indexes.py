@@ -0,0 +1,28 @@
+"""index image_path on events and gallery items
+
+Revision ID: e4a6c8f0b2d5
+Revises: d3f5a7c9e1b4
+Create Date: 2026-10-18 23:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a6c8f0b2d5'
+down_revision = 'd3f5a7c9e1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Attaching an upload and importing an archive look rows up by their image.
+    for table in ('event', 'gallery_item'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(batch_op.f(f'ix_{table}_image_path'), ['image_path'], unique=False)
+
+
+def downgrade():
+    for table in ('gallery_item', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_image_path'))
@@ -0,0 +1,29 @@
+"""gallery item updated_at
+
+Revision ID: f1a3c5e7b9d0
+Revises: e2d4f6a8c0b1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a3c5e7b9d0'
+down_revision = 'e2d4f6a8c0b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_gallery_item_updated_at'), ['updated_at'], unique=False)
+    op.execute('UPDATE gallery_item SET updated_at = uploaded_at')
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_gallery_item_updated_at'))
+        batch_op.drop_column('updated_at')
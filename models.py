@@ -0,0 +1,308 @@
+"""Database models."""
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from flask_login import UserMixin
+
+from duplicates import to_signed
+from extensions import db, search_index
+from palette import dominant_name
+
+def utcnow():
+    # Python-side timestamps keep sub-second precision on every backend, so two
+    # saves within the same second still produce different page validators.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(20), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(256), nullable=False)
+    is_admin = db.Column(db.Boolean, default=False)
+
+    def __repr__(self):
+        return f"User('{self.username}', '{self.email}')"
+
+class AboutContent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+class MediaBlob(db.Model):
+    """A content-addressed file in the media store, shared by every row using it."""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    path = db.Column(db.String(200), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class RenditionMixin:
+    """Sized image derivatives stored alongside the original upload."""
+    image_width = db.Column(db.Integer)
+    image_height = db.Column(db.Integer)
+    renditions = db.Column(db.JSON)
+    image_status = db.Column(db.String(20))  # pending, processing, ready or failed
+    image_error = db.Column(db.String(200))
+
+    # Shown in the image's box until it loads: a tiny blurred copy as a data:
+    # URI over its most common colour.
+    placeholder = db.Column(db.Text)
+    dominant_color = db.Column(db.String(7))
+
+    def set_renditions(self, renditions):
+        """Store the result of ``imaging.generate_derivatives()``, or clear it with None."""
+        self.renditions = renditions
+        self.image_width = renditions['width'] if renditions else None
+        self.image_height = renditions['height'] if renditions else None
+        self.set_palette(renditions)
+
+    def set_palette(self, renditions):
+        """Copy the ``placeholder`` and ``palette`` of ``imaging.describe()`` into their columns."""
+        palette = (renditions or {}).get('palette') or []
+        self.placeholder = (renditions or {}).get('placeholder')
+        self.dominant_color = palette[0][0] if palette else None
+
+    @property
+    def placeholder_style(self):
+        """Inline CSS painting the placeholder behind the image, or ''."""
+        layers = []
+        if self.placeholder:
+            layers.append(f"url('{self.placeholder}') center / cover no-repeat")
+        if self.dominant_color:
+            layers.append(self.dominant_color)
+        return f"background: {', '.join(layers)}" if layers else ''
+
+    def rendition_sources(self, fmt):
+        if not self.renditions:
+            return []
+        return self.renditions.get('sources', {}).get(fmt, [])
+
+    def srcset(self, fmt):
+        return ', '.join(f"{r['url']} {r['width']}w" for r in self.rendition_sources(fmt))
+
+    def rendition_url(self, name, fmt='jpeg'):
+        for rendition in self.rendition_sources(fmt):
+            if rendition['name'] == name:
+                return rendition['url']
+        sources = self.rendition_sources(fmt)
+        return sources[-1]['url'] if sources else None
+
+class Event(RenditionMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    location = db.Column(db.String(100))
+    image_path = db.Column(db.String(200), index=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+class GalleryItem(RenditionMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    image_path = db.Column(db.String(200), nullable=False, index=True)
+    category = db.Column(db.String(50), default='all')
+    uploaded_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+    # Read from the EXIF of the original when its renditions are generated.
+    taken_at = db.Column(db.DateTime)
+    camera_make = db.Column(db.String(100))
+    camera_model = db.Column(db.String(100))
+    lens = db.Column(db.String(100))
+    focal_length = db.Column(db.Float)
+    f_number = db.Column(db.Float)
+    exposure_time = db.Column(db.Float)
+    iso = db.Column(db.Integer)
+    orientation = db.Column(db.SmallInteger)
+    aspect_ratio = db.Column(db.Float, index=True)  # oriented width / height
+
+    # One of palette.COLOR_NAMES, for the gallery's colour filter.
+    color_name = db.Column(db.String(20))
+
+    # 64-bit difference hash of the image (see duplicates.py), and the earlier
+    # item it looks like, for the admins to review.
+    dhash = db.Column(db.BigInteger)
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('gallery_item.id', ondelete='SET NULL',
+                                                          name='fk_gallery_item_duplicate_of_id'), index=True)
+
+    # Keyset pagination walks (uploaded_at, id) or (taken_at, id) newest first,
+    # optionally per category or camera.
+    __table_args__ = (
+        db.Index('ix_gallery_item_uploaded_at_id', 'uploaded_at', 'id'),
+        db.Index('ix_gallery_item_category_uploaded_at_id', 'category', 'uploaded_at', 'id'),
+        db.Index('ix_gallery_item_taken_at_id', 'taken_at', 'id'),
+        db.Index('ix_gallery_item_camera_model_uploaded_at_id', 'camera_model', 'uploaded_at', 'id'),
+        db.Index('ix_gallery_item_color_name_uploaded_at_id', 'color_name', 'uploaded_at', 'id'),
+    )
+
+    EXIF_COLUMNS = ('camera_make', 'camera_model', 'lens', 'focal_length', 'f_number', 'exposure_time', 'iso',
+                    'orientation')
+
+    def set_renditions(self, renditions):
+        super().set_renditions(renditions)
+        metadata = (renditions or {}).get('metadata') or {}
+        for column in self.EXIF_COLUMNS:
+            setattr(self, column, metadata.get(column))
+        self.taken_at = datetime.fromisoformat(metadata['taken_at']) if metadata.get('taken_at') else None
+        self.dhash = to_signed(int(renditions['dhash'], 16)) if renditions and renditions.get('dhash') else None
+        if self.image_width and self.image_height:
+            self.aspect_ratio = round(self.image_width / self.image_height, 4)
+        else:
+            self.aspect_ratio = None
+
+    def set_palette(self, renditions):
+        super().set_palette(renditions)
+        self.color_name = dominant_name((renditions or {}).get('palette') or [])
+
+    @property
+    def camera(self):
+        """Model name as shown to visitors, prefixed by the make unless the model already names it."""
+        if not self.camera_model:
+            return None
+        make = (self.camera_make or '').split(' ')[0]
+        if make and not self.camera_model.lower().startswith(make.lower()):
+            return f'{make.capitalize() if make.isupper() else make} {self.camera_model}'
+        return self.camera_model
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'category': self.category,
+            'image_path': self.image_path,
+            'width': self.image_width,
+            'height': self.image_height,
+            'taken_at': self.taken_at.isoformat() if self.taken_at else None,
+            'camera': self.camera,
+            'src': self.rendition_url('medium') or self.image_path,
+            'full': self.rendition_url('full', 'webp') or self.image_path,
+            'srcset': {fmt: self.srcset(fmt) for fmt in ('avif', 'webp', 'jpeg') if self.srcset(fmt)},
+            'placeholder': self.placeholder,
+            'color': self.dominant_color,
+            'color_name': self.color_name,
+        }
+
+# Typed, read-only views over groups of flat columns, used by the templates.
+class SocialProfile(NamedTuple):
+    instagram: str
+    facebook: str
+    twitter: str
+    email: str
+
+class Address(NamedTuple):
+    line1: str
+    line2: str
+    city: str
+    state: str
+    zip: str
+
+class OfficeHours(NamedTuple):
+    weekdays: str
+    weekend: str
+    closed: str
+
+class SocialLinks(NamedTuple):
+    instagram: str
+    facebook: str
+    twitter: str
+    instagram_handle: str
+
+class HomeFeature(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    home_content_id = db.Column(db.Integer, db.ForeignKey('home_content.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+
+class HomeContent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hero_subtitle = db.Column(db.Text, nullable=False)
+    features = db.relationship('HomeFeature', order_by='HomeFeature.position', lazy='selectin',
+                               cascade='all, delete-orphan')
+    cta_text = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+    def set_features(self, features):
+        self.features = [HomeFeature(position=i, title=f['title'], description=f['description'])
+                         for i, f in enumerate(features)]
+
+class TeamAchievement(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('team_member.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    text = db.Column(db.String(200), nullable=False)
+
+class TeamMember(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    role = db.Column(db.String(50), nullable=False)
+    specialty = db.Column(db.String(100), nullable=False)
+    bio = db.Column(db.Text, nullable=False)
+    achievements = db.relationship('TeamAchievement', order_by='TeamAchievement.position', lazy='selectin',
+                                   cascade='all, delete-orphan')
+    image = db.Column(db.String(200), nullable=False)
+    instagram = db.Column(db.String(200))
+    facebook = db.Column(db.String(200))
+    twitter = db.Column(db.String(200))
+    email = db.Column(db.String(120))
+    is_core = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+    @property
+    def social(self):
+        return SocialProfile(self.instagram or '', self.facebook or '', self.twitter or '', self.email or '')
+
+    def set_achievements(self, achievements):
+        self.achievements = [TeamAchievement(position=i, text=text) for i, text in enumerate(achievements)]
+
+class FaqEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    contact_info_id = db.Column(db.Integer, db.ForeignKey('contact_info.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+
+class ContactInfo(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(50), nullable=False)
+    phone_hours = db.Column(db.String(100), nullable=False)
+    address_line1 = db.Column(db.String(200))
+    address_line2 = db.Column(db.String(200))
+    city = db.Column(db.String(100))
+    state = db.Column(db.String(100))
+    zip_code = db.Column(db.String(20))
+    hours_weekdays = db.Column(db.String(100))
+    hours_weekend = db.Column(db.String(100))
+    hours_closed = db.Column(db.String(100))
+    instagram_url = db.Column(db.String(200))
+    facebook_url = db.Column(db.String(200))
+    twitter_url = db.Column(db.String(200))
+    instagram_handle = db.Column(db.String(100))
+    faq = db.relationship('FaqEntry', order_by='FaqEntry.position', lazy='selectin',
+                          cascade='all, delete-orphan')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+    @property
+    def address(self):
+        return Address(self.address_line1 or '', self.address_line2 or '', self.city or '', self.state or '', self.zip_code or '')
+
+    @property
+    def office_hours(self):
+        return OfficeHours(self.hours_weekdays or '', self.hours_weekend or '', self.hours_closed or '')
+
+    @property
+    def social_links(self):
+        return SocialLinks(self.instagram_url or '', self.facebook_url or '', self.twitter_url or '', self.instagram_handle or '')
+
+    def set_faq(self, faq):
+        self.faq = [FaqEntry(position=i, question=f['question'], answer=f['answer']) for i, f in enumerate(faq)]
+
+# Registration order fixes each kind's code in the SQLite index; append new kinds at the end.
+search_index.register(GalleryItem, 'gallery', title='title', body=('description', 'category'))
+search_index.register(Event, 'event', title='title', body=('description', 'location'))
+search_index.register(TeamMember, 'team', title='name', body=('role', 'specialty', 'bio'))
@@ -0,0 +1,323 @@
+"""Full-response cache for the public pages.
+
+Views declare which models they render (``@page_cache.cached('Event')``).
+Every model has a generation token stored next to the cached pages; cache keys
+include the tokens of the view's models, so when a commit touches a model its
+token changes and every page built from the old data simply stops matching.
+Under ``conditional`` the key also includes the ETag computed for the request,
+so a page is never served with an ETag newer than its body, even when the
+database changed behind the cache's back.
+
+``PAGE_CACHE_BACKEND`` picks the storage: ``memory`` is a per-process LRU
+bounded by ``PAGE_CACHE_MAX_BYTES``; ``filesystem`` and ``redis`` are shared by
+all workers, so an admin save in one worker invalidates pages in the others.
+``null`` disables caching. The default is ``memory`` for a single worker and
+``filesystem`` when ``WEB_CONCURRENCY`` starts more.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import current_app, g, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_bypass = ContextVar('page_cache_bypass', default=False)
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """Thread-safe LRU cache bounded by the total size of the stored values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FileSystemBackend:
+    """One file per key; shared by every worker that can see ``directory``.
+
+    Pages of old generations are never read again, so every ``PRUNE_EVERY``
+    writes the least recently written files are removed until the directory
+    is back under ``max_bytes``.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + ttl if ttl else None, value), f)
+        os.replace(tmp_path, self._path(key))
+        self._writes += 1
+        if self.max_bytes is not None and self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        for key in self.client.scan_iter('page-cache:*'):
+            self.client.delete(key)
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._watched = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+        if kind == 'memory':
+            self.backend = MemoryBackend(app.config.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        elif kind == 'filesystem':
+            self.backend = FileSystemBackend(app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page-cache'),
+                                             app.config.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        elif kind == 'redis':
+            self.backend = RedisBackend(app.config['PAGE_CACHE_REDIS_URL'])
+        elif kind == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown PAGE_CACHE_BACKEND {kind!r}')
+        self.ttl = app.config.get('PAGE_CACHE_TTL')
+        app.extensions['page_cache'] = self
+
+    def _generation(self, tag):
+        key = f'page-cache:gen:{tag}'
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid.uuid4().hex.encode()
+            self.backend.set(key, token)
+        return token.decode()
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.set(f'page-cache:gen:{tag}', uuid.uuid4().hex.encode())
+        self.invalidations += 1
+
+    def cache_key(self, tags):
+        generations = ','.join(self._generation(tag) for tag in tags)
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        return f'page-cache:{request.path}?{query}#{generations};{g.get("page_etag", "")}'
+
+    @contextmanager
+    def bypass(self):
+        """Run views inside the block without reading or filling the cache."""
+        token = _bypass.set(True)
+        try:
+            yield
+        finally:
+            _bypass.reset(token)
+
+    def cached(self, *tags):
+        """Cache a view's response until one of the ``tags`` models changes."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Visitors with a session (admins, anyone mid-login) may see
+                # flashed messages or personalised markup, so they bypass the cache.
+                if (isinstance(self.backend, NullBackend) or _bypass.get()
+                        or request.method not in ('GET', 'HEAD')
+                        or current_app.config['SESSION_COOKIE_NAME'] in request.cookies):
+                    return view(*args, **kwargs)
+                key = self.cache_key(tags)
+                cached = self.backend.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    status, headers, body = pickle.loads(cached)
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                self.misses += 1
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not session.modified:
+                    headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'set-cookie']
+                    if response.is_streamed:
+                        response.response = self._store_streamed(key, headers, response.response)
+                    else:
+                        self.backend.set(key, pickle.dumps((200, headers, response.get_data())), self.ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            # Copied onto the outer decorators by functools.wraps; static_site reads it.
+            wrapper.cache_tags = tags
+            return wrapper
+        return decorator
+
+    def _store_streamed(self, key, headers, chunks):
+        """Pass a streamed body through and cache it once it has been sent in full."""
+        body = []
+        try:
+            for chunk in chunks:
+                body.append(chunk.encode() if isinstance(chunk, str) else chunk)
+                yield chunk
+            self.backend.set(key, pickle.dumps((200, headers, b''.join(body))), self.ttl)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def watch_models(self):
+        """Invalidate pages whenever a commit inserts, updates or deletes a model."""
+        if self._watched:
+            return
+        self._watched = True
+
+        @event.listens_for(Session, 'after_flush')
+        def collect_changes(db_session, flush_context):
+            changed = db_session.info.setdefault('page_cache_changed', set())
+            for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+                changed.add(type(obj).__name__)
+
+        @event.listens_for(Session, 'after_commit')
+        def invalidate_changed(db_session):
+            changed = db_session.info.pop('page_cache_changed', None)
+            if changed:
+                self.invalidate(*changed)
+
+        @event.listens_for(Session, 'after_rollback')
+        def discard_changes(db_session):
+            db_session.info.pop('page_cache_changed', None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats.update(size_bytes=self.backend.size, max_bytes=self.backend.max_bytes,
+                         entries=len(self.backend), evictions=self.backend.evictions)
+        return stats
@@ -0,0 +1,107 @@
+"""Dominant colours of images, for placeholders and the gallery's colour filter.
+
+``extract()`` finds the few colours covering most of a thumbnail without
+iterating over its pixels in Python: pixels are binned into a 512-colour cube
+with one ``bincount``, the most common bins at least ``min_distance`` apart
+become the palette, and every bin is then merged into its nearest palette
+colour, so shares add up to 1.
+
+``color_name()`` puts a colour into one of ``COLOR_NAMES``, the values the
+gallery can be filtered on. ``dominant_name()`` names a whole palette: the
+most common chromatic colour when it covers at least ``CHROMATIC_SHARE`` of
+the image, since a red coat on a grey street is what makes the photo "red".
+
+NumPy is only imported once a palette is actually extracted.
+"""
+import colorsys
+
+# In the order the gallery offers them.
+COLOR_NAMES = ('red', 'orange', 'yellow', 'green', 'teal', 'blue', 'purple', 'pink', 'brown', 'black', 'gray',
+               'white')
+NEUTRAL_NAMES = ('black', 'gray', 'white')
+
+# Upper bound of each hue range, in degrees.
+HUES = ((15, 'red'), (45, 'orange'), (70, 'yellow'), (165, 'green'), (195, 'teal'), (255, 'blue'),
+        (290, 'purple'), (335, 'pink'), (360, 'red'))
+
+CHROMATIC_SHARE = 0.15
+
+
+def to_hex(rgb):
+    return '#{:02x}{:02x}{:02x}'.format(*rgb)
+
+
+def from_hex(value):
+    return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def color_name(rgb):
+    """The entry of ``COLOR_NAMES`` closest to an ``(r, g, b)`` colour."""
+    hue, saturation, value = colorsys.rgb_to_hsv(*(channel / 255 for channel in rgb))
+    if value < 0.2:
+        return 'black'
+    if saturation < 0.15 or (saturation < 0.25 and value < 0.4):
+        return 'white' if value > 0.85 else 'gray'
+    degrees = hue * 360
+    name = next(name for bound, name in HUES if degrees < bound)
+    if name in ('red', 'orange') and value < 0.6 and degrees >= 10:
+        return 'brown'
+    if name == 'red' and saturation < 0.5 and value > 0.7:
+        return 'pink'
+    return name
+
+
+def dominant_name(palette):
+    """Name the colour of an image from its ``[(hex, share), ...]`` palette."""
+    shares = {}
+    for value, share in palette:
+        name = color_name(from_hex(value))
+        shares[name] = shares.get(name, 0) + share
+    if not shares:
+        return None
+    chromatic = [(share, name) for name, share in shares.items() if name not in NEUTRAL_NAMES]
+    if chromatic and max(chromatic)[0] >= CHROMATIC_SHARE:
+        return max(chromatic)[1]
+    return max((share, name) for name, share in shares.items())[1]
+
+
+def extract(pixels, count=5, bits=3, min_distance=48):
+    """Return up to ``count`` ``(hex, share)`` colours of ``pixels``, most common first.
+
+    ``pixels`` is anything NumPy can turn into an ``(..., 3)`` uint8 array,
+    such as an RGB Pillow image. Shares are rounded to three decimals.
+    """
+    import numpy as np
+
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if not len(pixels):
+        return []
+    quantized = (pixels >> (8 - bits)).astype(np.intp)
+    index = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+    size = 1 << (3 * bits)
+    counts = np.bincount(index, minlength=size)
+    sums = np.stack([np.bincount(index, weights=pixels[:, channel], minlength=size) for channel in range(3)],
+                    axis=1)
+    occupied = np.flatnonzero(counts)
+    weights = counts[occupied].astype(np.float64)
+    colors = sums[occupied] / weights[:, None]
+
+    # Squared distances between the occupied bins; at most 512 x 512.
+    distances = ((colors[:, None, :] - colors[None, :, :]) ** 2).sum(axis=2)
+    close = distances < min_distance ** 2
+    chosen, blocked = [], np.zeros(len(colors), dtype=bool)
+    for bin_index in np.argsort(-weights, kind='stable'):
+        if not blocked[bin_index]:
+            chosen.append(bin_index)
+            if len(chosen) == count:
+                break
+            blocked |= close[bin_index]
+
+    # Merge every bin into its nearest chosen colour, weighted by pixel count.
+    nearest = distances[:, chosen].argmin(axis=1)
+    totals = np.bincount(nearest, weights=weights, minlength=len(chosen))
+    merged = np.stack([np.bincount(nearest, weights=weights * colors[:, channel], minlength=len(chosen))
+                       for channel in range(3)], axis=1) / totals[:, None]
+    shares = totals / weights.sum()
+    order = np.argsort(-shares, kind='stable')
+    return [(to_hex(int(channel) for channel in np.rint(merged[i])), round(float(shares[i]), 3)) for i in order]
@@ -0,0 +1,275 @@
+"""Public pages.
+
+Every page is cached whole by ``page_cache`` and answers conditional GETs from
+the timestamps of the models it renders, so a view only runs after an edit.
+"""
+import base64
+import os
+from datetime import date, datetime
+
+from flask import Blueprint, abort, current_app, redirect, render_template, request, url_for
+from werkzeug.security import safe_join
+
+from conditional import conditional, model_validator
+from database import read_replica
+from extensions import db, image_transforms, media_delivery, media_store, page_cache, query_guard, search_index
+from models import AboutContent, ContactInfo, Event, GalleryItem, HomeContent, MediaBlob, TeamMember
+from palette import COLOR_NAMES
+from streaming import render_page
+from transforms import FORMATS, TransformError
+
+bp = Blueprint('public', __name__)
+
+def team_sections():
+    """Return ``(core_team, active_members)`` from a single ordered query."""
+    core_team, active_members = [], []
+    for member in TeamMember.query.order_by(TeamMember.is_core.desc(), TeamMember.id):
+        (core_team if member.is_core else active_members).append(member)
+    return core_team, active_members
+
+def page_validator(*models, extra=(), with_last_modified=True):
+    extra = (current_app.config['TEMPLATE_VERSION'],) + extra
+    return model_validator(db.session, *models, extra=extra, with_last_modified=with_last_modified)
+
+DEFAULT_FEATURES = [
+    {'title': 'Photography Excellence', 'description': "Capturing life's most beautiful moments with artistic vision and technical precision."},
+    {'title': 'Creative Community', 'description': 'A diverse team of passionate photographers and creative media enthusiasts.'},
+    {'title': 'Exciting Events', 'description': 'Regular workshops, competitions, and collaborative projects to enhance skills.'},
+    {'title': 'Recognition & Growth', 'description': 'Showcasing talent and providing opportunities for creative development.'},
+]
+
+@bp.route('/')
+@read_replica
+@conditional(lambda: page_validator(HomeContent))
+@page_cache.cached('HomeContent')
+def index():
+    home_content = HomeContent.query.first()
+    hero_subtitle = home_content.hero_subtitle if home_content else "Capturing moments, creating memories, and fostering creative talent through photography, design, and creative media."
+    features = home_content.features if home_content else DEFAULT_FEATURES
+    cta_text = home_content.cta_text if home_content else "Discover amazing events, connect with talented individuals, and showcase your creative work."
+    return render_template('index.html', hero_subtitle=hero_subtitle, features=features, cta_text=cta_text)
+
+@bp.route('/about')
+@read_replica
+@conditional(lambda: page_validator(AboutContent))
+@page_cache.cached('AboutContent')
+def about():
+    content = AboutContent.query.first()
+    return render_template('about.html', content=content)
+
+@bp.route('/events')
+@read_replica
+@conditional(lambda: page_validator(Event, extra=(date.today(),), with_last_modified=False))
+@page_cache.cached('Event')
+def events():
+    events = Event.query.all()
+    current_time = datetime.now()
+    return render_page('events.html', events=events, current_time=current_time)
+
+@bp.route('/team')
+@read_replica
+@conditional(lambda: page_validator(TeamMember))
+@page_cache.cached('TeamMember')
+@query_guard.budget(max_queries=3)
+def team():
+    core_team, active_members = team_sections()
+    return render_page('team.html', core_team=core_team, active_members=active_members)
+
+@bp.route('/gallery')
+@read_replica
+@conditional(lambda: page_validator(GalleryItem))
+@page_cache.cached('GalleryItem')
+@query_guard.budget(max_queries=4)
+def gallery():
+    options = gallery_options(request.args)
+    gallery_items, next_cursor = gallery_page(**options)
+    cameras = [camera for camera, in db.session.query(GalleryItem.camera_model)
+               .filter(GalleryItem.camera_model.isnot(None)).distinct().order_by(GalleryItem.camera_model)]
+    return render_page('gallery.html', gallery_items=gallery_items, next_cursor=next_cursor, cameras=cameras,
+                       shapes=GALLERY_SHAPES, colors=COLOR_NAMES, **options)
+
+GALLERY_PAGE_SIZE = 24
+
+# Sort order -> column, newest first. Items without a capture date come last.
+GALLERY_SORTS = {'uploaded': GalleryItem.uploaded_at, 'taken': GalleryItem.taken_at}
+
+# Shape -> filter on the oriented aspect ratio.
+GALLERY_SHAPES = {
+    'wide': GalleryItem.aspect_ratio > 1.1,
+    'tall': GalleryItem.aspect_ratio < 0.9,
+    'square': GalleryItem.aspect_ratio.between(0.9, 1.1),
+}
+
+def gallery_options(args):
+    """Read the gallery filters from a request's query string; unknown values are a 400."""
+    options = {
+        'category': args.get('category', 'all'),
+        'sort': args.get('sort', 'uploaded'),
+        'camera': args.get('camera') or None,
+        'shape': args.get('shape') or None,
+        'color': args.get('color') or None,
+    }
+    if (options['sort'] not in GALLERY_SORTS or options['shape'] not in (None, *GALLERY_SHAPES)
+            or options['color'] not in (None, *COLOR_NAMES)):
+        abort(400)
+    return options
+
+def encode_cursor(item, sort='uploaded'):
+    value = getattr(item, GALLERY_SORTS[sort].key)
+    return base64.urlsafe_b64encode(f'{value.isoformat() if value else ""}|{item.id}'.encode()).decode()
+
+def decode_cursor(cursor):
+    value, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return (datetime.fromisoformat(value) if value else None), int(item_id)
+
+def gallery_page(category='all', cursor=None, limit=GALLERY_PAGE_SIZE, sort='uploaded', camera=None, shape=None,
+                 color=None):
+    """Return one page of gallery items, newest first, and the cursor of the next page."""
+    column = GALLERY_SORTS[sort]
+    query = GalleryItem.query
+    if category and category != 'all':
+        query = query.filter(GalleryItem.category == category)
+    if camera:
+        query = query.filter(GalleryItem.camera_model == camera)
+    if shape:
+        query = query.filter(GALLERY_SHAPES[shape])
+    if color:
+        query = query.filter(GalleryItem.color_name == color)
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            abort(400)
+    if not column.nullable:
+        if position:
+            query = query.filter(db.tuple_(column, GalleryItem.id) < position)
+        items = query.order_by(column.desc(), GalleryItem.id.desc()).limit(limit + 1).all()
+    else:
+        # Rows without a value come last. The two parts are walked one after the
+        # other, so each stays a range scan of the (column, id) index and no
+        # NULLS LAST is needed, which MySQL does not support.
+        items = []
+        if position is None or position[0] is not None:
+            valued = query.filter(column.isnot(None))
+            if position:
+                valued = valued.filter(db.tuple_(column, GalleryItem.id) < position)
+            items = valued.order_by(column.desc(), GalleryItem.id.desc()).limit(limit + 1).all()
+        if len(items) <= limit:
+            missing = query.filter(column.is_(None))
+            if position and position[0] is None:
+                missing = missing.filter(GalleryItem.id < position[1])
+            items += missing.order_by(GalleryItem.id.desc()).limit(limit + 1 - len(items)).all()
+    next_cursor = encode_cursor(items[limit - 1], sort) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_URLS = {'gallery': 'public.gallery', 'event': 'public.events', 'team': 'public.team'}
+
+def run_search():
+    query = request.args.get('q', '').strip()
+    kinds = request.args.getlist('kind')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), 100)
+    results, has_more = search_index.search(db.session, query, kinds, page, per_page)
+    objects = search_index.load(db.session, results)
+    for result in results:
+        result['url'] = url_for(SEARCH_URLS[result['kind']])
+        if result['kind'] == 'gallery' and ('gallery', result['id']) in objects:
+            result['item'] = objects['gallery', result['id']].to_dict()
+    return query, results, page, has_more
+
+@bp.route('/search')
+@read_replica
+@page_cache.cached('GalleryItem', 'Event', 'TeamMember')
+def search():
+    query, results, page, has_more = run_search()
+    return render_template('search.html', query=query, results=results, page=page, has_more=has_more)
+
+@bp.route('/contact')
+@conditional(lambda: page_validator(ContactInfo))
+@page_cache.cached('ContactInfo')
+def contact():
+    contact_info = ContactInfo.query.first()
+    if not contact_info:
+        contact_info = ContactInfo(
+            email='foto.grafica@example.com',
+            phone='+1 (555) 123-4567',
+            phone_hours='Mon-Fri, 9AM-6PM PST',
+            address_line1='Creative Arts Center',
+            address_line2='123 Photography Lane',
+            city='San Francisco',
+            state='CA',
+            zip_code='94102',
+            hours_weekdays='Monday - Friday: 9:00 AM - 6:00 PM',
+            hours_weekend='Saturday: 10:00 AM - 4:00 PM',
+            hours_closed='Sunday: Closed',
+            instagram_url='https://instagram.com/fotografica',
+            facebook_url='https://facebook.com/fotografica',
+            twitter_url='https://twitter.com/fotografica',
+            instagram_handle='@fotografica',
+        )
+        contact_info.set_faq([
+            {'question': 'How can I join the club?', 'answer': 'Simply contact us through the form or email. We welcome photographers of all skill levels!'},
+            {'question': 'Do you offer photography services?', 'answer': 'Yes! We provide professional photography services for events, portraits, and commercial projects.'},
+            {'question': 'What equipment do I need?', 'answer': 'Any camera works! We focus on creativity and technique rather than expensive equipment.'},
+        ])
+        db.session.add(contact_info)
+        db.session.commit()
+    return render_template('contact.html', contact_info=contact_info)
+
+@bp.route('/media/<path:filename>')
+def media(filename):
+    path = safe_join(media_store.root, filename)
+    if path is None or not media_store.is_public(filename):
+        abort(404)
+    url = media_store.storage.url(filename)
+    if url is not None:
+        # Stored in a bucket, which sends the bytes itself. Presigned URLs
+        # expire, so the redirect is only cached for part of their lifetime.
+        response = redirect(url)
+        response.cache_control.public = True
+        response.cache_control.max_age = (current_app.config['MEDIA_MAX_AGE'] if media_store.storage.public_url
+                                          else media_store.storage.url_expires // 2)
+        return response
+    if not os.path.isfile(path):
+        abort(404)
+    # Stored paths embed the content hash, so they can be cached forever.
+    response = media_delivery.send(path, max_age=current_app.config['MEDIA_MAX_AGE'], etag=filename.replace('/', '-'))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/img/<digest>')
+def resized_image(digest):
+    """A stored image resized to one of the signed widths (see ``transforms``)."""
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('fmt', 'webp')
+    quality = request.args.get('q', type=int)
+    # Unsigned or tampered parameters look like a missing image.
+    if not image_transforms.verify(digest, width, fmt, quality, request.args.get('s')):
+        abort(404)
+
+    def source():
+        blob = MediaBlob.query.filter_by(sha256=digest).first()
+        if blob is None:
+            raise FileNotFoundError(digest)
+        return media_store.local_file(blob.path)
+
+    try:
+        file = image_transforms.open(digest, width, fmt, quality, source)
+    except FileNotFoundError:
+        abort(404)
+    except TransformError:
+        current_app.logger.warning('Timed out resizing %s to %spx', digest, width)
+        abort(503)
+    response = media_delivery.send(
+        file.name,
+        mimetype=FORMATS[fmt][1],
+        max_age=current_app.config['MEDIA_MAX_AGE'],
+        etag=f'{digest}-{width}-{fmt}-{quality or 0}',
+        file=file,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,149 @@
+"""Query-count and latency budgets.
+
+``count_queries()`` records the statements an engine runs inside a ``with``
+block and ``query_budget()`` fails when a block runs more of them, or spends
+longer in the database, than allowed. They are meant for tests and
+benchmarks::
+
+    with query_budget(db.engine, max_queries=3):
+        client.get('/team')
+
+``QueryGuard`` applies the same budgets to every request. Views can declare
+their own with ``@query_guard.budget(max_queries=...)``; the app-wide default
+comes from ``QUERY_GUARD_MAX_QUERIES`` / ``QUERY_GUARD_MAX_MS``. A request
+over budget is logged, or fails with ``QueryBudgetExceeded`` when
+``QUERY_GUARD_STRICT`` is set, which is how a new N+1 query shows up.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_counters = ContextVar('query_counters', default=())
+_instrumented = set()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def check(self, max_queries=None, max_ms=None, label='block'):
+        if max_queries is not None and self.count > max_queries:
+            raise QueryBudgetExceeded(
+                f'{label} ran {self.count} queries (budget {max_queries}):\n' + '\n'.join(self.statements))
+        if max_ms is not None and self.seconds * 1000 > max_ms:
+            raise QueryBudgetExceeded(
+                f'{label} spent {self.seconds * 1000:.1f} ms in the database (budget {max_ms} ms)')
+
+
+def _instrument(engine):
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_guard_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_guard_start'].pop()
+        for counter in _counters.get():
+            counter.count += 1
+            counter.seconds += elapsed
+            counter.statements.append(statement)
+
+
+def start_counting(*engines):
+    """Start a ``QueryCounter`` for the current context; returns ``(counter, token)``.
+
+    Pass the token to ``stop_counting()`` from the same context.
+    """
+    for engine in engines:
+        _instrument(engine)
+    counter = QueryCounter()
+    return counter, _counters.set(_counters.get() + (counter,))
+
+
+def stop_counting(token):
+    _counters.reset(token)
+
+
+@contextmanager
+def count_queries(engine):
+    """Yield a ``QueryCounter`` that sees every statement run on ``engine`` in the block."""
+    counter, token = start_counting(engine)
+    try:
+        yield counter
+    finally:
+        stop_counting(token)
+
+
+@contextmanager
+def query_budget(engine, max_queries=None, max_ms=None):
+    with count_queries(engine) as counter:
+        yield counter
+    counter.check(max_queries, max_ms)
+
+
+class QueryGuard:
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        app.extensions['query_guard'] = self
+        app.before_request(self._start)
+        app.after_request(self._check)
+        app.teardown_request(self._stop)
+
+    def budget(self, max_queries=None, max_ms=None):
+        """Declare the query budget of a view, overriding the app-wide default."""
+        def decorator(view):
+            view.query_budget = (max_queries, max_ms)
+            return view
+        return decorator
+
+    def _limits(self):
+        view = current_app.view_functions.get(request.endpoint)
+        limits = getattr(view, 'query_budget', None)
+        if limits is None:
+            limits = (current_app.config.get('QUERY_GUARD_MAX_QUERIES'), current_app.config.get('QUERY_GUARD_MAX_MS'))
+        return limits
+
+    def _start(self):
+        max_queries, max_ms = self._limits()
+        if max_queries is None and max_ms is None:
+            return
+        # Every bind, so reads sent to the replica count too.
+        g.query_counter, g.query_counter_token = start_counting(*self.db.engines.values())
+
+    def _check(self, response):
+        counter = g.get('query_counter')
+        if counter is None:
+            return response
+        max_queries, max_ms = self._limits()
+        try:
+            counter.check(max_queries, max_ms, label=f'{request.method} {request.path}')
+        except QueryBudgetExceeded as exc:
+            if current_app.config.get('QUERY_GUARD_STRICT'):
+                raise
+            logger.warning('%s', exc)
+        return response
+
+    def _stop(self, exc):
+        token = g.pop('query_counter_token', None)
+        if token is not None:
+            stop_counting(token)
@@ -0,0 +1,314 @@
+"""Full-text search over the site's content.
+
+Every searchable model is registered with a kind (``gallery``, ``event``...),
+the attribute used as its title and the attributes folded into its body. One
+inverted index holds a document per row: an FTS5 virtual table on SQLite and a
+``tsvector`` column with a GIN index on PostgreSQL. Documents are rewritten in
+the same transaction as the rows they describe, from a session ``after_flush``
+hook, so the index never drifts from the data and no rebuild is needed after
+an admin edit.
+
+Queries are split into words and every word is matched as a prefix, so typing
+``port`` already finds "Portrait". Results are ranked with BM25 (SQLite) or
+``ts_rank_cd`` (PostgreSQL), with title matches weighted above body matches.
+"""
+import logging
+import re
+from dataclasses import dataclass
+
+from markupsafe import escape, Markup
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Highlight markers are control characters that cannot come from a form field;
+# snippets are escaped first and the markers turned into <mark> afterwards.
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+
+def query_terms(query, max_terms=8):
+    return _WORD.findall(query or '')[:max_terms]
+
+
+def make_snippet(body, terms, words=16):
+    """Cut ``words`` words of ``body`` around the first match of ``terms``.
+
+    Matched words are wrapped in the highlight markers, like FTS5's snippet().
+    """
+    tokens = (body or '').split()
+    prefixes = tuple(term.lower() for term in terms)
+    matches = {i for i, token in enumerate(tokens)
+               if any(word.startswith(prefixes) for word in _WORD.findall(token.lower()))}
+    start = max(min(min(matches) - words // 4, len(tokens) - words), 0) if matches else 0
+    window = tokens[start:start + words]
+    marked = [f'{_MARK_START}{token}{_MARK_END}' if start + i in matches else token
+              for i, token in enumerate(window)]
+    snippet = ' '.join(marked)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + words < len(tokens):
+        snippet += '…'
+    return snippet
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet or '')).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+@dataclass
+class SearchRow:
+    kind: str
+    ref_id: int
+    title: str
+    snippet: str
+
+
+@dataclass
+class SearchKind:
+    name: str
+    code: int
+    model: type
+    title: str
+    body: tuple
+
+    def document(self, obj):
+        body = ' '.join(str(value) for value in (getattr(obj, attr) for attr in self.body) if value)
+        return getattr(obj, self.title) or '', body
+
+    def changed(self, obj):
+        state = inspect(obj)
+        return any(state.attrs[attr].history.has_changes() for attr in (self.title,) + self.body)
+
+
+class Fts5Backend:
+    """SQLite FTS5 table keyed by ``rowid = id * 8 + kind code``.
+
+    FTS5 tables cannot have a unique index on their columns, so the kind and
+    row id are packed into the rowid to make updates and deletes a rowid lookup
+    instead of a scan, and so that narrowing a query to some kinds is a cheap
+    ``rowid % 8`` test rather than another term to intersect.
+    """
+
+    def rowid(self, kind, ref_id):
+        return ref_id * 8 + kind.code
+
+    def upsert(self, connection, kind, documents):
+        params = [{'rowid': self.rowid(kind, ref_id), 'kind': kind.name, 'ref_id': ref_id,
+                   'title': title, 'body': body} for ref_id, title, body in documents]
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), params)
+        connection.execute(
+            text('INSERT INTO search_index (rowid, kind, ref_id, title, body) '
+                 'VALUES (:rowid, :kind, :ref_id, :title, :body)'),
+            params)
+
+    def delete(self, connection, kind, ref_ids):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                           [{'rowid': self.rowid(kind, ref_id)} for ref_id in ref_ids])
+
+    def clear(self, connection, kind):
+        connection.execute(text('DELETE FROM search_index WHERE kind = :kind'), {'kind': kind.name})
+
+    def optimize(self, connection):
+        # Merge the b-tree segments left by many small writes into one.
+        connection.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+    def search(self, connection, terms, kinds, limit, offset):
+        match = '{title body} : (%s)' % ' '.join(f'"{term}"*' for term in terms)
+        kind_filter = ''
+        if kinds:
+            kind_filter = 'AND rowid %% 8 IN (%s) ' % ', '.join(str(kind.code) for kind in kinds)
+        # Every match is scored and only the page is kept, so the ranking is exact.
+        ranked = connection.execute(
+            text("SELECT rowid FROM search_index "
+                 f"WHERE search_index MATCH :match {kind_filter}"
+                 "ORDER BY bm25(search_index, 0.0, 0.0, 10.0, 1.0), rowid DESC LIMIT :limit OFFSET :offset"),
+            {'match': match, 'limit': limit, 'offset': offset}).scalars().all()
+        if not ranked:
+            return []
+        # FTS5's snippet() re-runs the MATCH for every row, which costs more than
+        # the ranking on broad queries; fetch the page by rowid and cut snippets here.
+        rows = connection.execute(
+            text('SELECT rowid, kind, ref_id, title, body FROM search_index '
+                 f"WHERE rowid IN ({', '.join(str(rowid) for rowid in ranked)})")).all()
+        by_rowid = {row.rowid: row for row in rows}
+        return [SearchRow(by_rowid[rowid].kind, by_rowid[rowid].ref_id, by_rowid[rowid].title,
+                          make_snippet(by_rowid[rowid].body, terms))
+                for rowid in ranked]
+
+
+class PostgresBackend:
+    """``search_document`` table with a weighted ``tsvector`` and a GIN index."""
+
+    def upsert(self, connection, kind, documents):
+        connection.execute(
+            text("INSERT INTO search_document (kind, ref_id, title, body, document) "
+                 "VALUES (:kind, :ref_id, :title, :body, "
+                 "setweight(to_tsvector('simple', :title), 'A') || setweight(to_tsvector('simple', :body), 'B')) "
+                 "ON CONFLICT (kind, ref_id) DO UPDATE SET title = EXCLUDED.title, "
+                 "body = EXCLUDED.body, document = EXCLUDED.document"),
+            [{'kind': kind.name, 'ref_id': ref_id, 'title': title, 'body': body}
+             for ref_id, title, body in documents])
+
+    def delete(self, connection, kind, ref_ids):
+        connection.execute(text('DELETE FROM search_document WHERE kind = :kind AND ref_id = :ref_id'),
+                           [{'kind': kind.name, 'ref_id': ref_id} for ref_id in ref_ids])
+
+    def clear(self, connection, kind):
+        connection.execute(text('DELETE FROM search_document WHERE kind = :kind'), {'kind': kind.name})
+
+    def optimize(self, connection):
+        pass
+
+    def search(self, connection, terms, kinds, limit, offset):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        kind_filter = 'AND kind = ANY(:kinds) ' if kinds else ''
+        kinds = [kind.name for kind in kinds]
+        # Every match is ranked; ts_headline, the expensive part, only runs on the page.
+        rows = connection.execute(
+            text("WITH q AS (SELECT to_tsquery('simple', :tsquery) AS q), "
+                 "ranked AS (SELECT kind, ref_id, title, body, ts_rank_cd(document, q.q) AS score "
+                 f"FROM search_document, q WHERE document @@ q.q {kind_filter}"
+                 "ORDER BY score DESC, ref_id DESC LIMIT :limit OFFSET :offset) "
+                 "SELECT kind, ref_id, title, "
+                 f"ts_headline('simple', body, q.q, 'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxFragments=1, MaxWords=16, MinWords=6') AS snippet "
+                 "FROM ranked, q ORDER BY score DESC, ref_id DESC"),
+            {'tsquery': tsquery, 'kinds': kinds, 'limit': limit, 'offset': offset})
+        return rows.all()
+
+
+BACKENDS = {
+    'sqlite': Fts5Backend,
+    'postgresql': PostgresBackend,
+}
+
+
+class SearchIndex:
+    """Registry of searchable models and entry point for queries."""
+
+    def __init__(self):
+        self.kinds = {}
+        self._by_model = {}
+        self._backends = {}
+        self._watched = False
+
+    def register(self, model, kind, title, body=()):
+        """Index ``model`` rows as documents of ``kind``."""
+        search_kind = SearchKind(kind, len(self.kinds) + 1, model, title, tuple(body))
+        self.kinds[kind] = search_kind
+        self._by_model[model] = search_kind
+        return search_kind
+
+    def backend(self, connection):
+        """Backend for the connection's database, or None when it has no full-text support."""
+        dialect = connection.dialect.name
+        if dialect not in self._backends:
+            if dialect in BACKENDS:
+                self._backends[dialect] = BACKENDS[dialect]()
+            else:
+                logger.warning('Full-text search is not supported on %s; search is disabled', dialect)
+                self._backends[dialect] = None
+        return self._backends[dialect]
+
+    def watch_models(self):
+        """Rewrite the documents of registered rows in the flush that changes them."""
+        if self._watched:
+            return
+        self._watched = True
+
+        @event.listens_for(Session, 'after_flush')
+        def index_changes(session, flush_context):
+            upserts, deletes = {}, {}
+            for obj in session.new:
+                kind = self._by_model.get(type(obj))
+                if kind is not None:
+                    upserts.setdefault(kind.name, []).append((obj.id, *kind.document(obj)))
+            for obj in session.dirty:
+                kind = self._by_model.get(type(obj))
+                # Skip updates that leave the indexed text alone, such as image job status.
+                if kind is not None and kind.changed(obj):
+                    upserts.setdefault(kind.name, []).append((obj.id, *kind.document(obj)))
+            for obj in session.deleted:
+                kind = self._by_model.get(type(obj))
+                if kind is not None:
+                    deletes.setdefault(kind.name, []).append(obj.id)
+            if not upserts and not deletes:
+                return
+            connection = session.connection()
+            backend = self.backend(connection)
+            if backend is None:
+                return
+            for name, documents in upserts.items():
+                backend.upsert(connection, self.kinds[name], documents)
+            for name, ref_ids in deletes.items():
+                backend.delete(connection, self.kinds[name], ref_ids)
+
+    def reindex(self, session, kinds=None, batch_size=500):
+        """Rebuild the documents of ``kinds`` (all by default) from the tables."""
+        connection = session.connection()
+        backend = self.backend(connection)
+        counts = {}
+        if backend is None:
+            return counts
+        for name in kinds or self.kinds:
+            kind = self.kinds[name]
+            backend.clear(connection, kind)
+            counts[name] = 0
+            query = session.query(kind.model).order_by(kind.model.id)
+            last_id = 0
+            while True:
+                batch = query.filter(kind.model.id > last_id).limit(batch_size).all()
+                if not batch:
+                    break
+                backend.upsert(connection, kind, [(obj.id, *kind.document(obj)) for obj in batch])
+                counts[name] += len(batch)
+                last_id = batch[-1].id
+                session.expunge_all()
+        backend.optimize(connection)
+        session.commit()
+        return counts
+
+    def search(self, session, query, kinds=None, page=1, per_page=20):
+        """Return ``(results, has_more)`` for one page of ranked matches.
+
+        Each result is a dict with ``kind``, ``id``, ``title`` and an
+        HTML-safe ``snippet`` with the matched words wrapped in ``<mark>``.
+        """
+        terms = query_terms(query)
+        kinds = [self.kinds[kind] for kind in (kinds or ()) if kind in self.kinds]
+        if not terms:
+            return [], False
+        connection = session.connection()
+        backend = self.backend(connection)
+        if backend is None:
+            return [], False
+        rows = backend.search(connection, terms, kinds, per_page + 1, (page - 1) * per_page)
+        results = [{'kind': row.kind, 'id': row.ref_id, 'title': row.title, 'snippet': highlight(row.snippet)}
+                   for row in rows[:per_page]]
+        return results, len(rows) > per_page
+
+    def load(self, session, results):
+        """Fetch the model instances behind ``results`` with one query per kind."""
+        ids = {}
+        for result in results:
+            ids.setdefault(result['kind'], []).append(result['id'])
+        objects = {}
+        for name, kind_ids in ids.items():
+            model = self.kinds[name].model
+            for obj in session.query(model).filter(model.id.in_(kind_ids)):
+                objects[name, obj.id] = obj
+        return objects
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic filter that keeps autogenerate away from the search tables.
+
+    They are created by hand in a migration (FTS5 also adds shadow tables), so
+    they have no model and would otherwise be scheduled for dropping.
+    """
+    if type_ == 'table' and reflected and compare_to is None:
+        return not name.startswith(('search_index', 'search_document'))
+    return True
@@ -0,0 +1,90 @@
+"""Cold-start benchmark: import, app creation and first request.
+
+Every run starts a fresh interpreter, as a newly scheduled container or
+gunicorn worker does, and times three phases:
+
+    import   importing the app module and everything it pulls in
+    create   create_app()
+    first    the first request through the test client (template compilation,
+             database connection, cold caches)
+
+It prints the median and worst run of each phase and exits with status 1 when
+the median total exceeds ``--budget-ms`` (2 s by default), so it can gate a deploy:
+
+    python startup_benchmark.py --runs 5 --budget-ms 1500 --path /gallery
+    python startup_benchmark.py --top 15     # slowest modules to import
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+response.get_data()
+done = time.perf_counter()
+print(json.dumps({'status': response.status_code, 'import': imported - started,
+                  'create': created - imported, 'first': done - created}))
+"""
+
+PHASES = ('import', 'create', 'first')
+
+
+def run_once(path, extra_args=()):
+    result = subprocess.run([sys.executable, *extra_args, '-c', CHILD, path], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise SystemExit(f'Startup run failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Parse ``-X importtime`` output into ``(self_us, module)``, slowest first."""
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s+(.*)', line)
+        if match:
+            rows.append((int(match.group(1)), match.group(2).strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help='URL of the first request')
+    parser.add_argument('--budget-ms', type=float, default=2000, help='fail when the median total is above this')
+    parser.add_argument('--top', type=int, default=0, help='also list the N slowest imports')
+    args = parser.parse_args()
+
+    runs = [run_once(args.path)[0] for _ in range(args.runs)]
+    if any(run['status'] >= 500 for run in runs):
+        raise SystemExit(f'First request to {args.path} failed with status {runs[0]["status"]}')
+    totals = [sum(run[phase] for phase in PHASES) for run in runs]
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs]
+        print(f'{phase:>7}: median {statistics.median(values):7.1f} ms   max {max(values):7.1f} ms')
+    median_total = statistics.median(totals) * 1000
+    print(f'  total: median {median_total:7.1f} ms   max {max(totals) * 1000:7.1f} ms   ({args.runs} runs)')
+
+    if args.top:
+        _, stderr = run_once(args.path, ('-X', 'importtime'))
+        print('\nslowest imports (self time):')
+        for micros, module in slowest_imports(stderr, args.top):
+            print(f'{micros / 1000:8.1f} ms  {module}')
+
+    if args.budget_ms is not None and median_total > args.budget_ms:
+        print(f'\nOver budget: {median_total:.1f} ms > {args.budget_ms:.1f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
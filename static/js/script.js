@@ -110,6 +110,21 @@ function filterGallery(category) {
         activeButton.classList.add('active');
     }
 
+    // Galleries rendered from the database are filtered on the server
+    const grid = document.getElementById('gallery-grid');
+    if (grid && grid.dataset.apiUrl) {
+        const searchInput = document.getElementById('gallery-search');
+        if (searchInput) {
+            searchInput.value = '';
+        }
+        gallerySearchRequest++;
+        grid.dataset.category = category;
+        grid.dataset.nextCursor = '';
+        grid.replaceChildren();
+        loadMoreGallery();
+        return;
+    }
+
     // Show/hide gallery items
     items.forEach(item => {
         if (category === 'all' || item.dataset.category === category) {
@@ -141,17 +156,179 @@ function searchGallery() {
     });
 }
 
+// Gallery pagination: fetch the next page from the JSON API as the visitor scrolls
+let galleryLoading = false;
+
+function buildGalleryItem(item) {
+    const wrapper = document.createElement('div');
+    wrapper.className = 'gallery-item animate-slide-up';
+    wrapper.dataset.category = item.category;
+
+    const card = document.createElement('div');
+    card.className = 'relative group cursor-pointer';
+    card.addEventListener('click', () => openModal(item.full, item.title));
+
+    const sizes = '(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 400px';
+    const picture = document.createElement('picture');
+    ['avif', 'webp'].forEach(fmt => {
+        if (item.srcset[fmt]) {
+            const source = document.createElement('source');
+            source.type = `image/${fmt}`;
+            source.srcset = item.srcset[fmt];
+            source.sizes = sizes;
+            picture.appendChild(source);
+        }
+    });
+    const img = document.createElement('img');
+    img.src = item.src;
+    if (item.srcset.jpeg) {
+        img.srcset = item.srcset.jpeg;
+        img.sizes = sizes;
+    }
+    if (item.width && item.height) {
+        img.width = item.width;
+        img.height = item.height;
+    }
+    // Same placeholder as the server-rendered cards, painted until the image loads
+    const background = [];
+    if (item.placeholder) {
+        background.push(`url("${item.placeholder}") center / cover no-repeat`);
+    }
+    if (item.color) {
+        background.push(item.color);
+    }
+    if (background.length) {
+        img.style.background = background.join(', ');
+    }
+    img.alt = item.title;
+    img.className = 'w-full h-64 object-cover rounded-lg image-hover';
+    img.loading = 'lazy';
+    img.decoding = 'async';
+    picture.appendChild(img);
+
+    const overlay = document.createElement('div');
+    overlay.className = 'absolute inset-0 bg-black/50 opacity-0 group-hover:opacity-100 transition-opacity rounded-lg flex items-center justify-center';
+    const caption = document.createElement('div');
+    caption.className = 'text-center text-white';
+    const title = document.createElement('p');
+    title.className = 'font-semibold';
+    title.textContent = item.title;
+    const badge = document.createElement('span');
+    badge.className = 'badge';
+    badge.textContent = item.category.charAt(0).toUpperCase() + item.category.slice(1);
+    caption.append(title, badge);
+    overlay.appendChild(caption);
+
+    card.append(picture, overlay);
+    wrapper.appendChild(card);
+    return wrapper;
+}
+
+function loadMoreGallery() {
+    const grid = document.getElementById('gallery-grid');
+    const button = document.getElementById('gallery-load-more');
+    if (!grid || !grid.dataset.apiUrl || galleryLoading) {
+        return;
+    }
+    const params = new URLSearchParams({ category: grid.dataset.category || 'all' });
+    ['sort', 'shape', 'color', 'camera'].forEach(name => {
+        if (grid.dataset[name]) {
+            params.set(name, grid.dataset[name]);
+        }
+    });
+    if (grid.dataset.nextCursor) {
+        params.set('cursor', grid.dataset.nextCursor);
+    } else if (grid.children.length) {
+        return;
+    }
+    galleryLoading = true;
+    fetch(`${grid.dataset.apiUrl}?${params}`)
+        .then(response => response.json())
+        .then(page => {
+            page.items.forEach(item => grid.appendChild(buildGalleryItem(item)));
+            grid.dataset.nextCursor = page.next_cursor || '';
+            if (button) {
+                button.classList.toggle('hidden', !page.next_cursor);
+            }
+        })
+        .finally(() => {
+            galleryLoading = false;
+        });
+}
+
+// Sort order, shape, colour and camera apply on top of the selected category
+function setGalleryOption(name, value) {
+    const grid = document.getElementById('gallery-grid');
+    if (!grid || !grid.dataset.apiUrl) {
+        return;
+    }
+    grid.dataset[name] = value;
+    filterGallery(grid.dataset.category || 'all');
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const button = document.getElementById('gallery-load-more');
+    const grid = document.getElementById('gallery-grid');
+    if (button && grid && grid.dataset.apiUrl && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting) && grid.dataset.nextCursor) {
+                loadMoreGallery();
+            }
+        }, { rootMargin: '600px 0px' });
+        observer.observe(button);
+    }
+});
+
+// Search galleries rendered from the database on the server, ranked by relevance
+let gallerySearchTimer = null;
+let gallerySearchRequest = 0;
+
+function searchGalleryServer() {
+    const grid = document.getElementById('gallery-grid');
+    const button = document.getElementById('gallery-load-more');
+    const query = document.getElementById('gallery-search').value.trim();
+    if (!query) {
+        // Back to the paginated listing of the selected category
+        filterGallery(grid.dataset.category || 'all');
+        return;
+    }
+    const requestId = ++gallerySearchRequest;
+    const params = new URLSearchParams({ q: query, kind: 'gallery', per_page: 48 });
+    fetch(`${grid.dataset.searchUrl}?${params}`)
+        .then(response => response.json())
+        .then(page => {
+            if (requestId !== gallerySearchRequest) {
+                return;
+            }
+            grid.replaceChildren(...page.results.filter(result => result.item).map(result => buildGalleryItem(result.item)));
+            grid.dataset.nextCursor = '';
+            if (button) {
+                button.classList.add('hidden');
+            }
+        });
+}
+
+function onGallerySearchInput() {
+    const grid = document.getElementById('gallery-grid');
+    if (grid && grid.dataset.searchUrl) {
+        clearTimeout(gallerySearchTimer);
+        gallerySearchTimer = setTimeout(searchGalleryServer, 200);
+    } else {
+        searchGallery();
+    }
+}
+
 // Clear search
 function clearSearch() {
     document.getElementById('gallery-search').value = '';
-    searchGallery();
+    onGallerySearchInput();
 }
 
 // Add search event listener
 document.addEventListener('DOMContentLoaded', function() {
     const searchInput = document.getElementById('gallery-search');
     if (searchInput) {
-        searchInput.addEventListener('input', searchGallery);
+        searchInput.addEventListener('input', onGallerySearchInput);
     }
 });
 
@@ -322,3 +499,34 @@ document.addEventListener('DOMContentLoaded', function() {
         addFeature();
     }
 });
+
+// Poll background image processing on admin pages
+function pollImageStatus(badge) {
+    fetch(badge.dataset.imageStatusUrl, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(job => {
+            badge.textContent = job.status;
+            if (job.status === 'ready') {
+                const img = badge.parentElement.querySelector('img');
+                if (img && job.thumbnail) {
+                    img.src = job.thumbnail;
+                }
+                if (job.duplicate_of) {
+                    badge.textContent = `duplicate of #${job.duplicate_of}`;
+                    badge.title = `Looks like gallery item #${job.duplicate_of}`;
+                    delete badge.dataset.imageStatusUrl;
+                } else {
+                    badge.remove();
+                }
+            } else if (job.status === 'failed') {
+                badge.title = job.error || '';
+            } else {
+                setTimeout(() => pollImageStatus(badge), 2000);
+            }
+        })
+        .catch(() => setTimeout(() => pollImageStatus(badge), 5000));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-image-status-url]').forEach(pollImageStatus);
+});
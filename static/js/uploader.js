@@ -0,0 +1,154 @@
+// Chunked, resumable batch uploads for the admin gallery page
+
+(function() {
+    const form = document.getElementById('batch-upload-form');
+    if (!form) {
+        return;
+    }
+    const csrfToken = form.dataset.csrfToken;
+    const progressList = document.getElementById('batch-progress');
+
+    async function sendJson(url, method, payload) {
+        const response = await fetch(url, {
+            method: method,
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+            body: JSON.stringify(payload)
+        });
+        const body = await response.json();
+        if (!response.ok) {
+            throw new Error(body.error || response.statusText);
+        }
+        return body;
+    }
+
+    async function chunkChecksum(chunk) {
+        // crypto.subtle is only available on HTTPS and localhost
+        if (!window.crypto || !window.crypto.subtle) {
+            return null;
+        }
+        const digest = await crypto.subtle.digest('SHA-256', await chunk.arrayBuffer());
+        return btoa(String.fromCharCode(...new Uint8Array(digest)));
+    }
+
+    async function currentOffset(uploadId) {
+        const response = await fetch(`/admin/uploads/${uploadId}`, { credentials: 'same-origin' });
+        return (await response.json()).offset;
+    }
+
+    async function putPart(url, part) {
+        let failures = 0;
+        while (true) {
+            try {
+                const response = await fetch(url, { method: 'PUT', body: part });
+                if (!response.ok) {
+                    throw new Error(`Part upload failed: ${response.status}`);
+                }
+                return response.headers.get('ETag');
+            } catch (err) {
+                failures += 1;
+                if (failures > 5) {
+                    throw err;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            }
+        }
+    }
+
+    // Media in a bucket: send the parts straight to it, a few at a time
+    async function uploadDirect(file, upload, onProgress) {
+        const etags = new Array(upload.urls.length);
+        let next = 0;
+        let sent = 0;
+        async function worker() {
+            while (next < upload.urls.length) {
+                const index = next++;
+                const part = file.slice(index * upload.part_size, (index + 1) * upload.part_size);
+                etags[index] = await putPart(upload.urls[index], part);
+                sent += part.size;
+                onProgress(sent / file.size);
+            }
+        }
+        await Promise.all(Array.from({ length: Math.min(4, upload.urls.length) }, worker));
+        const result = await sendJson(`/admin/uploads/${upload.id}/finalize`, 'POST', { etags: etags });
+        return result.id;
+    }
+
+    async function uploadFile(file, onProgress) {
+        const upload = await sendJson('/admin/uploads', 'POST', { filename: file.name, size: file.size });
+        if (upload.direct) {
+            return uploadDirect(file, upload, onProgress);
+        }
+        let offset = upload.offset;
+        let failures = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + upload.chunk_size);
+            try {
+                const headers = {
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(offset),
+                    'X-CSRFToken': csrfToken
+                };
+                const checksum = await chunkChecksum(chunk);
+                if (checksum) {
+                    headers['Upload-Checksum'] = checksum;
+                }
+                const response = await fetch(`/admin/uploads/${upload.id}`, {
+                    method: 'PATCH',
+                    credentials: 'same-origin',
+                    headers: headers,
+                    body: chunk
+                });
+                const state = await response.json();
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(state.error || response.statusText);
+                }
+                offset = state.offset;
+                failures = 0;
+                onProgress(offset / file.size);
+            } catch (err) {
+                failures += 1;
+                if (failures > 5) {
+                    throw err;
+                }
+                // Back off, then resume from whatever the server already has
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                offset = await currentOffset(upload.id);
+            }
+        }
+        await sendJson(`/admin/uploads/${upload.id}/finalize`, 'POST', {});
+        return upload.id;
+    }
+
+    form.addEventListener('submit', async function(event) {
+        event.preventDefault();
+        const files = Array.from(document.getElementById('batch-files').files);
+        const category = document.getElementById('batch-category').value;
+        const button = form.querySelector('button[type="submit"]');
+        if (!files.length) {
+            return;
+        }
+        button.disabled = true;
+        progressList.innerHTML = '';
+
+        const items = [];
+        try {
+            for (const file of files) {
+                const row = document.createElement('li');
+                row.textContent = `${file.name}: 0%`;
+                progressList.appendChild(row);
+                const uploadId = await uploadFile(file, fraction => {
+                    row.textContent = `${file.name}: ${Math.round(fraction * 100)}%`;
+                });
+                items.push({ upload_id: uploadId, title: file.name.replace(/\.[^.]+$/, ''), category: category });
+            }
+            const result = await sendJson('/admin/gallery/batch', 'POST', { items: items });
+            progressList.appendChild(document.createElement('li')).textContent = `Added ${result.items.length} gallery items.`;
+            setTimeout(() => window.location.reload(), 1000);
+        } catch (err) {
+            progressList.appendChild(document.createElement('li')).textContent = `Upload failed: ${err.message}`;
+        } finally {
+            button.disabled = false;
+        }
+    });
+})();
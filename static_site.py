@@ -0,0 +1,326 @@
+"""Pre-rendered copy of the public pages, for nginx or a CDN to serve.
+
+``flask publish`` requests every public page from the app itself and writes
+the responses to ``STATIC_SITE_DIR``. It also copies ``static/`` and the built
+bundles of ``static/dist`` (served as ``/assets``). Media are not copied:
+``/media`` and ``/img`` keep coming from the app, the proxy or the bucket.
+
+A page's path becomes a directory with an ``index`` file, and a query string
+becomes part of that file's name: ``/api/gallery?category=all&sort=uploaded``
+is written to ``api/gallery/index-category=all&sort=uploaded.json``. The pages
+are the ones in ``PAGES``, the gallery filtered by each category, and every
+``/api/gallery`` page the infinite scroll loads for each category, followed
+from cursor to cursor. nginx serves the files and passes anything else to the
+app (other filters, search, media, admin)::
+
+    map $args $site_args { "" ""; default "-$args"; }
+
+    location / {
+        root /srv/fotografica/instance/site;
+        gzip_static on;
+        try_files $uri/index$site_args.html $uri/index$site_args.json $uri @app;
+    }
+
+Rebuilds are incremental. Every public page answers conditional GETs (see
+``conditional``), so a page is requested again with the ETag its file was
+written from. A 304 costs a few validator queries and leaves the file alone.
+The ``/api/gallery`` pages all share one validator, so when it still matches
+their ETags the cursor chains are not walked at all. After a commit, only the
+pages whose ``page_cache.cached`` tags include a changed model are requested.
+Pages that no longer exist, such as the tail of a shorter gallery, are
+deleted. Pages are always rendered by the views, never taken from the page
+cache.
+
+With ``STATIC_SITE_AUTO`` every commit that changes a public model schedules
+such a rebuild ``STATIC_SITE_DELAY`` seconds later in a background thread, so
+a burst of admin saves publishes once. Workers take turns through a lock file
+in the output directory. The events page also depends on the date, so
+``flask publish`` should run once a day as well.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from urllib.parse import urlencode
+
+from flask import url_for
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.http import unquote_etag
+
+from assets import _compressed, _write
+from database import primary_reads
+
+logger = logging.getLogger(__name__)
+
+PAGES = ('public.index', 'public.about', 'public.events', 'public.team', 'public.gallery', 'public.contact')
+GALLERY_PAGE = 'public.gallery'
+GALLERY_API = 'api.gallery'
+
+# Response MIME type -> file extension; anything else is not published.
+EXTENSIONS = {'text/html': '.html', 'application/json': '.json'}
+
+MANIFEST = '.manifest.json'
+
+
+class StaticSite:
+    def __init__(self, app=None):
+        self.app = None
+        self.directory = None
+        self.auto = False
+        self.delay = 2.0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+        self._watched = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.get('STATIC_SITE_DIR') or os.path.join(app.instance_path, 'site')
+        self.auto = app.config.get('STATIC_SITE_AUTO', False)
+        self.delay = app.config.get('STATIC_SITE_DELAY', 2.0)
+        if self.auto:
+            self.watch_models()
+        app.extensions['static_site'] = self
+
+    # Publishing
+
+    def publish(self, changed=None, force=False):
+        """Render the pages showing any of the ``changed`` model names into ``directory``.
+
+        ``changed=None`` means every page plus the static assets. ``force``
+        rewrites pages even when their ETag has not changed. Returns counts
+        of what was done.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return self._publish(None if changed is None else set(changed), force)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, changed, force):
+        from extensions import page_cache
+        from forms import GALLERY_CATEGORIES
+
+        manifest = self._load_manifest()
+        stats = {'rendered': 0, 'unchanged': 0, 'removed': 0, 'failed': 0, 'assets': 0}
+        client = self.app.test_client()
+        with self.app.test_request_context():
+            paths = {endpoint: url_for(endpoint) for endpoint in PAGES + (GALLERY_API,)}
+        categories = [value for value, _ in GALLERY_CATEGORIES if value != 'all']
+
+        # Pages are rendered from the primary, which has the commit that triggered them.
+        with primary_reads(), page_cache.bypass():
+            for endpoint in PAGES + (GALLERY_API,):
+                if changed is not None and not self.tags(endpoint) & changed:
+                    continue
+                published = set()
+                if endpoint == GALLERY_API:
+                    first_pages = [f'{paths[endpoint]}?{urlencode(self._chain_params(category))}'
+                                   for category in ['all'] + categories]
+                    if not force and self._unchanged(endpoint, paths[endpoint], first_pages, manifest, published,
+                                                     stats):
+                        continue
+                    for category in ['all'] + categories:
+                        self._publish_chain(client, paths[endpoint], category, manifest, published, stats, force)
+                else:
+                    queries = ['']
+                    if endpoint == GALLERY_PAGE:
+                        queries += [urlencode({'category': category}) for category in categories]
+                    for query in queries:
+                        self._publish_page(client, endpoint, paths[endpoint], query, manifest, published, stats,
+                                           force)
+                for url in [url for url, entry in manifest.items() if entry['endpoint'] == endpoint]:
+                    if url not in published:
+                        self._remove(manifest.pop(url)['file'])
+                        stats['removed'] += 1
+
+        self._save_manifest(manifest)
+        if changed is None:
+            stats['assets'] = self.copy_assets()
+        return stats
+
+    def _publish_chain(self, client, path, category, manifest, published, stats, force):
+        """Publish the gallery API pages of ``category``, following ``next_cursor``."""
+        cursor, seen = None, set()
+        while True:
+            query = urlencode(self._chain_params(category, cursor))
+            data = self._publish_page(client, GALLERY_API, path, query, manifest, published, stats, force)
+            if data is None:
+                return
+            cursor = json.loads(data).get('next_cursor')
+            if not cursor or cursor in seen:
+                return
+            seen.add(cursor)
+
+    @staticmethod
+    def _chain_params(category, cursor=None):
+        # The parameters in the order loadMoreGallery() in script.js sends them.
+        params = {'category': category, 'sort': 'uploaded'}
+        if cursor:
+            params['cursor'] = cursor
+        return params
+
+    def _unchanged(self, endpoint, path, required, manifest, published, stats):
+        """Keep the files of ``endpoint`` as they are when its validator still matches their ETags.
+
+        ``required`` lists URLs that must already be published. Returns
+        whether the pages were kept.
+        """
+        validator = getattr(self.app.view_functions[endpoint], 'validator', None)
+        entries = {url: entry for url, entry in manifest.items() if entry['endpoint'] == endpoint}
+        if validator is None or not set(required) <= set(entries):
+            return False
+        with self.app.test_request_context(path):
+            etag, _ = validator()
+        for entry in entries.values():
+            if unquote_etag(entry['etag'])[0] != etag or not os.path.exists(self._path(entry['file'])):
+                return False
+        published.update(entries)
+        stats['unchanged'] += len(entries)
+        return True
+
+    def _publish_page(self, client, endpoint, path, query, manifest, published, stats, force):
+        """Write one page if it changed; returns its body, or None when it could not be rendered."""
+        url = f'{path}?{query}' if query else path
+        entry = manifest.get(url)
+        headers = {}
+        if entry is not None and not force and os.path.exists(self._path(entry['file'])):
+            headers['If-None-Match'] = entry['etag']
+        response = client.get(url, headers=headers)
+        if response.status_code == 304:
+            published.add(url)
+            stats['unchanged'] += 1
+            with open(self._path(entry['file']), 'rb') as f:
+                return f.read()
+        extension = EXTENSIONS.get(response.mimetype)
+        if response.status_code != 200 or extension is None or not response.headers.get('ETag'):
+            logger.warning('Not publishing %s: %s %s', url, response.status, response.mimetype)
+            stats['failed'] += 1
+            if entry is not None:
+                # Keep the last good copy rather than dropping the page.
+                published.add(url)
+            return None
+        data = response.get_data()
+        filename = f'index-{query}{extension}' if query else f'index{extension}'
+        name = '/'.join([part for part in path.split('/') if part] + [filename])
+        if entry is not None and entry['file'] != name:
+            self._remove(entry['file'])
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write(target, data)
+        stale = {'.gz', '.br'}
+        for suffix, compressed in _compressed(data):
+            _write(target + suffix, compressed)
+            stale.discard(suffix)
+        for suffix in stale:
+            _remove_file(target + suffix)
+        manifest[url] = {'endpoint': endpoint, 'file': name, 'etag': response.headers['ETag']}
+        published.add(url)
+        stats['rendered'] += 1
+        return data
+
+    def copy_assets(self):
+        """Copy ``static/`` and the built bundles, skipping files whose size and mtime match; returns the count."""
+        static = self.app.static_folder
+        dist = os.path.join(static, 'dist')
+        copied = 0
+        for source_root, target_root in ((static, 'static'), (dist, 'assets')):
+            for directory, subdirectories, files in os.walk(source_root):
+                # Bundles are published under /assets, where the app serves them.
+                subdirectories[:] = [d for d in subdirectories if os.path.join(directory, d) != dist]
+                for name in files:
+                    source = os.path.join(directory, name)
+                    target = self._path(f'{target_root}/{os.path.relpath(source, source_root)}')
+                    stat = os.stat(source)
+                    try:
+                        existing = os.stat(target)
+                        if existing.st_size == stat.st_size and int(existing.st_mtime) == int(stat.st_mtime):
+                            continue
+                    except FileNotFoundError:
+                        pass
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copy2(source, target + '.tmp')
+                    os.replace(target + '.tmp', target)
+                    copied += 1
+        return copied
+
+    def tags(self, endpoint):
+        """The models a page shows, as declared to ``page_cache.cached()``."""
+        return set(getattr(self.app.view_functions[endpoint], 'cache_tags', ()))
+
+    def _path(self, name):
+        return os.path.join(self.directory, *name.split('/'))
+
+    def _remove(self, name):
+        for suffix in ('', '.gz', '.br'):
+            _remove_file(self._path(name) + suffix)
+
+    def _load_manifest(self):
+        try:
+            with open(self._path(MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        _write(self._path(MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Rebuilding after commits
+
+    def schedule(self, changed):
+        """Publish the pages of the ``changed`` models after ``delay`` seconds, merged with later calls."""
+        changed = set(changed) & set().union(*(self.tags(endpoint) for endpoint in PAGES + (GALLERY_API,)))
+        if not changed:
+            return
+        with self._lock:
+            self._pending.update(changed)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._publish_pending)
+                self._timer.start()
+
+    def _publish_pending(self):
+        with self._lock:
+            changed, self._pending, self._timer = self._pending, set(), None
+        with self.app.app_context():
+            try:
+                stats = self.publish(changed)
+            except Exception:
+                logger.exception('Publishing the static site failed')
+            else:
+                logger.info('Published the static site for %s: %s', ', '.join(sorted(changed)), stats)
+
+    def watch_models(self):
+        """Schedule a rebuild whenever a commit inserts, updates or deletes a model."""
+        if self._watched:
+            return
+        self._watched = True
+
+        @event.listens_for(Session, 'after_flush')
+        def collect_changes(db_session, flush_context):
+            changed = db_session.info.setdefault('static_site_changed', set())
+            for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+                changed.add(type(obj).__name__)
+
+        @event.listens_for(Session, 'after_commit')
+        def publish_changed(db_session):
+            changed = db_session.info.pop('static_site_changed', None)
+            if changed:
+                self.schedule(changed)
+
+        @event.listens_for(Session, 'after_rollback')
+        def discard_changes(db_session):
+            db_session.info.pop('static_site_changed', None)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,284 @@
+"""Where media files are kept: a local directory or an S3-compatible bucket.
+
+``MediaStore`` decides what a file is called (``ab/cd/<digest>.jpg``); a
+storage backend keeps the bytes under that key. ``MEDIA_STORAGE`` picks one:
+
+``local``
+    Files under ``MEDIA_ROOT``. Fine for a single host, or several sharing
+    one volume.
+``s3``
+    Files in ``S3_BUCKET`` (under ``S3_PREFIX``), shared by every container.
+    ``S3_ENDPOINT_URL`` points it at MinIO or any other S3-compatible store,
+    which is also how to run it locally. Credentials come from the usual
+    ``AWS_*`` variables. boto3 is optional: ``pip install -r requirements-s3.txt``.
+
+Both backends stream: ``open()`` returns a readable file and ``put_file()``
+stores a file from disk. The S3 backend sends anything larger than
+``S3_PART_SIZE`` as a multipart upload of ``S3_MAX_CONCURRENCY`` parts at a
+time. Pillow needs real files, so ``local_file()`` and ``local_dir()`` give a
+path that is the file itself on disk, or a temporary copy that is uploaded on
+the way out of the block.
+
+The S3 backend can also presign multipart uploads, so the admin uploader sends
+photos straight to the bucket (see ``uploads.DirectUploads``). The bucket
+then needs a CORS rule allowing ``PUT`` from the site and exposing the
+``ETag`` header. It also needs a lifecycle rule that expires ``uploads/`` and
+aborts incomplete multipart uploads after a day.
+
+Backends are pickled into the process pools with the jobs that use them; the
+S3 client is created on first use in each process.
+"""
+import mimetypes
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Stored keys never change content (see media_store), so they can be cached for good.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class LocalStorage:
+    direct_uploads = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def put_file(self, path, key, move=False):
+        """Store the file at ``path`` as ``key``; ``move`` consumes it."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not move:
+            shutil.copyfile(path, target + '.tmp')
+            path = target + '.tmp'
+        os.replace(path, target)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self.path(prefix.rstrip('/')), ignore_errors=True)
+
+    @contextmanager
+    def local_file(self, key):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        yield path
+
+    @contextmanager
+    def local_dir(self, prefix):
+        path = self.path(prefix)
+        os.makedirs(path, exist_ok=True)
+        yield path
+
+    def url(self, key):
+        """Local files are sent by the app itself."""
+        return None
+
+
+class S3Storage:
+    direct_uploads = True
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, public_url=None,
+                 part_size=8 * 1024 * 1024, max_concurrency=8, url_expires=3600):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.url_expires = url_expires
+        self._client = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(_client=None, _pid=None)
+        return state
+
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            # Only deployments using the bucket need boto3 installed.
+            import boto3
+            from botocore.config import Config
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                config=Config(signature_version='s3v4', max_pool_connections=max(10, 2 * self.max_concurrency)),
+            )
+            self._pid = os.getpid()
+        return self._client
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def _transfer(self):
+        from boto3.s3.transfer import TransferConfig
+        return TransferConfig(multipart_threshold=self.part_size, multipart_chunksize=self.part_size,
+                              max_concurrency=self.max_concurrency)
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as exc:
+            if exc.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(key) from exc
+            raise
+
+    def exists(self, key):
+        try:
+            self._head(key)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self, key):
+        return self._head(key)['ContentLength']
+
+    def open(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+        except self.client.exceptions.NoSuchKey as exc:
+            raise FileNotFoundError(key) from exc
+
+    def _extra_args(self, key):
+        return {'ContentType': mimetypes.guess_type(key)[0] or 'application/octet-stream', 'CacheControl': IMMUTABLE}
+
+    def put_file(self, path, key, move=False):
+        """Upload the file at ``path`` as ``key``, in parallel parts when it is large."""
+        self.client.upload_file(path, self.bucket, self._key(key), ExtraArgs=self._extra_args(key),
+                                Config=self._transfer())
+        if move:
+            os.remove(path)
+
+    def copy(self, source_key, key):
+        """Copy within the bucket; the bytes never leave the store."""
+        self.client.copy({'Bucket': self.bucket, 'Key': self._key(source_key)}, self.bucket, self._key(key),
+                         ExtraArgs=dict(self._extra_args(key), MetadataDirective='REPLACE'),
+                         Config=self._transfer())
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = [{'Key': entry['Key']} for entry in page.get('Contents', ())]
+            if objects:
+                # A page holds at most 1,000 keys, the limit of one delete_objects call.
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+
+    @contextmanager
+    def local_file(self, key):
+        """Download ``key`` to a temporary file, in parallel ranges when it is large."""
+        from botocore.exceptions import ClientError
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        try:
+            try:
+                self.client.download_file(self.bucket, self._key(key), path, Config=self._transfer())
+            except ClientError as exc:
+                if exc.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                    raise FileNotFoundError(key) from exc
+                raise
+            yield path
+        finally:
+            os.remove(path)
+
+    @contextmanager
+    def local_dir(self, prefix):
+        """A temporary directory whose files are uploaded under ``prefix`` once the block succeeds."""
+        path = tempfile.mkdtemp()
+        try:
+            yield path
+            uploads = []
+            for directory, _, files in os.walk(path):
+                for name in files:
+                    local = os.path.join(directory, name)
+                    uploads.append((local, prefix.rstrip('/') + '/' + os.path.relpath(local, path).replace(os.sep, '/')))
+            with ThreadPoolExecutor(self.max_concurrency) as pool:
+                for future in [pool.submit(self.put_file, local, key) for local, key in uploads]:
+                    future.result()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def url(self, key):
+        """Where browsers fetch ``key``: under ``public_url`` or a presigned GET."""
+        if self.public_url:
+            return f'{self.public_url}/{self._key(key)}'
+        return self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': self._key(key)},
+                                                  ExpiresIn=self.url_expires)
+
+    # Multipart uploads sent by the browser
+
+    def create_multipart(self, key, content_type=None):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key),
+                                                       ContentType=content_type or 'application/octet-stream')
+        return response['UploadId']
+
+    def presign_part(self, key, upload_id, part_number, expires):
+        return self.client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': self.bucket, 'Key': self._key(key), 'UploadId': upload_id, 'PartNumber': part_number},
+            ExpiresIn=expires,
+        )
+
+    def complete_multipart(self, key, upload_id, etags):
+        """Assemble the parts; ``etags`` lists the ETag of parts 1, 2, ... in order."""
+        from botocore.exceptions import ClientError
+        parts = [{'PartNumber': number, 'ETag': etag} for number, etag in enumerate(etags, 1)]
+        try:
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                                                  MultipartUpload={'Parts': parts})
+        except ClientError as exc:
+            code = exc.response['Error']['Code']
+            if code == 'NoSuchUpload':
+                raise FileNotFoundError(key) from exc
+            if code in ('InvalidPart', 'InvalidPartOrder', 'EntityTooSmall'):
+                raise ValueError(exc.response['Error'].get('Message') or code) from exc
+            raise
+
+    def abort_multipart(self, key, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+
+
+def create_storage(config, root):
+    """The backend selected by ``MEDIA_STORAGE``; ``root`` is the local media directory."""
+    kind = config.get('MEDIA_STORAGE') or 'local'
+    if kind == 'local':
+        return LocalStorage(root)
+    if kind == 's3':
+        if not config.get('S3_BUCKET'):
+            raise ValueError('MEDIA_STORAGE=s3 needs S3_BUCKET')
+        return S3Storage(
+            config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX') or '',
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            public_url=config.get('S3_PUBLIC_URL'),
+            part_size=config.get('S3_PART_SIZE', 8 * 1024 * 1024),
+            max_concurrency=config.get('S3_MAX_CONCURRENCY', 8),
+            url_expires=config.get('S3_URL_EXPIRES', 3600),
+        )
+    raise ValueError(f'Unknown MEDIA_STORAGE {kind!r}, expected "local" or "s3"')
@@ -0,0 +1,41 @@
+"""Streamed rendering for the large public pages.
+
+``render_template`` builds the whole page before the first byte leaves the
+server, so the browser cannot start on the stylesheet and scripts linked in
+``<head>`` until the gallery body is rendered too. ``render_page`` streams the
+template instead: everything up to ``</head>`` is sent as soon as it is
+rendered and the rest follows in ``buffer_size`` pieces rather than one write
+per template fragment.
+
+Queries should be run before calling it (pass lists, not lazy queries), so
+database errors still produce a proper error page rather than a truncated one.
+"""
+from flask import current_app, render_template, stream_template
+
+HEAD_END = '</head>'
+
+
+def _coalesce(chunks, buffer_size):
+    buffer, size, head_sent = [], 0, False
+    try:
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= buffer_size or (not head_sent and HEAD_END in chunk):
+                head_sent = head_sent or HEAD_END in chunk
+                yield ''.join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def render_page(template_name, **context):
+    """Render ``template_name``, streamed when ``STREAM_TEMPLATES`` is on."""
+    if not current_app.config.get('STREAM_TEMPLATES'):
+        return render_template(template_name, **context)
+    chunks = stream_template(template_name, **context)
+    buffer_size = current_app.config.get('STREAM_BUFFER_SIZE', 8192)
+    return current_app.response_class(_coalesce(chunks, buffer_size), mimetype='text/html')
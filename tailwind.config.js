@@ -1,6 +1,7 @@
 module.exports = {
   content: [
     './templates/**/*.html',
+    './static/js/**/*.js',
     './**/*.py'
   ],
   theme: {
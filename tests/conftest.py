@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def app_config():
+    """Config overrides for ``app``; override this fixture in a test module."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    """An app on a fresh SQLite database built by the migrations."""
+    from flask_migrate import Migrate, upgrade
+
+    from app import create_app
+    from config import DevelopmentConfig
+    from extensions import db
+    from search import include_object
+
+    class TestConfig(DevelopmentConfig):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        SECRET_KEY = 'test'
+        MEDIA_ROOT = str(tmp_path / 'media')
+        IMAGE_CACHE_DIR = str(tmp_path / 'image-cache')
+        JOB_QUEUE_MODE = 'sync'
+        PAGE_CACHE_BACKEND = 'null'
+        METRICS_DIR = None
+        METRICS_SERVER_TIMING = 'off'
+        STATIC_SITE_AUTO = False
+        QUERY_GUARD_STRICT = True
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(type('TestConfig', (TestConfig,), app_config))
+    Migrate(app, db, include_object=include_object)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    """A client logged in as an administrator."""
+    from werkzeug.security import generate_password_hash
+
+    from extensions import db
+    from models import User
+
+    with app.app_context():
+        db.session.add(User(username='admin', email='admin@example.com', password=generate_password_hash('secret'),
+                            is_admin=True))
+        db.session.commit()
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'secret'})
+    assert response.status_code == 302
+    return client
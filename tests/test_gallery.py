@@ -0,0 +1,44 @@
+"""Keyset pagination of the gallery API."""
+from datetime import timedelta
+
+import pytest
+
+from extensions import db
+from models import GalleryItem, utcnow
+
+
+@pytest.fixture
+def items(app):
+    """Fifteen items; every third has no capture date."""
+    now = utcnow()
+    with app.app_context():
+        rows = [GalleryItem(title=f'Photo {i}', image_path=f'/media/{i}.jpg', image_status='ready',
+                            uploaded_at=now - timedelta(minutes=i),
+                            taken_at=now - timedelta(days=(i * 7) % 15) if i % 3 else None)
+                for i in range(15)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [(row.id, row.uploaded_at, row.taken_at) for row in rows]
+
+
+def walk(client, query):
+    ids, cursor = [], None
+    while True:
+        response = client.get(f'/api/gallery?{query}' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        ids += [item['id'] for item in response.json['items']]
+        cursor = response.json['next_cursor']
+        if not cursor:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 4, 5, 20])
+def test_sort_by_taken_puts_undated_last(client, items, limit):
+    dated = sorted((row for row in items if row[2] is not None), key=lambda row: (row[2], row[0]), reverse=True)
+    undated = sorted((row[0] for row in items if row[2] is None), reverse=True)
+    assert walk(client, f'sort=taken&limit={limit}') == [row[0] for row in dated] + undated
+
+
+def test_sort_by_uploaded(client, items):
+    expected = [row[0] for row in sorted(items, key=lambda row: (row[1], row[0]), reverse=True)]
+    assert walk(client, 'sort=uploaded&limit=4') == expected
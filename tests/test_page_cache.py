@@ -0,0 +1,59 @@
+"""The page cache against its in-process memory backend."""
+import pytest
+
+from extensions import db
+from models import TeamMember
+
+
+@pytest.fixture
+def app_config():
+    return {'PAGE_CACHE_BACKEND': 'memory'}
+
+
+@pytest.fixture
+def member_id(app):
+    with app.app_context():
+        member = TeamMember(name='Ada Lens', role='Photographer', specialty='Portraits', bio='Bio',
+                            image='/static/images/team-1.jpg', is_core=True)
+        db.session.add(member)
+        db.session.commit()
+        return member.id
+
+
+def get(client, url):
+    # Streamed pages are stored once their body has been read in full.
+    response = client.get(url)
+    response.get_data()
+    return response
+
+
+def test_admin_edit_invalidates_cached_page(client, admin_client, member_id):
+    first = get(client, '/team')
+    assert first.headers['X-Cache'] == 'MISS'
+    second = get(client, '/team')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+    assert b'Ada Lens' in second.get_data()
+
+    response = admin_client.post(f'/admin/team/edit/{member_id}', data={
+        'name': 'Grace Shutter', 'role': 'Photographer', 'specialty': 'Portraits', 'bio': 'Bio',
+        'achievements-0': 'Award', 'image': '/static/images/team-1.jpg', 'is_core': 'y',
+    })
+    assert response.status_code == 302
+
+    response = get(client, '/team')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'Grace Shutter' in response.get_data()
+    assert b'Ada Lens' not in response.get_data()
+    assert get(client, '/team').headers['X-Cache'] == 'HIT'
+
+
+def test_session_bypasses_cache(client, admin_client, member_id):
+    get(client, '/team')
+    assert get(client, '/team').headers['X-Cache'] == 'HIT'
+
+    # The page is cached, yet a visitor with a session always gets it rendered.
+    for _ in range(2):
+        response = get(admin_client, '/team')
+        assert response.status_code == 200
+        assert 'X-Cache' not in response.headers
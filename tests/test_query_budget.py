@@ -0,0 +1,55 @@
+"""Public pages keep a constant number of queries however many rows they show.
+
+The app runs with ``QUERY_GUARD_STRICT``, so a view going over its
+``@query_guard.budget`` fails the request. The whole response, streamed
+templates included, is also counted with ``query_budget()``.
+"""
+from datetime import timedelta
+
+import pytest
+
+from extensions import db
+from models import GalleryItem, TeamAchievement, TeamMember, utcnow
+from query_guard import query_budget
+
+# Sorting by capture date reads the undated tail with one more query.
+PAGES = [
+    ('/team', 3),
+    ('/gallery', 3),
+    ('/gallery?category=portrait&sort=taken', 4),
+    ('/api/gallery', 2),
+    ('/api/gallery?category=portrait&limit=5', 2),
+    ('/api/gallery?sort=taken&limit=50', 3),
+]
+
+
+@pytest.fixture
+def seed(app):
+    """Add ``count`` team members and gallery items."""
+    def seed(count):
+        now = utcnow()
+        with app.app_context():
+            start = TeamMember.query.count()
+            for i in range(start, start + count):
+                member = TeamMember(name=f'Member {i}', role='Photographer', specialty='Portraits', bio='Bio',
+                                    image=f'/static/images/team-{i}.jpg', is_core=i % 3 == 0)
+                member.achievements = [TeamAchievement(position=position, text=f'Award {position}')
+                                       for position in range(2)]
+                db.session.add(member)
+                db.session.add(GalleryItem(title=f'Photo {i}', description='A photo', image_path=f'/media/{i}.jpg',
+                                           category=('portrait', 'street')[i % 2], camera_model=f'Camera {i % 4}',
+                                           taken_at=now - timedelta(days=i) if i % 4 else None, image_status='ready'))
+            db.session.commit()
+    return seed
+
+
+@pytest.mark.parametrize('url, max_queries', PAGES)
+def test_public_page_within_budget(app, client, seed, url, max_queries):
+    for count in (3, 30):
+        seed(count)
+        with app.app_context():
+            with query_budget(db.engine, max_queries=max_queries):
+                response = client.get(url)
+                body = response.get_data()
+        assert response.status_code == 200, body[:500]
+        assert body
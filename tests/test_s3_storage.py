@@ -0,0 +1,185 @@
+"""S3Storage and DirectUploads against moto's in-memory S3.
+
+Skipped unless boto3 and moto are installed (``requirements-dev.txt``).
+"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+requests = pytest.importorskip('requests')
+
+from botocore.stub import Stubber  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from storage import S3Storage  # noqa: E402
+from uploads import DirectUploads, UploadError, UploadNotFound  # noqa: E402
+
+BUCKET = 'media'
+MIB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in (('AWS_ACCESS_KEY_ID', 'test'), ('AWS_SECRET_ACCESS_KEY', 'test'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        storage = S3Storage(BUCKET, prefix='site', region='us-east-1', part_size=5 * MIB, max_concurrency=4)
+        storage.client.create_bucket(Bucket=BUCKET)
+        yield storage
+
+
+def keys(storage):
+    paginator = storage.client.get_paginator('list_objects_v2')
+    return sorted(entry['Key'] for page in paginator.paginate(Bucket=BUCKET) for entry in page.get('Contents', ()))
+
+
+def put_parts(storage, key, upload_id, data, part_size):
+    etags = []
+    for number, start in enumerate(range(0, len(data), part_size), 1):
+        url = storage.presign_part(key, upload_id, number, 60)
+        response = requests.put(url, data=data[start:start + part_size])
+        assert response.ok, response.text
+        etags.append(response.headers['ETag'])
+    return etags
+
+
+def test_put_open_and_delete(s3, tmp_path):
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(b'x' * (6 * MIB))
+    s3.put_file(str(path), 'ab/photo.jpg', move=True)
+    assert not path.exists()
+    assert keys(s3) == ['site/ab/photo.jpg']
+    assert s3.size('ab/photo.jpg') == 6 * MIB
+    head = s3.client.head_object(Bucket=BUCKET, Key='site/ab/photo.jpg')
+    assert head['ContentType'] == 'image/jpeg'
+    assert s3.open('ab/photo.jpg').read(3) == b'xxx'
+    with s3.local_file('ab/photo.jpg') as local:
+        assert os.path.getsize(local) == 6 * MIB
+    assert not os.path.exists(local)
+
+    s3.delete('ab/photo.jpg')
+    assert not s3.exists('ab/photo.jpg')
+    with pytest.raises(FileNotFoundError):
+        s3.open('ab/photo.jpg')
+    with pytest.raises(FileNotFoundError):
+        with s3.local_file('ab/photo.jpg'):
+            pass
+
+
+def test_delete_prefix_pages_through_listing(s3):
+    # One more object than a listing page and a delete_objects call hold.
+    for i in range(1001):
+        s3.client.put_object(Bucket=BUCKET, Key=f'site/derivatives/ab/{i}.webp', Body=b'')
+    s3.client.put_object(Bucket=BUCKET, Key='site/derivatives/cd/0.webp', Body=b'')
+    s3.delete_prefix('derivatives/ab/')
+    assert keys(s3) == ['site/derivatives/cd/0.webp']
+
+
+def test_local_dir_uploads_on_exit(s3):
+    with s3.local_dir('derivatives/ab') as directory:
+        os.makedirs(os.path.join(directory, 'thumb'))
+        for name in ('thumb/1.webp', 'thumb/1.avif', 'large.jpg'):
+            with open(os.path.join(directory, *name.split('/')), 'wb') as f:
+                f.write(b'data')
+    assert keys(s3) == ['site/derivatives/ab/large.jpg', 'site/derivatives/ab/thumb/1.avif',
+                        'site/derivatives/ab/thumb/1.webp']
+    assert not os.path.exists(directory)
+
+
+def test_local_dir_uploads_nothing_on_error(s3):
+    with pytest.raises(RuntimeError):
+        with s3.local_dir('derivatives/ab') as directory:
+            with open(os.path.join(directory, 'large.jpg'), 'wb') as f:
+                f.write(b'data')
+            raise RuntimeError
+    assert keys(s3) == []
+    assert not os.path.exists(directory)
+
+
+def test_multipart_upload(s3):
+    data = os.urandom(5 * MIB) + b'tail'
+    upload_id = s3.create_multipart('uploads/a', 'image/jpeg')
+    etags = put_parts(s3, 'uploads/a', upload_id, data, 5 * MIB)
+    s3.complete_multipart('uploads/a', upload_id, etags)
+    assert s3.open('uploads/a').read() == data
+
+
+def test_complete_multipart_errors(s3):
+    data = os.urandom(5 * MIB) + b'tail'
+    upload_id = s3.create_multipart('uploads/a')
+    etags = put_parts(s3, 'uploads/a', upload_id, data, 5 * MIB)
+    with pytest.raises(ValueError):
+        s3.complete_multipart('uploads/a', upload_id, [etags[0], '"0123456789abcdef0123456789abcdef"'])
+
+    # Parts other than the last must be at least 5 MiB.
+    upload_id = s3.create_multipart('uploads/b')
+    etags = put_parts(s3, 'uploads/b', upload_id, b'x' * (2 * MIB), MIB)
+    with pytest.raises(ValueError):
+        s3.complete_multipart('uploads/b', upload_id, etags)
+
+    # moto fails on unknown upload ids instead of answering NoSuchUpload like S3.
+    with Stubber(s3.client) as stubber:
+        stubber.add_client_error('complete_multipart_upload', service_error_code='NoSuchUpload')
+        with pytest.raises(FileNotFoundError):
+            s3.complete_multipart('uploads/b', 'expired', etags)
+
+
+@pytest.fixture
+def direct(s3):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', UPLOAD_PART_SIZE=5 * MIB, UPLOAD_MAX_SIZE=20 * MIB)
+    uploads = DirectUploads()
+    uploads.init_app(app, SimpleNamespace(storage=s3))
+    return uploads
+
+
+def test_direct_upload(direct, s3):
+    data = os.urandom(5 * MIB) + b'tail'
+    upload = direct.create('photo.jpg', len(data))
+    assert upload['direct'] and len(upload['urls']) == 2
+    meta = direct.get(upload['id'])
+    etags = []
+    for number, url in enumerate(upload['urls']):
+        response = requests.put(url, data=data[number * upload['part_size']:(number + 1) * upload['part_size']])
+        etags.append(response.headers['ETag'])
+
+    with pytest.raises(UploadError):
+        direct.complete(upload['id'], etags[:1])
+    done = direct.complete(upload['id'], etags)
+    assert done['complete'] and done['key'] == meta['key']
+    assert s3.size(meta['key']) == len(data)
+    with pytest.raises(UploadError):
+        direct.complete(done['id'], etags)
+
+    direct.discard(done['id'])
+    assert not s3.exists(meta['key'])
+
+
+def test_direct_upload_rejects(direct):
+    with pytest.raises(UploadError):
+        direct.create('photo.jpg', 0)
+    with pytest.raises(UploadError):
+        direct.create('photo.jpg', 21 * MIB)
+    with pytest.raises(UploadNotFound):
+        direct.get(direct.create('photo.jpg', MIB)['id'][:-3] + 'xyz')
+
+
+def test_direct_upload_discard_aborts(direct, s3):
+    upload = direct.create('photo.jpg', MIB)
+    meta = direct.get(upload['id'])
+    assert [entry['UploadId'] for entry in s3.client.list_multipart_uploads(Bucket=BUCKET)['Uploads']] \
+        == [meta['upload_id']]
+    direct.discard(upload['id'])
+    assert s3.client.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def test_direct_upload_expired(direct, s3):
+    upload = direct.create('photo.jpg', MIB)
+    with Stubber(s3.client) as stubber:
+        stubber.add_client_error('complete_multipart_upload', service_error_code='NoSuchUpload')
+        with pytest.raises(UploadNotFound):
+            direct.complete(upload['id'], ['"etag"'])
@@ -0,0 +1,113 @@
+"""Chunked uploads and the gallery batch that turns them into items."""
+import io
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from extensions import chunked_uploads
+from models import GalleryItem, MediaBlob
+from uploads import ChunkedUploads, OffsetMismatch
+
+
+def jpeg(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class SlowStream(io.BytesIO):
+    """Holds its first read until ``release`` is set."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size=-1):
+        self.reading.set()
+        self.release.wait(5)
+        return super().read(size)
+
+
+def test_concurrent_appends_at_same_offset(tmp_path):
+    uploads = ChunkedUploads(str(tmp_path))
+    upload_id = uploads.create('photo.jpg', 4)['id']
+    first = SlowStream(b'abcd')
+    results = {}
+
+    def append(name, stream):
+        try:
+            results[name] = uploads.append(upload_id, 0, stream)
+        except OffsetMismatch as e:
+            results[name] = e
+
+    writer = threading.Thread(target=append, args=('first', first))
+    writer.start()
+    assert first.reading.wait(5)
+    # The second append waits for the lock, then sees the first one's bytes.
+    racer = threading.Thread(target=append, args=('second', io.BytesIO(b'wxyz')))
+    racer.start()
+    racer.join(0.2)
+    first.release.set()
+    writer.join()
+    racer.join()
+
+    assert results['first'] == 4
+    assert isinstance(results['second'], OffsetMismatch) and results['second'].offset == 4
+    with open(uploads.part_path(upload_id), 'rb') as part:
+        assert part.read() == b'abcd'
+
+
+def upload(client, data, name='photo.jpg'):
+    response = client.post('/admin/uploads', json={'filename': name, 'size': len(data)})
+    assert response.status_code == 201, response.json
+    upload_id = response.json['id']
+    response = client.patch(f'/admin/uploads/{upload_id}', data=data, headers={'Upload-Offset': '0'})
+    assert response.status_code < 300, response.json
+    response = client.post(f'/admin/uploads/{upload_id}/finalize', json={})
+    assert response.status_code == 200, response.json
+    return upload_id
+
+
+@pytest.mark.parametrize('items', [
+    'photo',
+    ['photo'],
+    [{'title': 'No upload'}],
+    [{'upload_id': 7, 'title': 'Not an id'}],
+    'duplicate',
+])
+def test_batch_rejects_bad_items_before_storing(app, admin_client, items):
+    upload_id = upload(admin_client, jpeg('red'))
+    if items == 'duplicate':
+        items = [{'upload_id': upload_id, 'title': 'One'}, {'upload_id': upload_id, 'title': 'Two'}]
+    response = admin_client.post('/admin/gallery/batch', json={'items': items})
+    assert response.status_code == 400
+    with app.app_context():
+        assert os.path.exists(chunked_uploads.part_path(upload_id))
+        assert GalleryItem.query.count() == 0
+        assert MediaBlob.query.count() == 0
+
+    # The upload is still there to be sent again.
+    response = admin_client.post('/admin/gallery/batch', json={'items': [{'upload_id': upload_id, 'title': 'Red'}]})
+    assert response.status_code == 201, response.json
+    with app.app_context():
+        assert [item.title for item in GalleryItem.query] == ['Red']
+
+
+def test_staging_files_are_not_served(app, client, admin_client, tmp_path):
+    upload_id = upload(admin_client, jpeg('blue'))
+    os.makedirs(tmp_path / 'media' / 'tmp', exist_ok=True)
+    (tmp_path / 'media' / 'tmp' / 'scratch').write_bytes(b'scratch')
+    for filename in (f'uploads/{upload_id}.part', f'uploads/{upload_id}.json', f'./uploads/{upload_id}.part',
+                     'tmp/scratch'):
+        assert client.get(f'/media/{filename}').status_code == 404, filename
+
+    response = admin_client.post('/admin/gallery/batch', json={'items': [{'upload_id': upload_id, 'title': 'Blue'}]})
+    assert response.status_code == 201, response.json
+    with app.app_context():
+        image_path = GalleryItem.query.one().image_path
+    response = client.get(image_path)
+    assert response.status_code == 200
+    assert response.cache_control.immutable
@@ -0,0 +1,252 @@
+"""On-demand resized copies of stored images, served by ``/img/<digest>``.
+
+Templates ask for a width that none of the pre-generated renditions has
+(``image_url(member.image, 96)``) and get a signed URL such as
+``/img/<sha256>?w=96&fmt=webp&s=...``. Only the widths, formats and qualities
+in ``IMAGE_TRANSFORM_*`` are accepted and the parameters are signed with the
+app's secret key, so visitors cannot fill the cache with variants of their own.
+
+Results are kept in ``IMAGE_CACHE_DIR``, a disk cache shared by all workers
+and bounded by ``IMAGE_CACHE_MAX_BYTES``: hits refresh a file's mtime and,
+once enough has been written, the least recently used files are deleted.
+
+A miss takes a lock for its variant, in this process and (with ``flock``)
+across the workers, so a burst of first requests for the same variant
+resizes it exactly once while the others wait and then read the result. The
+resize itself runs in a small per-worker process pool, which bounds the CPU a
+flood of misses can take and keeps Pillow out of the request threads.
+"""
+import fcntl
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+from jobs import process_context
+
+# Output format -> (file extension, MIME type)
+FORMATS = {
+    'avif': ('avif', 'image/avif'),
+    'webp': ('webp', 'image/webp'),
+    'jpeg': ('jpg', 'image/jpeg'),
+}
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+# Variants are spread over a fixed set of lock files; two variants sharing one
+# only wait for each other's resize.
+LOCK_STRIPES = 64
+
+# A hit only rewrites the mtime of files last touched longer ago than this.
+TOUCH_INTERVAL = 3600
+
+
+class TransformError(Exception):
+    pass
+
+
+def _transform(source_path, output_path, width, fmt, quality):
+    # Runs in the pool; imported here so the web workers never import Pillow.
+    from imaging import transform
+    return transform(source_path, output_path, width, fmt, quality)
+
+
+class ImageTransforms:
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = 0
+        self.widths = ()
+        self.formats = ()
+        self.qualities = ()
+        self.timeout = None
+        self.max_workers = 1
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._secret = b''
+        self._media_store = None
+        self._written = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pid = None
+        self._pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, media_store=None):
+        config = app.config
+        self.directory = config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'image-cache')
+        self.max_bytes = config.get('IMAGE_CACHE_MAX_BYTES', 1024 ** 3)
+        self.widths = tuple(config.get('IMAGE_TRANSFORM_WIDTHS', ()))
+        self.formats = tuple(fmt for fmt in config.get('IMAGE_TRANSFORM_FORMATS', ('webp', 'jpeg')) if fmt in FORMATS)
+        self.qualities = tuple(config.get('IMAGE_TRANSFORM_QUALITIES', ()))
+        self.timeout = config.get('IMAGE_TRANSFORM_TIMEOUT', 30)
+        self.max_workers = config.get('IMAGE_TRANSFORM_WORKERS') or 1
+        self._secret = (config.get('SECRET_KEY') or '').encode()
+        self._media_store = media_store
+        app.add_template_global(self.url, 'image_url')
+        app.extensions['image_transforms'] = self
+
+    # URLs
+
+    def signature(self, digest, width, fmt, quality):
+        message = f'{digest}:{width}:{fmt}:{quality or ""}'.encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()[:16]
+
+    def url(self, image_url, width, fmt='webp', quality=None):
+        """Signed ``/img`` URL for a stored image, or None when it cannot be resized.
+
+        Images outside the media store (external URLs, old static uploads) and
+        parameters outside the allowlists give None, so templates can fall
+        back to the original URL.
+        """
+        relative_path = self._media_store.relative_from_url(image_url) if self._media_store else None
+        if relative_path is None:
+            return None
+        digest = os.path.splitext(relative_path.rsplit('/', 1)[-1])[0]
+        if not DIGEST.match(digest) or not self.allowed(width, fmt, quality):
+            return None
+        query = f'w={width}&fmt={fmt}' + (f'&q={quality}' if quality else '')
+        return f'/img/{digest}?{query}&s={self.signature(digest, width, fmt, quality)}'
+
+    def allowed(self, width, fmt, quality):
+        return width in self.widths and fmt in self.formats and (quality is None or quality in self.qualities)
+
+    def verify(self, digest, width, fmt, quality, signature):
+        return (DIGEST.match(digest) is not None and self.allowed(width, fmt, quality)
+                and hmac.compare_digest(self.signature(digest, width, fmt, quality), signature or ''))
+
+    # Cache
+
+    def cache_path(self, digest, width, fmt, quality):
+        ext = FORMATS[fmt][0]
+        return os.path.join(self.directory, digest[:2], f'{digest}-{width}w-q{quality or 0}.{ext}')
+
+    def open(self, digest, width, fmt, quality, source):
+        """Open the cached file of a variant, resizing ``source()`` into it on a miss.
+
+        ``source`` is only called on a miss. It returns a context manager
+        giving a local path with the original, and raises FileNotFoundError
+        when the image no longer exists. The file is returned open so an
+        eviction in another worker cannot remove it before it is sent.
+        """
+        path = self.cache_path(digest, width, fmt, quality)
+        file = self._open_cached(path)
+        if file is not None:
+            return file
+        key = os.path.basename(path)
+        with self._key_lock(key), self._stripe_lock(key):
+            # Whoever held the lock before us may have produced it already.
+            file = self._open_cached(path)
+            if file is not None:
+                with self._lock:
+                    self.coalesced += 1
+                return file
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with source() as source_path:
+                future = self._executor().submit(_transform, source_path, path, width, fmt, quality)
+                try:
+                    size = future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    raise TransformError(f'Resizing {digest} to {width}px took longer than {self.timeout}s')
+            file = open(path, 'rb')
+            with self._lock:
+                self.misses += 1
+                self._written += size
+                evict = self._written >= self.max_bytes // 10
+                if evict:
+                    self._written = 0
+        if evict:
+            self.evict()
+        return file
+
+    def _open_cached(self, path):
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - os.fstat(file.fileno()).st_mtime > TOUCH_INTERVAL:
+            os.utime(file.fileno(), (now, now))
+        with self._lock:
+            self.hits += 1
+        return file
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    @contextmanager
+    def _stripe_lock(self, key):
+        stripe = int(hashlib.md5(key.encode()).hexdigest()[:8], 16) % LOCK_STRIPES
+        lock_dir = os.path.join(self.directory, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f'{stripe}.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _executor(self):
+        # Created lazily and per process, like the job queue's pools, so a pool
+        # started before gunicorn forks is never shared between workers.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=process_context())
+                self._pid = os.getpid()
+            return self._pool
+
+    def evict(self):
+        """Delete least recently used files until the cache is below 90% of its limit."""
+        with open(os.path.join(self.directory, 'locks', 'evict.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # another worker is already evicting
+            files, total = [], 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_dir() or entry.name == 'locks':
+                    continue
+                for file in os.scandir(entry.path):
+                    try:
+                        stat = file.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, file.path))
+                    total += stat.st_size
+            removed = 0
+            if total > self.max_bytes:
+                files.sort()
+                target = self.max_bytes * 9 // 10
+                for _, size, path in files:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    removed += 1
+            with self._lock:
+                self.evictions += removed
+            return removed
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'evictions': self.evictions}
@@ -0,0 +1,291 @@
+"""Resumable, chunked uploads.
+
+A client creates an upload session, appends chunks at explicit offsets and
+finalizes it once every byte has arrived. Chunks are streamed straight into a
+``.part`` file, so memory use does not depend on file size, and a client that
+lost its connection asks for the current offset and carries on from there.
+
+With media in a bucket, ``DirectUploads`` takes over: the browser sends the
+parts of a multipart upload straight to the bucket, and the app only signs
+them.
+"""
+import base64
+import fcntl
+import hashlib
+import json
+import math
+import mimetypes
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+COPY_BUFFER = 1024 * 1024
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the stored data ends."""
+    status_code = 409
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    status_code = 422
+
+
+class ChunkedUploads:
+    def __init__(self, root=None, max_size=None, max_age=24 * 3600):
+        self.root = root
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def init_app(self, app, root):
+        self.root = root
+        self.max_size = app.config.get('UPLOAD_MAX_SIZE', self.max_size)
+        app.extensions['chunked_uploads'] = self
+
+    def _path(self, upload_id, suffix):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise UploadNotFound('Unknown upload')
+        return os.path.join(self.root, upload_id + suffix)
+
+    def part_path(self, upload_id):
+        return self._path(upload_id, '.part')
+
+    @contextmanager
+    def _locked_part(self, upload_id, mode):
+        """Open the ``.part`` file holding an exclusive ``flock`` on it.
+
+        Appends and finalizing run one at a time per upload, across threads and
+        worker processes, so the offset is only trusted once the lock is held.
+        """
+        try:
+            part = open(self.part_path(upload_id), mode)
+        except FileNotFoundError:
+            raise UploadNotFound('Unknown upload')
+        with part:
+            fcntl.flock(part, fcntl.LOCK_EX)
+            try:
+                yield part
+            finally:
+                # Buffered writes must reach the file before the next holder
+                # reads its size.
+                part.flush()
+                fcntl.flock(part, fcntl.LOCK_UN)
+
+    def _write_meta(self, meta):
+        path = self._path(meta['id'], '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def create(self, filename, size, sha256=None):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('Upload size must be a positive integer')
+        if self.max_size and size > self.max_size:
+            raise UploadError(f'Upload exceeds the {self.max_size} byte limit')
+        os.makedirs(self.root, exist_ok=True)
+        self.cleanup()
+        meta = {
+            'id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'complete': False,
+            'created': time.time(),
+        }
+        open(self.part_path(meta['id']), 'wb').close()
+        self._write_meta(meta)
+        return self.get(meta['id'])
+
+    def get(self, upload_id):
+        try:
+            with open(self._path(upload_id, '.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound('Unknown upload')
+        meta['offset'] = os.path.getsize(self.part_path(upload_id))
+        return meta
+
+    def append(self, upload_id, offset, stream, checksum=None):
+        """Write ``stream`` at ``offset`` and return the new offset.
+
+        ``checksum`` is the base64 SHA-256 of the chunk; when it is given the
+        chunk is only kept if it arrives whole and matches.
+        """
+        with self._locked_part(upload_id, 'r+b') as part:
+            meta = self.get(upload_id)
+            if meta['complete']:
+                raise UploadError('Upload is already finalized')
+            if offset != meta['offset']:
+                raise OffsetMismatch(meta['offset'])
+            try:
+                expected = base64.b64decode(checksum, validate=True) if checksum is not None else None
+            except ValueError:
+                raise UploadError('Malformed chunk checksum')
+            sha256 = hashlib.sha256()
+            written = 0
+            part.seek(offset)
+            try:
+                while True:
+                    chunk = stream.read(COPY_BUFFER)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if offset + written > meta['size']:
+                        raise UploadError('Chunk runs past the declared upload size')
+                    sha256.update(chunk)
+                    part.write(chunk)
+                if expected is not None and expected != sha256.digest():
+                    raise ChecksumMismatch('Chunk checksum does not match')
+            except UploadError:
+                part.truncate(offset)
+                raise
+            except Exception:
+                # Without a checksum, bytes received before a dropped connection
+                # are kept so the client can resume from the new offset.
+                if checksum is not None:
+                    part.truncate(offset)
+                raise
+        return offset + written
+
+    def finalize(self, upload_id, sha256=None):
+        """Check the upload is whole and matches its checksum, then mark it complete."""
+        with self._locked_part(upload_id, 'rb') as part:
+            meta = self.get(upload_id)
+            if meta['offset'] != meta['size']:
+                raise OffsetMismatch(meta['offset'])
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: part.read(COPY_BUFFER), b''):
+                digest.update(chunk)
+            expected = (sha256 or meta['sha256'] or '').lower()
+            if expected and expected != digest.hexdigest():
+                raise ChecksumMismatch('Upload checksum does not match')
+            meta.update(sha256=digest.hexdigest(), complete=True)
+            del meta['offset']
+            self._write_meta(meta)
+        return self.get(upload_id)
+
+    def discard(self, upload_id):
+        for suffix in ('.part', '.json'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self):
+        """Drop sessions that have not been touched for ``max_age`` seconds."""
+        cutoff = time.time() - self.max_age
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.getmtime(path) < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class DirectUploads:
+    """Multipart uploads from the browser straight into the storage backend.
+
+    ``create()`` starts a multipart upload under ``uploads/`` and presigns a
+    URL per part of ``UPLOAD_PART_SIZE``; the browser PUTs the parts, several
+    at a time, and ``complete()`` assembles them. The session travels in a
+    signed token instead of a worker's disk, so any container can serve any
+    step. The object is hashed and moved to its content-addressed name when it
+    is attached (``MediaStore.adopt_object()``).
+    """
+    # S3 takes at most 10,000 parts, all but the last at least 5 MiB.
+    MIN_PART_SIZE = 5 * 1024 * 1024
+    MAX_PARTS = 10000
+
+    def __init__(self, max_size=None, max_age=24 * 3600):
+        self.store = None
+        self.max_size = max_size
+        self.max_age = max_age
+        self.part_size = 8 * 1024 * 1024
+        self.url_expires = 3600
+        self._serializer = None
+
+    def init_app(self, app, store):
+        self.store = store
+        self.max_size = app.config.get('UPLOAD_MAX_SIZE', self.max_size)
+        self.part_size = max(app.config.get('UPLOAD_PART_SIZE', self.part_size), self.MIN_PART_SIZE)
+        self.url_expires = app.config.get('UPLOAD_URL_EXPIRES', self.url_expires)
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='direct-upload')
+        app.extensions['direct_uploads'] = self
+
+    @property
+    def enabled(self):
+        return self.store is not None and self.store.storage.direct_uploads
+
+    def create(self, filename, size):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('Upload size must be a positive integer')
+        if self.max_size and size > self.max_size:
+            raise UploadError(f'Upload exceeds the {self.max_size} byte limit')
+        parts = math.ceil(size / self.part_size)
+        if parts > self.MAX_PARTS:
+            raise UploadError(f'Upload needs more than {self.MAX_PARTS} parts')
+        storage = self.store.storage
+        key = f'uploads/{uuid.uuid4().hex}'
+        upload_id = storage.create_multipart(key, mimetypes.guess_type(filename)[0])
+        meta = {'key': key, 'upload_id': upload_id, 'filename': filename, 'size': size, 'complete': False}
+        return {
+            'id': self._serializer.dumps(meta),
+            'direct': True,
+            'size': size,
+            'part_size': self.part_size,
+            'urls': [storage.presign_part(key, upload_id, number, self.url_expires) for number in range(1, parts + 1)],
+        }
+
+    def get(self, token):
+        try:
+            meta = self._serializer.loads(token or '', max_age=self.max_age)
+        except BadSignature:
+            raise UploadNotFound('Unknown upload')
+        return dict(meta, id=token)
+
+    def complete(self, token, etags):
+        """Assemble the parts from their ETags, in part order; returns the token of the whole upload."""
+        meta = self.get(token)
+        if meta['complete']:
+            raise UploadError('Upload is already finalized')
+        parts = math.ceil(meta['size'] / self.part_size)
+        if not isinstance(etags, list) or len(etags) != parts or not all(isinstance(etag, str) for etag in etags):
+            raise UploadError(f'Expected the ETags of {parts} parts')
+        storage = self.store.storage
+        try:
+            storage.complete_multipart(meta['key'], meta['upload_id'], etags)
+        except FileNotFoundError:
+            raise UploadNotFound('Unknown upload')
+        except ValueError as exc:
+            raise UploadError(f'Parts are missing or damaged: {exc}')
+        if storage.size(meta['key']) != meta['size']:
+            storage.delete(meta['key'])
+            raise UploadError('Upload size does not match')
+        meta.update(complete=True)
+        del meta['id']
+        return self.get(self._serializer.dumps(meta))
+
+    def discard(self, token):
+        meta = self.get(token)
+        if meta['complete']:
+            self.store.storage.delete(meta['key'])
+        else:
+            self.store.storage.abort_multipart(meta['key'], meta['upload_id'])